@@ -1,84 +1,57 @@
+import time
+
+# Measured from before the first import, so the startup report includes import cost.
+_PROCESS_STARTED = time.perf_counter()
+
 import logging
 import os
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template
-from dotenv import load_dotenv
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 import base64
 import json
+import threading
+from contextlib import contextmanager
 
 # Flask CLI tries to auto-load .env and can crash if the file isn't readable.
-# Prevent that and rely on our explicit load_dotenv below.
+# Prevent that and rely on the explicit load in cifr_agent_system.config.
 os.environ.setdefault("FLASK_SKIP_DOTENV", "1")
 
-# Ensure environment variables are loaded for Config to access them.
-# If the .env file is not readable (e.g., permissions or sandbox filters),
-# fall back to existing environment variables.
-try:
-    load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
-except PermissionError:
-    print("Warning: .env not readable; relying on existing environment variables.")
-
-# Import agents and Config from your cifr_agent_system package
+# Importing config loads the project's .env once per process (see load_environment); if the
+# file is not readable (e.g., permissions or sandbox filters), existing environment variables are used.
 from cifr_agent_system.config import Config
-from cifr_agent_system.communication_agent import CommunicationAgent
-from cifr_agent_system.knowledge_agent import KnowledgeAgent
-from cifr_agent_system.friction_detection_agent import FrictionDetectionAgent
-from cifr_agent_system.intervention_agent import InterventionAgent
 from cifr_agent_system.utils import generate_unique_id
+from src.agents import get_agent_registry
+from src.clients import get_registry
+from src.keypool import get_key_pool
+from src.llm import get_router
+from src.shared_store import get_shared_store
+from src.executor import Executor
+from src import batch
+from src.serialization import serialize, to_jsonable
+from src.blobs import Blob, agent_message, trace_message
+from src.conversation import get_conversation_tracker, skipped_friction
+from src import metrics, prefilter, request_context, singleflight
+from src.jobs import JobQueue
+from src.imaging import get_image_preprocessor
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
+_IMPORTS_DONE = time.perf_counter()
+
 
 def serialize_google_cloud_object(obj):
     """Recursively converts Google Cloud client library objects to JSON serializable types."""
-    # Handle dicts first (before checking __dict__)
-    if isinstance(obj, dict):
-        return {k: serialize_google_cloud_object(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple)):
-        # Recursively process lists/tuples
-        return [serialize_google_cloud_object(elem) for elem in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    elif hasattr(obj, '__dict__'):
-        # Handle Google Cloud protobuf objects
-        if hasattr(obj, '_pb'):
-            return serialize_google_cloud_object(obj._pb)
-        # Recursively process dictionary-like objects
-        return {k: serialize_google_cloud_object(v) for k, v in obj.__dict__.items() if not k.startswith('_')}
-    # Handle specific Google Cloud client objects like Sentiment.score, Sentiment.magnitude, and Entities
-    elif hasattr(obj, 'score') and hasattr(obj, 'magnitude'):
-        return {"score": obj.score, "magnitude": obj.magnitude}
-    elif hasattr(obj, 'entities') and isinstance(obj.entities, (list, tuple)):
-        return [serialize_google_cloud_object(entity) for entity in obj.entities]
-    elif hasattr(obj, 'name') and hasattr(obj, 'type_') and hasattr(obj, 'salience'):
-        return {"name": obj.name, "type": str(obj.type_), "salience": obj.salience}
-    elif hasattr(obj, 'name') and hasattr(obj, 'confidence'):
-        return {"name": obj.name, "confidence": obj.confidence}
-    # Handle generic protobuf messages by converting to a dictionary
-    elif hasattr(obj, 'DESCRIPTOR') and hasattr(obj, 'ListFields'):
-        return {field.name: serialize_google_cloud_object(getattr(obj, field.name)) for field, _ in obj.ListFields()}
-    # Base cases for primitive types
-    elif isinstance(obj, (int, float, str, bool, type(None))):
-        return obj
-    # For any other object type, try to stringify or represent as dict
-    else:
-        try:
-            # Try to convert to dict if it has to_dict or similar method
-            if hasattr(obj, 'to_dict'):
-                return obj.to_dict()
-            # Or just convert to string representation for unknown complex objects
-            return str(obj)
-        except Exception:
-            return f"<Unserializable Object: {type(obj).__name__}>"
+    return to_jsonable(obj)
 
 app = Flask(__name__, 
             static_folder='./frontend/static',
             template_folder='./frontend/templates')
 
-# Initialize agents globally or per-request if state management is complex
-# For simplicity, we'll initialize them globally here.
+# Agents (and the cloud client libraries they import) are built on first use by the
+# registry; AGENTS_WARM_UP=1 builds them now, e.g. in a gunicorn master started with --preload.
+agents = get_agent_registry()
 logger.info("🤖 CIFR Agent System - Initializing Agents")
 logger.info("📋 Project ID: %s", Config.GCP_PROJECT_ID)
 logger.info("📍 Location: %s", Config.GCP_LOCATION)
@@ -90,168 +63,430 @@ logger.info(
     "dedicated" if Config.GOOGLE_API_KEY_IA else "default",
 )
 
-knowledge_agent = KnowledgeAgent(project_id=Config.GCP_PROJECT_ID, location=Config.GCP_LOCATION)
-communication_agent = CommunicationAgent(project_id=Config.GCP_PROJECT_ID, knowledge_agent=knowledge_agent, location=Config.GCP_LOCATION)
-friction_detection_agent = FrictionDetectionAgent(project_id=Config.GCP_PROJECT_ID, knowledge_agent=knowledge_agent, location=Config.GCP_LOCATION)
-intervention_agent = InterventionAgent(project_id=Config.GCP_PROJECT_ID, knowledge_agent=knowledge_agent, friction_detection_agent=friction_detection_agent, location=Config.GCP_LOCATION)
+try:
+    Config.validate()
+except ValueError as e:
+    logger.warning("Configuration incomplete, agents will fail on first use: %s", e)
+
+if Config.AGENTS_WARM_UP:
+    try:
+        agents.warm_up()
+    except Exception as e:
+        logger.exception("Agent warm-up failed; agents will be built on first use: %s", e)
+
+# Build the shared Gemini clients (one per configured key) before the first request.
+if Config.GENAI_WARM_UP:
+    get_registry().warm_up()
+
+STARTUP = {
+    "imports_ms": round((_IMPORTS_DONE - _PROCESS_STARTED) * 1000, 1),
+    "init_ms": round((time.perf_counter() - _IMPORTS_DONE) * 1000, 1),
+}
+metrics.STARTUP_SECONDS.set(_IMPORTS_DONE - _PROCESS_STARTED, phase="imports")
+metrics.STARTUP_SECONDS.set(time.perf_counter() - _IMPORTS_DONE, phase="app_init")
+logger.info("Startup: imports %.1f ms, init %.1f ms", STARTUP["imports_ms"], STARTUP["init_ms"])
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/process_message', methods=['POST'])
-def process_message_api():
-    data = request.form
+
+@app.route('/metrics')
+def metrics_api():
+    """Prometheus text exposition of stage latencies, model calls, 429s, cache and in-flight gauges."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/api/health')
+def health_api():
+    deep = request.args.get('deep') == '1'
+    return jsonify({
+        "gemini_clients": get_registry().health_check(deep=deep),
+        "key_pool": get_key_pool().status(),
+        "providers": get_router().status(),
+        "shared_store": get_shared_store().stats() if get_shared_store() is not None else None,
+        "agents": agents.status(),
+        "startup": STARTUP,
+    })
+
+
+def _coerce_stage_result(raw, label):
+    """
+    Serialize an agent result in one pass and make sure it ends up as a dict.
+    Returns (serialized, flags) with the quota/fallback flags from src.serialization.
+    """
+    logger.debug("%s results type: %s", label, type(raw))
+    with metrics.SERIALIZE_SECONDS.time():
+        serialized, flags = serialize(raw)
+    # Agents occasionally hand back a JSON or Python-literal string instead of a dict
+    if isinstance(serialized, str):
+        logger.warning("%s was serialized as string! Attempting to parse...", label)
+        try:
+            parsed = json.loads(serialized)
+        except ValueError:
+            logger.warning("JSON parse failed, trying Python literal eval")
+            import ast
+            try:
+                parsed = ast.literal_eval(serialized)
+            except Exception as e:
+                logger.error("Failed to parse %s: %s", label.lower(), e)
+                parsed = {"error": "Failed to parse {}".format(label.lower()), "raw": serialized[:200]}
+        parsed, parsed_flags = serialize(parsed)
+        flags = {name: flags[name] or parsed_flags[name] for name in flags}
+        serialized = parsed
+    if not isinstance(serialized, dict):
+        logger.error("%s is not a dict after processing! Type: %s", label, type(serialized))
+        serialized = {"error": "Invalid response format", "type": str(type(serialized))}
+    return serialized, flags
+
+
+@contextmanager
+def _model_stage(timer, name, deadline):
+    """
+    Time stage ``name`` and run it under the request deadline. Yields the list of provider
+    calls (src.router) made inside, for ``_with_call_flags``.
+    """
+    with timer.stage(name), request_context.deadline_at(deadline), request_context.record_calls() as calls:
+        request_context.check_deadline(name)
+        yield calls
+
+
+def _with_call_flags(flags, calls):
+    """Serializer flags OR the flags from the stage's provider calls, so fallback and quota
+    warnings do not depend on the agents echoing the error text."""
+    call_flags = request_context.call_flags(calls)
+    return {name: flags[name] or call_flags[name] for name in flags}
+
+
+def _request_deadline(timeout_ms=None):
+    """
+    Absolute deadline (epoch seconds) for a pipeline run: ``timeout_ms`` from the
+    X-Request-Timeout-Ms header / ?timeout_ms=, else REQUEST_DEADLINE_SECONDS (0 = none).
+    """
+    try:
+        seconds = float(timeout_ms) / 1000.0 if timeout_ms else Config.REQUEST_DEADLINE_SECONDS
+    except ValueError:
+        seconds = Config.REQUEST_DEADLINE_SECONDS
+    return time.time() + seconds if seconds > 0 else None
+
+
+def _run_pipeline(sample_message, deadline=None):
+    """
+    Run Communication -> Friction -> Intervention for one message.
+    Yields (key, value) pairs as each stage finishes; key "warning" carries a warning string
+    and key "error" an error string (no further stages run after an error). Key "triage" says
+    which tier decided friction: "prefilter", "conversation_state" or "llm"; only "llm" runs
+    the friction and intervention model calls. The last pair is ("timings", per-stage ms).
+    Model calls are bounded by ``deadline`` (epoch seconds); a stage that would start after
+    it ends the run with an error.
+    """
+    message_id = sample_message["message_id"]
+    timer = metrics.StageTimer()
+    try:
+        # 1. Communication Agent processing
+        with _model_stage(timer, "communication", deadline) as calls:
+            comm_agent_results = agents.communication.process_collaboration_message(agent_message(sample_message))
+            comm_serialized, comm_flags = _coerce_stage_result(comm_agent_results, "Communication analysis")
+        comm_flags = _with_call_flags(comm_flags, calls)
+        yield "communication_analysis", comm_serialized
+        yield "knowledge_update_status", "Context stored under 'communication_analysis_{}'".format(message_id)
+
+        # Quota errors and API source are flagged during serialization
+        if comm_flags["quota_error"]:
+            yield "warning", "Communication Agent: Gemini API quota exceeded. Using fallback service."
+        if comm_flags["fallback"]:
+            yield "warning", "Communication Agent: Using OpenAI-compatible fallback service (Gemini unavailable or slow)."
+
+        # 2. Friction Detection: local pre-filter, then the thread's rolling signals, then the LLM
+        with timer.stage("triage"):
+            verdict = prefilter.classify(sample_message)
+            signals = get_conversation_tracker().update(sample_message, comm_serialized)
+        if verdict["benign"]:
+            decided_by = "prefilter"
+            friction_serialized, friction_flags = serialize(prefilter.benign_friction(verdict))
+        elif not signals["escalate"]:
+            decided_by = "conversation_state"
+            friction_serialized, friction_flags = serialize(skipped_friction(signals))
+        else:
+            decided_by = "llm"
+            with _model_stage(timer, "friction", deadline) as calls:
+                friction_results = agents.friction.detect_communication_friction(f"communication_analysis_{message_id}")
+                friction_serialized, friction_flags = _coerce_stage_result(friction_results, "Friction detection")
+            friction_flags = _with_call_flags(friction_flags, calls)
+            friction_serialized["conversation_signals"] = signals
+            friction_serialized["decided_by"] = decided_by
+        metrics.PIPELINE_DECISIONS.inc(decided_by=decided_by)
+        yield "friction_detection", friction_serialized
+
+        if friction_flags["quota_error"]:
+            yield "warning", "Friction Detection Agent: Gemini API quota exceeded. Using fallback service."
+        if friction_flags["fallback"]:
+            yield "warning", "Friction Detection Agent: Using OpenAI-compatible fallback service (Gemini unavailable or slow)."
+
+        # 3. Intervention Suggestion (nothing to intervene on when friction was ruled out locally)
+        if decided_by == "llm":
+            with _model_stage(timer, "intervention", deadline) as calls:
+                intervention_suggestion = agents.intervention.suggest_intervention(f"communication_analysis_{message_id}")
+                intervention_serialized, intervention_flags = _coerce_stage_result(intervention_suggestion, "Intervention suggestion")
+            intervention_flags = _with_call_flags(intervention_flags, calls)
+        else:
+            intervention_serialized, intervention_flags = serialize(prefilter.skipped_intervention(decided_by))
+        yield "intervention_suggestion", intervention_serialized
+
+        if intervention_flags["quota_error"]:
+            yield "warning", "Intervention Agent: Gemini API quota exceeded. Using fallback service."
+
+        yield "triage", {"decided_by": decided_by, "prefilter": verdict, "conversation_signals": signals}
+
+    except Exception as e:
+        logger.exception("[API Error] %s", e)
+        yield "error", str(e)
+
+    yield "timings", timer.breakdown()
+
+
+_pipeline_flight = singleflight.SingleFlight()
+
+
+def _coalesced_pipeline(sample_message, deadline=None):
+    """
+    Identical submissions in flight at the same time (same text, image hash and thread)
+    share one pipeline run; followers replay the leader's stages as they finish (under the
+    leader's deadline).
+    Returns (iterator of (key, value), shared).
+    """
+    if not singleflight.enabled():
+        return _run_pipeline(sample_message, deadline), False
+    key = singleflight.content_key(
+        "pipeline",
+        sample_message.get("text_content"),
+        sample_message.get("image_sha256"),
+        sample_message.get("thread_id"),
+    )
+    return _pipeline_flight.stream(key, lambda: _run_pipeline(sample_message, deadline))
+
+
+def _build_sample_message(form=None, files=None):
+    """
+    Build the pipeline input from the current form request (or the given form/files,
+    used by the ASGI entry point in asgi.py).
+    The upload is streamed into a spooled Blob (hash computed on the way in); the message
+    carries the Blob and its digest, and raw bytes are only read for the agent call.
+    Images are downscaled, stripped of metadata and deduplicated first (src.imaging);
+    the digest is that of the preprocessed image.
+    """
+    data = request.form if form is None else form
+    files = request.files if files is None else files
     text_content = data.get('text_content', '')
-    image_file = request.files.get('image_file')
+    image_file = files.get('image_file')
 
-    image_bytes = None
+    image_blob = None
+    image_info = None
     if image_file:
-        image_bytes = image_file.read()
-
-    message_id = generate_unique_id("web_message")
-    timestamp = datetime.now().isoformat()
+        image_blob = Blob.from_stream(image_file.stream, mime_type=image_file.mimetype, filename=image_file.filename)
+        preprocessor = get_image_preprocessor()
+        if preprocessor is not None:
+            image_blob, image_info = preprocessor.process_blob(image_blob)
 
-    sample_message = {
-        "message_id": message_id,
+    return {
+        "message_id": generate_unique_id("web_message"),
         "text_content": text_content,
-        "image_bytes": image_bytes,
-        "timestamp": timestamp,
-        "sender": "Web User"
+        "image_blob": image_blob,
+        "image_sha256": image_blob.sha256 if image_blob else None,
+        "image_preprocessing": image_info,
+        "timestamp": datetime.now().isoformat(),
+        "sender": data.get('sender') or "Web User",
+        "thread_id": data.get('thread_id') or None,
     }
 
-    logger.info("[API] Processing message ID: %s", message_id)
 
-    results = {
-        "original_message": sample_message,
+def _release_sample_message(sample_message):
+    if sample_message.get("image_blob") is not None:
+        sample_message["image_blob"].close()
+
+
+def _new_results(sample_message):
+    return {
+        "original_message": to_jsonable(trace_message(sample_message)),
         "communication_analysis": None,
         "knowledge_update_status": None,
         "friction_detection": None,
         "intervention_suggestion": None,
+        "triage": None,
+        "coalesced": False,
         "error": None,
         "warnings": []
     }
 
-    try:
-        # 1. Communication Agent processing
-        comm_agent_results = communication_agent.process_collaboration_message(sample_message)
-        logger.debug("Communication agent results type: %s", type(comm_agent_results))
-        # Ensure proper JSON serialization - always return a dict, never a string
-        comm_serialized = serialize_google_cloud_object(comm_agent_results)
-        logger.debug("After serialization, type: %s, is dict: %s", type(comm_serialized), isinstance(comm_serialized, dict))
-        # Ensure it's a dict, not a string
-        if isinstance(comm_serialized, str):
-            logger.warning("Communication analysis was serialized as string! Attempting to parse...")
-            try:
-                comm_serialized = json.loads(comm_serialized)
-            except:
-                logger.warning("JSON parse failed, trying Python literal eval")
-                import ast
-                try:
-                    comm_serialized = ast.literal_eval(comm_serialized)
-                except Exception as e:
-                    logger.error("Failed to parse communication analysis: %s", e)
-                    comm_serialized = {"error": "Failed to parse communication analysis", "raw": comm_serialized[:200]}
-        if not isinstance(comm_serialized, dict):
-            logger.error("Communication analysis is not a dict after processing! Type: %s", type(comm_serialized))
-            comm_serialized = {"error": "Invalid response format", "type": str(type(comm_serialized))}
-        results["communication_analysis"] = comm_serialized
-        results["knowledge_update_status"] = "Context stored under 'communication_analysis_{}'".format(message_id)
-        
-        # Check for quota errors and API source in communication analysis
-        comm_str = json.dumps(comm_serialized) if isinstance(comm_serialized, dict) else str(comm_agent_results)
-        if "429" in comm_str or "RESOURCE_EXHAUSTED" in comm_str or "quota" in comm_str.lower():
-            results["warnings"].append("Communication Agent: Gemini API quota exceeded. Using fallback service.")
-        # Check if using fallback service
-        analysis = comm_serialized.get("analysis", {}) if isinstance(comm_serialized, dict) else {}
-        if isinstance(analysis, dict) and analysis.get("api_source") == "fallback":
-            results["warnings"].append("Communication Agent: Using OpenAI-compatible fallback service (Gemini quota exhausted).")
-
-        # 2. Friction Detection
-        friction_results = friction_detection_agent.detect_communication_friction(f"communication_analysis_{message_id}")
-        logger.debug("Friction detection results type: %s", type(friction_results))
-        # Ensure proper JSON serialization - always return a dict, never a string
-        friction_serialized = serialize_google_cloud_object(friction_results)
-        logger.debug("After serialization, type: %s, is dict: %s", type(friction_serialized), isinstance(friction_serialized, dict))
-        # Ensure it's a dict, not a string
-        if isinstance(friction_serialized, str):
-            logger.warning("Friction detection was serialized as string! Attempting to parse...")
-            try:
-                friction_serialized = json.loads(friction_serialized)
-            except:
-                logger.warning("JSON parse failed, trying Python literal eval")
-                import ast
-                try:
-                    friction_serialized = ast.literal_eval(friction_serialized)
-                except Exception as e:
-                    logger.error("Failed to parse friction detection: %s", e)
-                    friction_serialized = {"error": "Failed to parse friction detection", "raw": friction_serialized[:200]}
-        if not isinstance(friction_serialized, dict):
-            logger.error("Friction detection is not a dict after processing! Type: %s", type(friction_serialized))
-            friction_serialized = {"error": "Invalid response format", "type": str(type(friction_serialized))}
-        results["friction_detection"] = friction_serialized
-        
-        # Check for quota errors and API source in friction detection
-        friction_str = json.dumps(friction_serialized) if isinstance(friction_serialized, dict) else str(friction_results)
-        if "429" in friction_str or "RESOURCE_EXHAUSTED" in friction_str or "quota" in friction_str.lower():
-            results["warnings"].append("Friction Detection Agent: Gemini API quota exceeded. Using fallback service.")
-        # Check if using fallback service
-        if isinstance(friction_serialized, dict) and friction_serialized.get("api_source") == "fallback":
-            results["warnings"].append("Friction Detection Agent: Using OpenAI-compatible fallback service (Gemini quota exhausted).")
-
-        # 3. Intervention Suggestion
-        intervention_suggestion = intervention_agent.suggest_intervention(f"communication_analysis_{message_id}")
-        logger.debug("Intervention suggestion results type: %s", type(intervention_suggestion))
-        # Ensure proper JSON serialization - always return a dict, never a string
-        intervention_serialized = serialize_google_cloud_object(intervention_suggestion)
-        logger.debug("After serialization, type: %s, is dict: %s", type(intervention_serialized), isinstance(intervention_serialized, dict))
-        # Ensure it's a dict, not a string
-        if isinstance(intervention_serialized, str):
-            logger.warning("Intervention suggestion was serialized as string! Attempting to parse...")
-            try:
-                intervention_serialized = json.loads(intervention_serialized)
-            except:
-                logger.warning("JSON parse failed, trying Python literal eval")
-                import ast
-                try:
-                    intervention_serialized = ast.literal_eval(intervention_serialized)
-                except Exception as e:
-                    logger.error("Failed to parse intervention suggestion: %s", e)
-                    intervention_serialized = {"error": "Failed to parse intervention suggestion", "raw": intervention_serialized[:200]}
-        if not isinstance(intervention_serialized, dict):
-            logger.error("Intervention suggestion is not a dict after processing! Type: %s", type(intervention_serialized))
-            intervention_serialized = {"error": "Invalid response format", "type": str(type(intervention_serialized))}
-        results["intervention_suggestion"] = intervention_serialized
-        
-        # Check for quota errors in intervention
-        intervention_str = json.dumps(intervention_serialized) if isinstance(intervention_serialized, dict) else str(intervention_suggestion)
-        if "429" in intervention_str or "RESOURCE_EXHAUSTED" in intervention_str or "quota" in intervention_str.lower():
-            results["warnings"].append("Intervention Agent: Gemini API quota exceeded. Using fallback service.")
 
-    except Exception as e:
-        results["error"] = str(e)
-        logger.exception("[API Error] %s", e)
+def _apply_event(results, key, value, include_timings=False):
+    if key == "warning":
+        results["warnings"].append(value)
+    elif key != "timings" or include_timings:
+        results[key] = value
+
+
+def _timings_requested(args):
+    """?timings=1 adds the per-stage timing breakdown (ms) to the response."""
+    return args.get('timings') == '1'
+
+
+@app.route('/api/process_message', methods=['POST'])
+def process_message_api():
+    sample_message = _build_sample_message()
+    logger.info("[API] Processing message ID: %s", sample_message["message_id"])
+    results = _new_results(sample_message)
+    include_timings = _timings_requested(request.args)
+    deadline = _request_deadline(request.headers.get('X-Request-Timeout-Ms') or request.args.get('timeout_ms'))
 
-    # Ensure all responses are JSON-serializable
     try:
-        # Test serialization
-        json.dumps(results)
-    except (TypeError, ValueError) as e:
-        logger.warning("Response contains non-serializable objects, attempting to fix: %s", e)
-        # Convert any remaining non-serializable objects to strings
-        def make_serializable(obj):
-            if isinstance(obj, dict):
-                return {k: make_serializable(v) for k, v in obj.items()}
-            elif isinstance(obj, (list, tuple)):
-                return [make_serializable(item) for item in obj]
-            elif isinstance(obj, (str, int, float, bool, type(None))):
-                return obj
-            else:
-                return str(obj)
-        results = make_serializable(results)
+        with metrics.INFLIGHT_REQUESTS.track_inprogress(endpoint="process_message"):
+            events, results["coalesced"] = _coalesced_pipeline(sample_message, deadline)
+            for key, value in events:
+                _apply_event(results, key, value, include_timings)
+    finally:
+        _release_sample_message(sample_message)
 
+    # Every stage value already went through the serializer, so no re-check pass is needed.
     return jsonify(results)
 
+
+def _sse(event, data):
+    payload = json.dumps(data)
+    return "event: {}\ndata: {}\n\n".format(event, payload)
+
+
+@app.route('/api/process_message/stream', methods=['POST'])
+def process_message_stream_api():
+    """Server-Sent Events variant of /api/process_message: one event per finished stage."""
+    # Read the form and upload before streaming starts so the generator owns its inputs.
+    sample_message = _build_sample_message()
+    logger.info("[API] Streaming message ID: %s", sample_message["message_id"])
+    include_timings = _timings_requested(request.args)
+    deadline = _request_deadline(request.headers.get('X-Request-Timeout-Ms') or request.args.get('timeout_ms'))
+
+    def generate():
+        try:
+            with metrics.INFLIGHT_REQUESTS.track_inprogress(endpoint="process_message_stream"):
+                yield _sse("original_message", to_jsonable(trace_message(sample_message)))
+                events, shared = _coalesced_pipeline(sample_message, deadline)
+                if shared:
+                    yield _sse("coalesced", True)
+                for key, value in events:
+                    if key != "timings" or include_timings:
+                        yield _sse(key, value)
+                yield _sse("done", {"message_id": sample_message["message_id"]})
+        finally:
+            _release_sample_message(sample_message)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _run_job(payload, image):
+    """JobQueue handler: rebuild the message from the stored payload and run the pipeline."""
+    sample_message = dict(payload)
+    mime_type = sample_message.pop("image_mime_type", None)
+    filename = sample_message.pop("image_filename", None)
+    if image:
+        sample_message["image_blob"] = Blob.from_bytes(image, mime_type=mime_type, filename=filename)
+    results = _new_results(sample_message)
+    try:
+        # Each attempt gets the default budget, counted from when it starts.
+        events, results["coalesced"] = _coalesced_pipeline(sample_message, _request_deadline())
+        for key, value in events:
+            _apply_event(results, key, value, include_timings=True)
+    finally:
+        _release_sample_message(sample_message)
+    if results["error"]:
+        # Raising lets the queue retry the job; the last error is kept if all attempts fail.
+        raise RuntimeError(results["error"])
+    return results
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def _get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue.from_env(_run_job)
+    return _job_queue
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job_api():
+    """
+    Job variant of /api/process_message: same form, answers 202 with a job id right away.
+    Resubmitting with the same Idempotency-Key header (or idempotency_key field) returns the same job.
+    """
+    sample_message = _build_sample_message()
+    # The queue stores the upload itself; the message keeps only JSON-safe fields.
+    blob = sample_message.pop("image_blob")
+    image = None
+    if blob is not None:
+        with blob:
+            image = blob.read() or None
+        sample_message["image_mime_type"] = blob.mime_type
+        sample_message["image_filename"] = blob.filename
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    job_id, created = _get_job_queue().submit(sample_message, image=image, idempotency_key=idempotency_key)
+    logger.info("[API] Job %s %s for message ID: %s", job_id, "queued" if created else "reused", sample_message["message_id"])
+    return jsonify({
+        "job_id": job_id,
+        "created": created,
+        "status_url": "/api/jobs/{}".format(job_id),
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status_api(job_id):
+    """Job status and result; ?wait=N long-polls up to N seconds (max 30) for it to finish."""
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+    queue = _get_job_queue()
+    job = queue.wait(job_id, wait) if wait else queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+
+@app.route('/api/process_batch', methods=['POST'])
+def process_batch_api():
+    """
+    Bulk variant of /api/process_message: JSONL in (request body or a `batch_file` upload),
+    JSONL out, streamed as each chunk of messages finishes. The plan is made once per batch.
+    Query params: goal, chunk_size, workers (capped at BATCH_MAX_WORKERS), pipeline=1.
+    """
+    upload = request.files.get('batch_file')
+    goal = request.args.get('goal', batch.DEFAULT_GOAL)
+    chunk_size = max(1, request.args.get('chunk_size', 100, type=int))
+    workers = batch.clamp_workers(request.args.get('workers', type=int))
+    pipeline = request.args.get('pipeline') == '1'
+
+    executor = Executor(
+        communication_agent=agents.communication,
+        friction_detection_agent=agents.friction,
+        intervention_agent=agents.intervention,
+        knowledge_agent=agents.knowledge,
+        max_workers=workers,
+        pipeline=pipeline,
+    )
+    lines = upload.stream if upload else request.stream
+    logger.info("[API] Processing batch (chunk_size=%d, workers=%d, pipeline=%s)", chunk_size, workers, pipeline)
+
+    def generate():
+        with metrics.INFLIGHT_REQUESTS.track_inprogress(endpoint="process_batch"):
+            for record in batch.run_batch(executor, batch.parse_jsonl(lines), goal=goal, chunk_size=chunk_size):
+                yield batch.to_jsonl(record)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 if __name__ == '__main__':
     # It's recommended to run Flask in development mode for easier debugging.
     # For production, use a production-ready WSGI server like Gunicorn or uWSGI.
@@ -0,0 +1,265 @@
+"""
+ASGI entry point for high-concurrency serving: ``uvicorn asgi:app --workers 1``.
+
+/api/process_message and /api/process_message/stream are served natively on the event
+loop; every other route is delegated to the Flask app through asgiref's WsgiToAsgi.
+Pipeline stages are blocking agent calls, so each one runs on a dedicated thread pool
+and the request coroutine only awaits it; no request holds a server worker while the
+LLM chain runs.
+
+- Backpressure: at most ASGI_MAX_CONCURRENCY pipelines run at once. Further requests wait
+  up to ASGI_QUEUE_TIMEOUT_SECONDS for a slot, then get 503 with Retry-After.
+- Bodies larger than ASGI_MAX_BODY_BYTES are rejected with 413 while being read.
+- Cancellation: when the client disconnects, no further stages are started; the stage
+  already running finishes on its thread and its result is dropped. The request keeps its
+  slot until that stage has returned and the pipeline is cleaned up.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.wrappers import Request
+
+import app as flask_module
+from src import metrics
+from src.blobs import trace_message
+from src.serialization import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(os.getenv("ASGI_MAX_CONCURRENCY", "256"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASGI_QUEUE_TIMEOUT_SECONDS", "5"))
+MAX_BODY_BYTES = int(os.getenv("ASGI_MAX_BODY_BYTES", str(20 * 1024 * 1024)))
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_STAGE_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="asgi-stage")
+_DONE = object()
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class _Disconnected(Exception):
+    pass
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise _Disconnected()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise _BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _build_sample_message(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """Parse the buffered body with werkzeug's form/multipart parser and build the message."""
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "CONTENT_TYPE": headers.get("content-type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "SERVER_NAME": "asgi",
+        "SERVER_PORT": "0",
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+    }
+    request = Request(environ)
+    return flask_module._build_sample_message(request.form, request.files)
+
+
+async def _send_json(send: Send, status: int, payload: Any, headers: Optional[list] = None) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _watch_disconnect(receive: Receive, disconnected: asyncio.Event) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
+
+
+class _PipelineRun:
+    """One pipeline execution driven from the event loop, one thread hop per stage."""
+
+    def __init__(
+        self,
+        sample_message: Dict[str, Any],
+        disconnected: asyncio.Event,
+        include_timings: bool = False,
+        deadline: Optional[float] = None,
+    ):
+        self.sample_message = sample_message
+        self.disconnected = disconnected
+        self.include_timings = include_timings
+        self.deadline = deadline
+        self._events = None
+        self._pending: Optional[asyncio.Future] = None
+
+    async def stages(self):
+        """Async iterator over the pipeline's (key, value) pairs; raises _Disconnected."""
+        loop = asyncio.get_running_loop()
+        self._events, shared = flask_module._coalesced_pipeline(self.sample_message, self.deadline)
+        if shared:
+            yield "coalesced", True
+        while True:
+            self._pending = loop.run_in_executor(_STAGE_POOL, next, self._events, _DONE)
+            waiter = asyncio.ensure_future(self.disconnected.wait())
+            done, _ = await asyncio.wait({self._pending, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if self._pending not in done:
+                raise _Disconnected()
+            item = self._pending.result()
+            if item is _DONE:
+                return
+            if item[0] == "timings" and not self.include_timings:
+                continue
+            yield item
+
+    def close(self, on_closed: Callable[[], None]) -> None:
+        """
+        Stop the pipeline and release the upload once no stage is using them, then call
+        ``on_closed`` on the event loop (the request's concurrency slot is held until then).
+        """
+        loop = asyncio.get_running_loop()
+
+        def cleanup() -> None:
+            if self._events is not None:
+                self._events.close()
+            flask_module._release_sample_message(self.sample_message)
+
+        def after_stage(_) -> None:
+            # The running stage cannot be interrupted; clean up on a pool thread once it returns.
+            cleaned = _STAGE_POOL.submit(cleanup)
+            cleaned.add_done_callback(lambda _: loop.call_soon_threadsafe(on_closed))
+
+        if self._pending is not None and not self._pending.done():
+            self._pending.add_done_callback(after_stage)
+            return
+        try:
+            cleanup()
+        finally:
+            on_closed()
+
+
+class PipelineApp:
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's event loop.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(MAX_CONCURRENCY)
+        return self._slots
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        routes = {
+            "/api/process_message": self._process,
+            "/api/process_message/stream": self._process_stream,
+        }
+        handler = routes.get(scope.get("path")) if scope["type"] == "http" and scope.get("method") == "POST" else None
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        try:
+            body = await _read_body(receive)
+        except _BodyTooLarge:
+            await _send_json(send, 413, {"error": "Request body too large"})
+            return
+        except _Disconnected:
+            return
+
+        # Set on arrival, so time spent waiting for a slot counts against the deadline.
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = dict(scope.get("headers", []))
+        timeout_ms = headers.get(b"x-request-timeout-ms", b"").decode("latin-1") or (query.get("timeout_ms") or [None])[0]
+        deadline = flask_module._request_deadline(timeout_ms)
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await _send_json(send, 503, {"error": "Server busy, retry later"}, [(b"retry-after", b"1")])
+            return
+
+        run = None
+        disconnected = asyncio.Event()
+        watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected))
+        endpoint = scope["path"].strip("/").replace("api/", "").replace("/", "_")
+        metrics.INFLIGHT_REQUESTS.inc(endpoint=endpoint)
+        try:
+            loop = asyncio.get_running_loop()
+            sample_message = await loop.run_in_executor(_STAGE_POOL, _build_sample_message, scope, body)
+            include_timings = query.get("timings") == ["1"]
+            run = _PipelineRun(sample_message, disconnected, include_timings, deadline)
+            await handler(run, send)
+        except _Disconnected:
+            logger.info("[ASGI] Client disconnected; remaining stages cancelled")
+        finally:
+            metrics.INFLIGHT_REQUESTS.dec(endpoint=endpoint)
+            watcher.cancel()
+            if run is not None:
+                run.close(self.slots.release)
+            else:
+                self.slots.release()
+
+    async def _process(self, run: _PipelineRun, send: Send) -> None:
+        sample_message = run.sample_message
+        logger.info("[ASGI] Processing message ID: %s", sample_message["message_id"])
+        results = flask_module._new_results(sample_message)
+        async for key, value in run.stages():
+            if key == "coalesced":
+                results["coalesced"] = True
+            else:
+                flask_module._apply_event(results, key, value, include_timings=True)
+        await _send_json(send, 200, results)
+
+    async def _process_stream(self, run: _PipelineRun, send: Send) -> None:
+        sample_message = run.sample_message
+        logger.info("[ASGI] Streaming message ID: %s", sample_message["message_id"])
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+        })
+
+        async def emit(event: str, data: Any) -> None:
+            await send({"type": "http.response.body", "body": flask_module._sse(event, data).encode("utf-8"), "more_body": True})
+
+        await emit("original_message", to_jsonable(trace_message(sample_message)))
+        async for key, value in run.stages():
+            await emit(key, value)
+        await emit("done", {"message_id": sample_message["message_id"]})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+app = PipelineApp(WsgiToAsgi(flask_module.app))
@@ -0,0 +1 @@
+# Offline benchmark harness (fake model backends, latency/throughput/RSS reports)
@@ -0,0 +1,85 @@
+"""
+Minimal agents for the executor benchmark.
+
+They make one ``src.llm.complete`` call per stage with prompts shaped like the real agents',
+so a run exercises the key pool, response cache, single-flight, micro-batching and fallback
+paths rather than the agents' own business logic.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from src import llm
+
+
+def _model() -> str:
+    return os.getenv("GEMINI_PRO_MODEL_ID", "gemini-2.0-flash")
+
+
+def _ask(prompt: str, image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+    result = llm.complete(_model(), prompt, image_bytes=image_bytes)
+    if not result or not result.get("text"):
+        raise RuntimeError("no model backend configured")
+    try:
+        parsed = json.loads(result["text"])
+    except ValueError:
+        parsed = {"raw": result["text"]}
+    return dict(parsed, api_source=result["api_source"])
+
+
+class KnowledgeAgent:
+    def __init__(self):
+        self._store: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def store_context(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store[key] = value
+
+    def retrieve_context(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._store.get(key)
+
+
+class CommunicationAgent:
+    def __init__(self, knowledge_agent: KnowledgeAgent):
+        self.knowledge_agent = knowledge_agent
+
+    def process_collaboration_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        analysis = _ask(
+            "Analyze this workplace message for sentiment, entities and intent. Reply in JSON.\n"
+            f"Message: {message.get('text_content', '')}",
+            message.get("image_bytes"),
+        )
+        self.knowledge_agent.store_context(
+            f"communication_analysis_{message.get('message_id')}",
+            {"message": {k: v for k, v in message.items() if k != "image_bytes"}, "analysis": analysis},
+        )
+        return analysis
+
+
+class FrictionDetectionAgent:
+    def __init__(self, knowledge_agent: KnowledgeAgent):
+        self.knowledge_agent = knowledge_agent
+
+    def detect_misalignment(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        message = context.get("message", {})
+        friction = _ask(
+            "Does this message show misalignment or friction between collaborators? Reply in JSON.\n"
+            f"Message: {message.get('text_content', '')}\n"
+            f"Analysis: {json.dumps(context.get('analysis'), default=str)}"
+        )
+        key = f"communication_analysis_{message.get('message_id')}"
+        self.knowledge_agent.store_context(key, dict(context, friction=friction))
+        return friction
+
+
+class InterventionAgent:
+    def suggest_clarification(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return _ask(
+            "Suggest one short clarifying intervention for this message. Reply in JSON.\n"
+            f"Message: {data.get('message', {}).get('text_content', '')}\n"
+            f"Reason: {data.get('reason', '')}"
+        )
@@ -0,0 +1,227 @@
+"""
+Offline stand-ins for the model backends, so the pipeline can be benchmarked without network.
+
+- ``FakeGenaiClient`` mimics ``google.genai.Client`` (``models.generate_content`` / ``models.get``).
+  ``install_fake_genai`` puts a fake ``google.genai`` module in ``sys.modules`` so every
+  ``genai.Client(api_key=...)`` built afterwards (src.clients, the agents) gets one.
+- ``FakeOpenAIServer`` is a local OpenAI-compatible ``/v1/chat/completions`` HTTP server for
+  the fallback path (point OPENAI_FALLBACK_BASE_URL at ``server.base_url``).
+
+Both take a ``FakeBackendConfig``: latency (mean + jitter), error rate and 429 rate, seeded
+so a run is reproducible.
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+_PACKED_RE = re.compile(r"independent tasks as a JSON array.*?Tasks:\n(\[.*\])\s*$", re.DOTALL)
+
+
+@dataclass
+class FakeBackendConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 0.05
+    seed: int = 0
+
+
+class FakeBackend:
+    """Shared latency/failure model; thread-safe and deterministic for a given seed."""
+
+    def __init__(self, config: FakeBackendConfig):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def _draw(self) -> tuple:
+        with self._lock:
+            self.calls += 1
+            latency = max(0.0, self._random.gauss(self.config.latency_ms, self.config.jitter_ms)) / 1000.0
+            roll = self._random.random()
+        return latency, roll
+
+    def respond(self, prompt: str) -> str:
+        """Sleep for the simulated latency, then answer or raise the injected failure."""
+        latency, roll = self._draw()
+        time.sleep(latency)
+        if roll < self.config.rate_limit_rate:
+            with self._lock:
+                self.rate_limited += 1
+            raise RuntimeError(
+                "429 RESOURCE_EXHAUSTED. Quota exceeded. Please retry in %.3fs." % self.config.retry_after_seconds
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError("500 INTERNAL. Injected backend error.")
+        return answer(prompt)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "errors": self.errors, "rate_limited": self.rate_limited}
+
+
+def answer(prompt: str) -> str:
+    """A plausible JSON answer; packed prompts (src.microbatch) get one answer per task."""
+    match = _PACKED_RE.search(prompt)
+    if match:
+        try:
+            tasks = json.loads(match.group(1))
+            return json.dumps([{"id": task["id"], "response": answer(task["prompt"])} for task in tasks])
+        except (ValueError, KeyError, TypeError):
+            pass
+    lowered = prompt.lower()
+    friction = any(word in lowered for word in ("blocked", "late", "again", "frustrat", "unclear"))
+    return json.dumps({
+        "summary": prompt[:80],
+        "sentiment": "negative" if friction else "neutral",
+        "friction_detected": friction,
+        "reason": "Injected benchmark response",
+        "intervention_suggested": friction,
+        "suggestion": "Clarify the owner and deadline." if friction else None,
+        "confidence": 0.5,
+    })
+
+
+# --- genai stand-in ---------------------------------------------------------
+
+
+class _Part:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Content:
+    def __init__(self, text: str):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    def __init__(self, text: str):
+        self.content = _Content(text)
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.candidates = [_Candidate(text)]
+        self.text = text
+
+
+def _prompt_text(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    texts: List[str] = []
+    for content in contents if isinstance(contents, list) else [contents]:
+        parts = content.get("parts", []) if isinstance(content, dict) else getattr(content, "parts", None) or [content]
+        for part in parts:
+            text = part.get("text") if isinstance(part, dict) else getattr(part, "text", part if isinstance(part, str) else None)
+            if text:
+                texts.append(text)
+    return "\n".join(texts)
+
+
+class _Models:
+    def __init__(self, backend: FakeBackend):
+        self._backend = backend
+
+    def generate_content(self, model: str, contents: Any, **kwargs: Any) -> _Response:
+        return _Response(self._backend.respond(_prompt_text(contents)))
+
+    def get(self, model: str, **kwargs: Any) -> Dict[str, str]:
+        return {"name": model}
+
+
+class FakeGenaiClient:
+    def __init__(self, backend: FakeBackend, api_key: Optional[str] = None, **kwargs: Any):
+        self.api_key = api_key
+        self.models = _Models(backend)
+
+
+def install_fake_genai(backend: FakeBackend) -> types.ModuleType:
+    """Register a fake ``google.genai`` module; call before importing src.clients or the agents."""
+    module = types.ModuleType("google.genai")
+    module.Client = lambda api_key=None, **kwargs: FakeGenaiClient(backend, api_key=api_key, **kwargs)
+    module.types = types.SimpleNamespace()
+    google = sys.modules.get("google")
+    if google is None:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.genai = module
+    sys.modules["google.genai"] = module
+    return module
+
+
+# --- OpenAI-compatible stand-in ---------------------------------------------
+
+
+class FakeOpenAIServer:
+    """``/v1/chat/completions`` on localhost; ``start()`` picks a free port unless one is given."""
+
+    def __init__(self, backend: FakeBackend, host: str = "127.0.0.1", port: int = 0):
+        self.backend = backend
+        server_backend = backend
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                content = request.get("messages", [{}])[-1].get("content", "")
+                if isinstance(content, list):
+                    content = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+                try:
+                    text = server_backend.respond(content)
+                except RuntimeError as exc:
+                    status = 429 if "429" in str(exc) else 500
+                    self._send(status, {"error": {"message": str(exc), "code": status}})
+                    return
+                self._send(200, {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                })
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,367 @@
+"""
+Offline pipeline benchmark.
+
+    python -m benchmarks.run --targets executor,flask --concurrency 1,8,32 --requests 200 \
+        --text-chars 200,2000 --image-kb 0,256 --latency-ms 50 --rate-limit-rate 0.02 \
+        --output bench.json [--baseline previous.json --max-regression 0.15]
+
+Every (target, concurrency, text size, image size) combination runs in its own
+subprocess against the fake backends in ``benchmarks.fake_backends``, so peak RSS and
+process-wide singletons (caches, key pool, batchers) are per scenario. Targets:
+
+- ``executor``: ``Executor.execute_plan`` per request, with the agents in ``benchmarks.agents``.
+- ``flask``: ``POST /api/process_message`` through the Flask test client, with the real agents
+  (needs ``cifr_agent_system`` importable; the scenario reports the import error otherwise).
+
+Output is JSON: per scenario p50/p95/p99/mean latency (ms), throughput (req/s), error
+count, model calls per request and peak RSS (MB). With ``--baseline``, scenarios whose p95
+or throughput got worse by more than ``--max-regression`` are listed and the exit code is 1.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_TEMPLATES = [
+    "Thanks, looks good to me!",
+    "Can someone confirm who owns the deploy on Friday?",
+    "I'm blocked again on the API review, this is the third time it slipped.",
+    "The spec is unclear about retries, are we doing exponential backoff or not?",
+    "Shipping the release notes now, ping me if anything is missing.",
+    "Why is the migration late? We agreed on Tuesday and nobody told me.",
+    "ok",
+    "Great work on the dashboard everyone.",
+]
+_FILLER = "alpha beta gamma delta schedule review deploy budget design test metrics owner customer".split()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def make_messages(count: int, text_chars: int, image_kb: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        text = f"{_TEMPLATES[i % len(_TEMPLATES)]} (#{i})"
+        while len(text) < text_chars:
+            text += " " + rng.choice(_FILLER)
+        image = None
+        if image_kb:
+            image = b"\x89PNG\r\n\x1a\n" + rng.getrandbits(8 * image_kb * 1024).to_bytes(image_kb * 1024, "little")
+        messages.append({
+            "message_id": f"bench_{i}",
+            "text_content": text[:max(text_chars, 1)],
+            "image_bytes": image,
+            "sender": f"user{i % 5}",
+            "thread_id": f"thread{i % 8}",
+        })
+    return messages
+
+
+# --- scenario (child process) -----------------------------------------------
+
+
+def _configure_env(options: Dict[str, Any], openai_base_url: Optional[str]) -> None:
+    names = ["GOOGLE_API_KEY", "GOOGLE_API_KEY_CA", "GOOGLE_API_KEY_FA", "GOOGLE_API_KEY_IA"]
+    for env_var in names:
+        os.environ.pop(env_var, None)
+    for i, env_var in enumerate(names[:max(1, options["keys"])]):
+        os.environ[env_var] = f"bench-key-{i}"
+    os.environ.setdefault("GCP_PROJECT_ID", "bench-project")
+    os.environ["LLM_CACHE_ENABLED"] = "1" if options["cache"] else "0"
+    os.environ["GEMINI_KEY_RPM"] = str(options["key_rpm"])
+    os.environ["GENAI_WARM_UP"] = "0"
+    if options["backend"] == "openai":
+        # Gemini keys answer 429 with a long cooldown, so calls land on the fallback service.
+        os.environ["GEMINI_KEY_MAX_WAIT_SECONDS"] = "0"
+        os.environ["ENABLE_OPENAI_FALLBACK"] = "1"
+        os.environ["OPENAI_FALLBACK_BASE_URL"] = openai_base_url or ""
+        os.environ["OPENAI_FALLBACK_API_KEY"] = "bench"
+    else:
+        os.environ["ENABLE_OPENAI_FALLBACK"] = "0"
+
+
+def _executor_target(messages: List[Dict[str, Any]]) -> Callable[[int], bool]:
+    from benchmarks import agents
+    from src.executor import Executor
+
+    knowledge = agents.KnowledgeAgent()
+    executor = Executor(
+        agents.CommunicationAgent(knowledge),
+        agents.FrictionDetectionAgent(knowledge),
+        agents.InterventionAgent(),
+        knowledge,
+    )
+
+    def run(i: int) -> bool:
+        results = executor.execute_plan("Detect and resolve collaboration friction", [messages[i]])["results"]
+        return all(r.get("type") != "error" for r in results)
+
+    return run
+
+
+def _flask_target(messages: List[Dict[str, Any]]) -> Callable[[int], bool]:
+    sys.path.insert(0, ROOT)
+    import app as flask_module
+
+    local = threading.local()
+
+    def run(i: int) -> bool:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = flask_module.app.test_client()
+        message = messages[i]
+        data = {"text_content": message["text_content"], "sender": message["sender"], "thread_id": message["thread_id"]}
+        if message["image_bytes"]:
+            data["image_file"] = (io.BytesIO(message["image_bytes"]), "bench.png", "image/png")
+        response = client.post("/api/process_message", data=data, content_type="multipart/form-data")
+        return response.status_code == 200 and not (response.get_json() or {}).get("error")
+
+    return run
+
+
+def run_scenario(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario in this process and return its report."""
+    from benchmarks.fake_backends import FakeBackend, FakeBackendConfig, FakeOpenAIServer, install_fake_genai
+
+    backend = FakeBackend(FakeBackendConfig(
+        latency_ms=options["latency_ms"],
+        jitter_ms=options["jitter_ms"],
+        error_rate=options["error_rate"],
+        rate_limit_rate=options["rate_limit_rate"],
+        seed=options["seed"],
+    ))
+    server = None
+    gemini = backend
+    if options["backend"] == "openai":
+        server = FakeOpenAIServer(backend).start()
+        gemini = FakeBackend(FakeBackendConfig(latency_ms=0, jitter_ms=0, rate_limit_rate=1.0, retry_after_seconds=3600))
+    _configure_env(options, server.base_url if server else None)
+    install_fake_genai(gemini)
+
+    report: Dict[str, Any] = {"name": options["name"], "options": options}
+    total = options["requests"] + options["warmup"]
+    messages = make_messages(total, options["text_chars"], options["image_kb"], options["seed"])
+    try:
+        if options["backend"] == "openai":
+            from src.fallback import fallback_enabled
+            if not fallback_enabled():
+                raise RuntimeError("the openai package is needed for the fallback backend")
+        target = {"executor": _executor_target, "flask": _flask_target}[options["target"]](messages)
+    except Exception as exc:
+        report["skipped"] = f"{type(exc).__name__}: {exc}"
+        return report
+
+    report["import_rss_mb"] = peak_rss_mb()
+    for i in range(options["warmup"]):
+        try:
+            target(i)
+        except Exception:
+            pass
+    calls_before = backend.calls
+
+    def timed(i: int) -> tuple:
+        start = time.perf_counter()
+        try:
+            ok = target(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+        outcomes = list(pool.map(timed, range(options["warmup"], total)))
+    wall = time.perf_counter() - started
+    if server is not None:
+        server.stop()
+
+    latencies = sorted(seconds * 1000 for seconds, _ in outcomes)
+    report.update({
+        "requests": len(outcomes),
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(outcomes) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "model_calls_per_request": round((backend.calls - calls_before) / max(1, len(outcomes)), 3),
+        "backend": backend.stats(),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    return report
+
+
+# --- driver ------------------------------------------------------------------
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def scenarios(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    out = []
+    grid = itertools.product(args.targets.split(","), _ints(args.concurrency), _ints(args.text_chars), _ints(args.image_kb))
+    for target, concurrency, text_chars, image_kb in grid:
+        out.append({
+            "name": f"{target}/c{concurrency}/t{text_chars}/i{image_kb}kb/{args.backend}",
+            "target": target,
+            "concurrency": concurrency,
+            "text_chars": text_chars,
+            "image_kb": image_kb,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "backend": args.backend,
+            "keys": args.keys,
+            "key_rpm": args.key_rpm,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "cache": args.cache,
+            "seed": args.seed,
+        })
+    return out
+
+
+def _run_isolated(options: Dict[str, Any]) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--scenario", json.dumps(options)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"name": options["name"], "options": options, "skipped": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(reports: List[Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Human-readable regressions of p95 latency or throughput against ``baseline``."""
+    previous = {r["name"]: r for r in baseline.get("scenarios", []) if "latency_ms" in r}
+    problems = []
+    for report in reports:
+        old = previous.get(report["name"])
+        if old is None or "latency_ms" not in report:
+            continue
+        p95, old_p95 = report["latency_ms"]["p95"], old["latency_ms"]["p95"]
+        if old_p95 and p95 > old_p95 * (1 + max_regression):
+            problems.append(f"{report['name']}: p95 {old_p95} -> {p95} ms")
+        rps, old_rps = report["throughput_rps"] or 0, old["throughput_rps"] or 0
+        if old_rps and rps < old_rps * (1 - max_regression):
+            problems.append(f"{report['name']}: throughput {old_rps} -> {rps} req/s")
+    return problems
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against fake Gemini/OpenAI backends.")
+    parser.add_argument("--targets", default="executor", help="comma-separated: executor, flask")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--text-chars", default="200", help="comma-separated message lengths")
+    parser.add_argument("--image-kb", default="0", help="comma-separated image sizes (0 = text only)")
+    parser.add_argument("--backend", choices=("genai", "openai"), default="genai",
+                        help="fake Gemini client, or the fake OpenAI-compatible server via the fallback path")
+    parser.add_argument("--keys", type=int, default=1, help="fake Gemini keys in the pool (1-4)")
+    parser.add_argument("--key-rpm", type=float, default=1e6, help="per-key rate limit (GEMINI_KEY_RPM)")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--cache", action="store_true", help="leave the LLM response cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--in-process", action="store_true", help="run scenarios in this process (shared RSS/singletons)")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return 0
+
+    reports = []
+    for options in scenarios(args):
+        report = run_scenario(options) if args.in_process else _run_isolated(options)
+        reports.append(report)
+        if "latency_ms" in report:
+            print(
+                "%-40s p50=%8.1f p95=%8.1f p99=%8.1f ms  %8.1f req/s  errors=%d  rss=%s MB" % (
+                    report["name"], report["latency_ms"]["p50"], report["latency_ms"]["p95"],
+                    report["latency_ms"]["p99"], report["throughput_rps"] or 0, report["errors"], report["peak_rss_mb"],
+                ),
+                file=sys.stderr,
+            )
+        else:
+            print("%-40s skipped: %s" % (report["name"], report.get("skipped")), file=sys.stderr)
+
+    output = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "scenarios": reports,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(reports, json.load(f), args.max_regression)
+        output["regressions"] = regressions
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
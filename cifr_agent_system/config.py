@@ -2,10 +2,23 @@ import os
 import ssl
 from dotenv import load_dotenv
 
-# Allow opting into insecure SSL only when explicitly requested (for sandboxes).
-ALLOW_INSECURE_SSL = os.getenv("ALLOW_INSECURE_SSL", "0") == "1"
+from src.settings import env_flag
+
+# Set once the process (or the parent it inherited its environment from) has loaded .env
+# and pointed the SSL env vars at a cert bundle; later imports and forked workers skip it.
+_BOOTSTRAP_ENV_MARKER = "CIFR_CONFIG_BOOTSTRAPPED"
+# The project's .env (next to app.py), whichever directory the process was started from.
+_PROJECT_DOTENV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+_loaded_dotenv_paths = set()
+_ssl_patched = False
+
+
+def _patch_insecure_ssl():
+    """Allow opting into insecure SSL only when explicitly requested (for sandboxes)."""
+    global _ssl_patched
+    if _ssl_patched or not env_flag("ALLOW_INSECURE_SSL"):
+        return
 
-if ALLOW_INSECURE_SSL:
     def _no_verify_context(*args, **kwargs):
         ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
         ctx.check_hostname = False
@@ -15,23 +28,43 @@ if ALLOW_INSECURE_SSL:
     ssl._create_default_https_context = _no_verify_context
     ssl.create_default_context = _no_verify_context
     ssl._create_unverified_context = _no_verify_context
+    _ssl_patched = True
+
 
-# Ensure SSL_CERT_FILE points to a readable cert bundle (to avoid permission errors
-# when the default system cert store is blocked in sandboxed environments).
-try:
-    import certifi
-    cert_path = certifi.where()
-    os.environ["SSL_CERT_FILE"] = cert_path
-    os.environ["REQUESTS_CA_BUNDLE"] = cert_path
-    os.environ["GRPC_DEFAULT_SSL_ROOTS_FILE_PATH"] = cert_path
-except Exception:
-    pass
-
-# Load environment variables from .env file; if unreadable (permissions/sandbox), fall back to existing env.
-try:
-    load_dotenv()
-except PermissionError:
-    print("Warning: cifr_agent_system/.env not readable; relying on existing environment variables.")
+def load_environment(dotenv_path=None):
+    """
+    Idempotent process bootstrap: load ``dotenv_path`` (default: the project's .env), point
+    SSL_CERT_FILE at a readable cert bundle (to avoid permission errors when the default
+    system cert store is blocked in sandboxed environments) and apply ALLOW_INSECURE_SSL.
+    Each .env file is loaded once per process (the default one not at all in workers that
+    inherited it); an explicit path is never skipped because another file was loaded first.
+    Config reads the environment when this module is imported, which loads the default file.
+    """
+    path = os.path.abspath(dotenv_path) if dotenv_path else _PROJECT_DOTENV
+    inherited = dotenv_path is None and os.environ.get(_BOOTSTRAP_ENV_MARKER) == "1"
+    if path not in _loaded_dotenv_paths and not inherited:
+        _loaded_dotenv_paths.add(path)
+        # If unreadable (permissions/sandbox), fall back to the existing environment.
+        try:
+            load_dotenv(path)
+        except PermissionError:
+            print("Warning: .env not readable; relying on existing environment variables.")
+    if os.environ.get(_BOOTSTRAP_ENV_MARKER) != "1":
+        if not os.getenv("SSL_CERT_FILE"):
+            try:
+                import certifi
+                cert_path = certifi.where()
+                os.environ["SSL_CERT_FILE"] = cert_path
+                os.environ["REQUESTS_CA_BUNDLE"] = cert_path
+                os.environ["GRPC_DEFAULT_SSL_ROOTS_FILE_PATH"] = cert_path
+            except Exception:
+                pass
+        os.environ[_BOOTSTRAP_ENV_MARKER] = "1"
+    _patch_insecure_ssl()
+
+
+load_environment()
+ALLOW_INSECURE_SSL = env_flag("ALLOW_INSECURE_SSL")
 
 class Config:
     # GCP Project Settings
@@ -56,12 +89,24 @@ class Config:
     OPENAI_FALLBACK_BASE_URL = os.getenv("OPENAI_FALLBACK_BASE_URL")  # e.g., https://caas-gocode-prod.caas-prod.prod.onkatana.net/v1
     OPENAI_FALLBACK_API_KEY = os.getenv("OPENAI_FALLBACK_API_KEY")  # OpenAI-compatible API key
     OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "gemini-2.0-flash-001")  # Model name on fallback service
-    ENABLE_OPENAI_FALLBACK = os.getenv("ENABLE_OPENAI_FALLBACK", "0") == "1"  # Set to "1" to enable fallback
+    ENABLE_OPENAI_FALLBACK = env_flag("ENABLE_OPENAI_FALLBACK")  # Set to "1" to enable fallback
+
+    # Build pooled Gemini clients (src/clients.py) at startup; off by default so workers start fast
+    GENAI_WARM_UP = env_flag("GENAI_WARM_UP")
+    # Build all agents (src/agents.py) at startup instead of on first use, e.g. before forking workers
+    AGENTS_WARM_UP = env_flag("AGENTS_WARM_UP")
+    # Per-request budget for model calls; X-Request-Timeout-Ms / ?timeout_ms= override it (0 = none)
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+
+    # Performance settings (caches, key pool, router, stores, queues, image preprocessing) are read
+    # by their modules from the environment when first used; see README.md and ARCHITECTURE.md.
 
-    # Ensure required environment variables are set
-    if not GCP_PROJECT_ID:
-        raise ValueError("GCP_PROJECT_ID environment variable not set.")
-    if not (GOOGLE_API_KEY or GOOGLE_API_KEY_CA or GOOGLE_API_KEY_FA or GOOGLE_API_KEY_IA):
-        raise ValueError("No Gemini API key found. Set GOOGLE_API_KEY or per-agent keys GOOGLE_API_KEY_CA/FA/IA. Get your API key from https://aistudio.google.com/app/apikey")
+    @classmethod
+    def validate(cls):
+        """Raise ValueError if required settings are missing (checked when agents are first built)."""
+        if not cls.GCP_PROJECT_ID:
+            raise ValueError("GCP_PROJECT_ID environment variable not set.")
+        if not (cls.GOOGLE_API_KEY or cls.GOOGLE_API_KEY_CA or cls.GOOGLE_API_KEY_FA or cls.GOOGLE_API_KEY_IA):
+            raise ValueError("No Gemini API key found. Set GOOGLE_API_KEY or per-agent keys GOOGLE_API_KEY_CA/FA/IA. Get your API key from https://aistudio.google.com/app/apikey")
 
     # Add other configuration variables as needed (e.g., database settings)
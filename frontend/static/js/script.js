@@ -93,7 +93,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 loadingText.textContent = '🤖 Processing through AI agents... Analyzing with Gemini AI...';
             }
             
-            const response = await fetch('/api/process_message', {
+            const response = await fetch('/api/process_message/stream', {
                 method: 'POST',
                 body: formData,
             });
@@ -102,28 +102,44 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const result = await response.json();
-            loadingIndicator.classList.add('hidden');
-            console.log("API Response:", result);
-
-            if (result.error) {
-                errorMessage.textContent = `Error: ${result.error}`;
-                errorMessage.classList.remove('hidden');
-                return;
-            }
+            // Render each agent stage as soon as the server streams it
+            const result = {};
+            let scrolled = false;
+            await readEventStream(response, (eventName, data) => {
+                if (eventName === 'warning') {
+                    // Warnings are logged server-side; not displayed to users
+                    console.log("API warning:", data);
+                    return;
+                }
+                if (eventName === 'done') {
+                    return;
+                }
+                result[eventName] = data;
+                console.log("API stage:", eventName, data);
 
-            // Warnings removed - don't display API quota/fallback information to users
-            // (Warnings are still logged server-side for debugging)
+                if (eventName === 'error') {
+                    loadingIndicator.classList.add('hidden');
+                    errorMessage.textContent = `Error: ${data}`;
+                    errorMessage.classList.remove('hidden');
+                    return;
+                }
+                if (eventName === 'original_message') {
+                    return;
+                }
 
-            displayResults(result);
-            
-            // Smooth scroll to results
-            setTimeout(() => {
-                document.querySelector('.results-section').scrollIntoView({ 
-                    behavior: 'smooth', 
-                    block: 'start' 
-                });
-            }, 100);
+                displayResults(result);
+                if (!scrolled) {
+                    scrolled = true;
+                    // Smooth scroll to results
+                    setTimeout(() => {
+                        document.querySelector('.results-section').scrollIntoView({ 
+                            behavior: 'smooth', 
+                            block: 'start' 
+                        });
+                    }, 100);
+                }
+            });
+            loadingIndicator.classList.add('hidden');
 
         } catch (error) {
             loadingIndicator.classList.add('hidden');
@@ -133,6 +149,37 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Minimal Server-Sent Events reader over a fetch() response body
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                const dataLines = [];
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length > 0) {
+                    onEvent(eventName, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
     function hideAllCards() {
         // originalMessageCard.classList.add('hidden'); // Keep original message card visible
         communicationAnalysisCard.classList.add('hidden');
@@ -0,0 +1,183 @@
+"""
+Lazy registry for the four CIFR agents.
+
+Agents, their modules and the cloud client libraries they import are loaded on first use
+instead of at ``import app``, so a worker (or a test) that never runs a pipeline never pays
+for them, and missing configuration surfaces as an error on the first request rather than
+an import failure. ``warm_up()`` builds everything ahead of time, e.g. once in the
+gunicorn master before forking (AGENTS_WARM_UP=1 with ``--preload``).
+
+With SHARED_STORE_PATH set, the knowledge agent's contexts are shared by all worker
+processes (see SharedContextAgent).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src import metrics
+from src.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("knowledge", "communication", "friction", "intervention")
+
+
+def _config() -> Any:
+    from cifr_agent_system.config import Config
+
+    Config.validate()
+    return Config
+
+
+class SharedContextAgent:
+    """
+    Wraps a KnowledgeAgent so ``store_context`` also writes to the cross-process store and
+    ``retrieve_context`` falls back to it, so a context stored by one worker process can be
+    read by the others. Everything else is delegated to the wrapped agent.
+    """
+
+    NAMESPACE = "context"
+
+    def __init__(self, agent: Any, shared: Any, ttl_seconds: Optional[float] = None):
+        self._agent = agent
+        self._shared = shared
+        self._ttl_seconds = ttl_seconds
+
+    def store_context(self, key: str, value: Any) -> Any:
+        result = self._agent.store_context(key, value)
+        try:
+            self._shared.set(self.NAMESPACE, key, value, ttl_seconds=self._ttl_seconds)
+        except Exception as exc:
+            logger.warning("Could not share context %s: %s", key, exc)
+        return result
+
+    def retrieve_context(self, key: str) -> Any:
+        value = self._agent.retrieve_context(key)
+        if value is None:
+            value = self._shared.get(self.NAMESPACE, key)
+        return value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._agent, name)
+
+
+def _build_knowledge(registry: "AgentRegistry") -> Any:
+    from cifr_agent_system.knowledge_agent import KnowledgeAgent
+
+    config = _config()
+    agent = KnowledgeAgent(project_id=config.GCP_PROJECT_ID, location=config.GCP_LOCATION)
+    shared = get_shared_store()
+    if shared is not None:
+        agent = SharedContextAgent(agent, shared, ttl_seconds=config.SHARED_CONTEXT_TTL_SECONDS or None)
+    return agent
+
+
+def _build_communication(registry: "AgentRegistry") -> Any:
+    from cifr_agent_system.communication_agent import CommunicationAgent
+
+    config = _config()
+    return CommunicationAgent(project_id=config.GCP_PROJECT_ID, knowledge_agent=registry.knowledge, location=config.GCP_LOCATION)
+
+
+def _build_friction(registry: "AgentRegistry") -> Any:
+    from cifr_agent_system.friction_detection_agent import FrictionDetectionAgent
+
+    config = _config()
+    return FrictionDetectionAgent(project_id=config.GCP_PROJECT_ID, knowledge_agent=registry.knowledge, location=config.GCP_LOCATION)
+
+
+def _build_intervention(registry: "AgentRegistry") -> Any:
+    from cifr_agent_system.intervention_agent import InterventionAgent
+
+    config = _config()
+    return InterventionAgent(
+        project_id=config.GCP_PROJECT_ID,
+        knowledge_agent=registry.knowledge,
+        friction_detection_agent=registry.friction,
+        location=config.GCP_LOCATION,
+    )
+
+
+DEFAULT_FACTORIES: Dict[str, Callable[["AgentRegistry"], Any]] = {
+    "knowledge": _build_knowledge,
+    "communication": _build_communication,
+    "friction": _build_friction,
+    "intervention": _build_intervention,
+}
+
+
+class AgentRegistry:
+    """
+    Builds each agent on first access (``registry.communication`` etc.) and keeps it.
+    ``factories`` maps role -> ``factory(registry)``; injecting them keeps tests and
+    benchmarks free of the real agent modules.
+    """
+
+    def __init__(self, factories: Optional[Dict[str, Callable[["AgentRegistry"], Any]]] = None):
+        self._factories = dict(DEFAULT_FACTORIES, **(factories or {}))
+        self._agents: Dict[str, Any] = {}
+        self._build_ms: Dict[str, float] = {}
+        # Re-entrant: building one agent builds the agents it depends on.
+        self._lock = threading.RLock()
+
+    def get(self, role: str) -> Any:
+        agent = self._agents.get(role)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._agents.get(role)
+            if agent is None:
+                started = time.perf_counter()
+                agent = self._factories[role](self)
+                elapsed = time.perf_counter() - started
+                # Includes dependencies built on the way, which get their own entries too.
+                self._build_ms[role] = round(elapsed * 1000, 1)
+                metrics.STARTUP_SECONDS.set(elapsed, phase=f"agent_{role}")
+                logger.info("Agent %s ready (%.1f ms)", role, elapsed * 1000)
+                self._agents[role] = agent
+        return agent
+
+    @property
+    def knowledge(self) -> Any:
+        return self.get("knowledge")
+
+    @property
+    def communication(self) -> Any:
+        return self.get("communication")
+
+    @property
+    def friction(self) -> Any:
+        return self.get("friction")
+
+    @property
+    def intervention(self) -> Any:
+        return self.get("intervention")
+
+    def warm_up(self) -> Dict[str, float]:
+        """Build every agent now; returns per-agent build time in ms."""
+        for role in ROLES:
+            self.get(role)
+        return dict(self._build_ms)
+
+    def status(self) -> Dict[str, Any]:
+        return {role: {"ready": role in self._agents, "build_ms": self._build_ms.get(role)} for role in ROLES}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._agents.clear()
+            self._build_ms.clear()
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_agent_registry() -> AgentRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = AgentRegistry()
+    return _registry
@@ -0,0 +1,190 @@
+"""
+Bulk processing of JSONL message files.
+
+Each input line is a JSON object. Message fields (``message_id``, ``text_content``,
+``sender``, ``timestamp``, ``image_base64``) are used as-is; ``requests.jsonl``-style
+records (``request_id``, ``title``, ``body``) are mapped onto them. The plan is created
+once per batch and executed over chunks of messages; one JSONL result line is emitted
+per message as each chunk finishes.
+
+CLI: ``python -m src.batch messages.jsonl -o results.jsonl``
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import logging
+import os
+import sys
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from src import planner
+from src.imaging import get_image_preprocessor
+from src.executor import Executor
+from src.serialization import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GOAL = "Analyze collaboration messages, detect friction and suggest interventions"
+
+
+def clamp_workers(requested: Optional[int], default: int = 4) -> int:
+    """Per-request worker count for the batch endpoint, bounded by ``BATCH_MAX_WORKERS``."""
+    limit = max(1, int(os.getenv("BATCH_MAX_WORKERS", "16")))
+    return min(max(1, default if requested is None else requested), limit)
+
+
+def normalize_record(record: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Map one JSONL record onto the message dict the agents expect."""
+    text = record.get("text_content")
+    if text is None:
+        text = record.get("text") or record.get("body") or ""
+        if record.get("title") and record.get("body"):
+            text = f"{record['title']}\n\n{record['body']}"
+    message_id = record.get("message_id") or record.get("request_id") or record.get("id")
+    image_bytes = None
+    if record.get("image_base64"):
+        try:
+            image_bytes = base64.b64decode(record["image_base64"], validate=True)
+        except (binascii.Error, ValueError):
+            logger.warning("Record %d: ignoring invalid image_base64", index)
+    image_info = None
+    preprocessor = get_image_preprocessor() if image_bytes else None
+    if preprocessor is not None:
+        image_bytes, image_info = preprocessor.process(image_bytes)
+    return {
+        "message_id": str(message_id) if message_id else f"batch_message_{index}_{uuid.uuid4().hex[:8]}",
+        "text_content": text,
+        "image_bytes": image_bytes,
+        "image_preprocessing": image_info,
+        "timestamp": record.get("timestamp"),
+        "sender": record.get("sender", "Batch"),
+    }
+
+
+def parse_jsonl(lines: Iterable[Union[str, bytes]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield normalized messages; malformed lines are yielded as
+    ``{"line": n, "error": ...}`` records so the caller can report them in order.
+    """
+    index = 0
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield {"line": line_no, "error": f"invalid JSON: {exc}"}
+            continue
+        if not isinstance(record, dict):
+            yield {"line": line_no, "error": "expected a JSON object"}
+            continue
+        yield normalize_record(record, index)
+        index += 1
+
+
+def _group_results(messages: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Regroup ``run_plan`` output per message. It is laid out step by step, one result per
+    message in message order (a skipped step has a single entry), so results are matched
+    by position: message IDs may be missing or repeated within a batch.
+    """
+    entries = [{"message_id": message["message_id"], "results": {}, "errors": []} for message in messages]
+    position = 0
+    for result in results:
+        if result["type"] == "skipped":
+            continue
+        entry = entries[position % len(entries)]
+        position += 1
+        if result["type"] == "error":
+            entry["errors"].append({"step": result.get("step"), "error": result.get("error")})
+        else:
+            entry["results"][result["type"]] = result.get("result")
+    yield from entries
+
+
+def run_batch(
+    executor: Executor,
+    records: Iterable[Dict[str, Any]],
+    goal: str = DEFAULT_GOAL,
+    context: Optional[Dict[str, Any]] = None,
+    chunk_size: int = 100,
+) -> Iterator[Dict[str, Any]]:
+    """Plan once, then run the plan chunk by chunk and yield one result per message."""
+    plan_result = planner.plan(goal, context)
+    executor.memory.log("plan_created", {"goal": goal, "plan": plan_result, "batch": True})
+    yield {"plan": {"source": plan_result["source"], "steps": plan_result["steps"]}}
+
+    chunk: List[Dict[str, Any]] = []
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        results = executor.run_plan(plan_result, chunk)
+        yield from _group_results(chunk, results)
+        chunk.clear()
+
+    for record in records:
+        if "error" in record and "message_id" not in record:
+            yield record
+            continue
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    if chunk:
+        yield from flush()
+
+
+def to_jsonl(record: Dict[str, Any]) -> str:
+    return json.dumps(to_jsonable(record)) + "\n"
+
+
+def _build_executor(max_workers: int, pipeline: bool) -> Executor:
+    from src.agents import get_agent_registry
+
+    agents = get_agent_registry()
+    return Executor(
+        communication_agent=agents.communication,
+        friction_detection_agent=agents.friction,
+        intervention_agent=agents.intervention,
+        knowledge_agent=agents.knowledge,
+        max_workers=max_workers,
+        pipeline=pipeline,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the CIFR pipeline over a JSONL file of messages.")
+    parser.add_argument("input", help="JSONL input file ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--goal", default=DEFAULT_GOAL, help="Planner goal for the batch")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Messages per executor run")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent messages per step")
+    parser.add_argument("--pipeline", action="store_true", help="Use the per-message DAG scheduler")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", stream=sys.stderr)
+    executor = _build_executor(args.workers, args.pipeline)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    count = 0
+    try:
+        for record in run_batch(executor, parse_jsonl(source), goal=args.goal, chunk_size=args.chunk_size):
+            sink.write(to_jsonl(record))
+            sink.flush()
+            count += "message_id" in record
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    logger.info("Processed %d messages", count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import hashlib
+import tempfile
+from typing import Any, BinaryIO, Dict, Optional
+
+_CHUNK_SIZE = 64 * 1024
+_DEFAULT_MAX_MEMORY = 1024 * 1024
+
+
+class Blob:
+    """
+    Upload held in a spooled temp file (memory up to ``max_memory``, then disk) with its
+    SHA-256 and size computed while streaming it in. Messages, responses and traces carry
+    the Blob or its ``describe()`` digest; raw bytes are only materialized on ``read()``.
+    """
+
+    __slots__ = ("_file", "sha256", "size", "mime_type", "filename")
+
+    def __init__(self, file: BinaryIO, sha256: str, size: int, mime_type: Optional[str] = None, filename: Optional[str] = None):
+        self._file = file
+        self.sha256 = sha256
+        self.size = size
+        self.mime_type = mime_type
+        self.filename = filename
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: BinaryIO,
+        mime_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        max_memory: int = _DEFAULT_MAX_MEMORY,
+    ) -> "Blob":
+        spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = stream.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+        return cls(spool, digest.hexdigest(), size, mime_type, filename)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: Optional[str] = None, filename: Optional[str] = None) -> "Blob":
+        spool = tempfile.SpooledTemporaryFile(max_size=_DEFAULT_MAX_MEMORY)
+        spool.write(data)
+        spool.seek(0)
+        return cls(spool, hashlib.sha256(data).hexdigest(), len(data), mime_type, filename)
+
+    def read(self) -> bytes:
+        """Materialize the content; callers should drop the bytes as soon as they are done."""
+        self._file.seek(0)
+        return self._file.read()
+
+    def describe(self) -> Dict[str, Any]:
+        return {"sha256": self.sha256, "size": self.size, "mime_type": self.mime_type}
+
+    # Picked up by src.serialization, so a Blob in a payload serializes to its digest.
+    to_dict = describe
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "Blob":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __repr__(self) -> str:
+        return f"Blob(sha256={self.sha256[:12]}…, size={self.size})"
+
+
+def describe_bytes(data: Any) -> Dict[str, Any]:
+    data = bytes(data)
+    return {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+
+
+def agent_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of ``message`` for an agent call: agents that read ``image_bytes`` get the bytes
+    for the duration of the call, the stored message keeps only the Blob reference.
+    """
+    blob = message.get("image_blob")
+    if not blob or message.get("image_bytes") is not None:
+        return message
+    view = dict(message)
+    view["image_bytes"] = blob.read()
+    return view
+
+
+def trace_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of ``message`` safe to keep in responses and traces: digests and sizes, no raw bytes."""
+    if message.get("image_bytes") is None and message.get("image_blob") is None:
+        return message
+    view = {k: v for k, v in message.items() if k not in ("image_bytes", "image_blob")}
+    blob = message.get("image_blob")
+    if blob is not None:
+        view["image"] = blob.describe()
+    else:
+        view["image"] = describe_bytes(message["image_bytes"])
+    return view
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+    In-memory LRU tier with TTL, then an optional cross-process tier (``shared``, a
+    src.shared_store.SharedStore namespace) and an optional on-disk tier (one JSON file
+    per key, bounded by ``max_disk_entries`` and, if set, ``max_disk_bytes``). Values must
+    be JSON-serializable when either of the last two is enabled.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = 10000,
+        max_disk_bytes: int = 0,
+        shared: Optional[Any] = None,
+        namespace: str = "llm",
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self.max_disk_bytes = max(0, int(max_disk_bytes))  # 0 = no byte budget
+        self.shared = shared
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "memory_hits": 0, "shared_hits": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+        # Running totals of the disk tier, so a write only scans the directory when over budget.
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_recount()
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, image_bytes: Optional[bytes] = None) -> str:
+        """Key on model ID, prompt hash and image-bytes hash."""
+        prompt_hash = _sha256((prompt or "").encode("utf-8"))
+        image_hash = _sha256(bytes(image_bytes)) if image_bytes else "-"
+        return _sha256(f"{model_id}|{prompt_hash}|{image_hash}".encode("utf-8"))
+
+    # --- public API ----------------------------------------------------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["expired"] += 1
+
+        tier = "shared_hits"
+        found = self._shared_get(key)
+        if found is None:
+            tier = "disk_hits"
+            found = self._disk_get(key, now)
+        with self._lock:
+            if found is None:
+                self._counters["misses"] += 1
+                return default
+            self._counters["hits"] += 1
+            self._counters[tier] += 1
+        # Promoted entries keep the expiry they were stored with.
+        value, expires_at = found
+        self._memory_set(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        self._memory_set(key, value, expires_at)
+        self._shared_set(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value or compute, store (unless None) and return it."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear(self.namespace)
+        if self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith(".json"):
+                    self._remove(entry.path)
+            self._disk_recount()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            stats["disk_entries"] = self._disk_entries
+            stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    # --- memory tier ---------------------------------------------------------
+
+    def _memory_set(self, key: str, value: Any, expires_at: float) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    # --- shared tier ---------------------------------------------------------
+
+    def _shared_get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, expires_at) from the shared tier, or None."""
+        if self.shared is None:
+            return None
+        try:
+            entry = self.shared.get_entry(self.namespace, key)
+        except Exception as exc:
+            logger.warning("Response cache shared read failed: %s", exc)
+            return None
+        if entry is None:
+            return None
+        value, expires_at = entry
+        return value, time.time() + self.ttl_seconds if expires_at is None else expires_at
+
+    def _shared_set(self, key: str, value: Any, expires_at: float) -> None:
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(self.namespace, key, value, ttl_seconds=max(0.001, expires_at - time.time()))
+        except Exception as exc:
+            logger.warning("Response cache shared write failed: %s", exc)
+
+    # --- disk tier -----------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[Any, float]]:
+        """(value, expires_at) from the disk tier, or None."""
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                record = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if record.get("expires_at", 0) <= now:
+            size = self._size(path)
+            if self._remove(path):
+                self._disk_account(-1, -size)
+            with self._lock:
+                self._counters["expired"] += 1
+            return None
+        return record.get("value"), record["expires_at"]
+
+    def _disk_set(self, key: str, value: Any, expires_at: float) -> None:
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"expires_at": expires_at, "value": value}, fh)
+            written = os.path.getsize(tmp_path)
+            replaced = self._size(path)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as exc:
+            logger.warning("Response cache disk write failed: %s", exc)
+            self._remove(tmp_path)
+            return
+        self._disk_account(0 if replaced else 1, written - replaced)
+        if self._disk_over_budget():
+            self._disk_evict()
+
+    def _disk_account(self, entries: int, size: int) -> None:
+        with self._lock:
+            self._disk_entries = max(0, self._disk_entries + entries)
+            self._disk_bytes = max(0, self._disk_bytes + size)
+
+    def _disk_over_budget(self) -> bool:
+        with self._lock:
+            return self._disk_entries > self.max_disk_entries or bool(
+                self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes
+            )
+
+    def _disk_recount(self) -> None:
+        entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith(".json")]
+        with self._lock:
+            self._disk_entries = len(entries)
+            self._disk_bytes = sum(self._entry_size(e) for e in entries)
+
+    def _disk_evict(self) -> None:
+        # Only runs when the running totals say the tier is over budget. The scan also
+        # corrects the totals for files other processes wrote to the same directory.
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        # Trim to 90% of the bounds, oldest writes first, so eviction is not paid on every set.
+        entries.sort()
+        count, total = len(entries), sum(size for _, size, _ in entries)
+        max_count = int(self.max_disk_entries * 0.9)
+        max_bytes = int(self.max_disk_bytes * 0.9) if self.max_disk_bytes else None
+        evicted = 0
+        for _, size, path in entries:
+            if count <= max_count and (max_bytes is None or total <= max_bytes):
+                break
+            if self._remove(path):
+                evicted += 1
+            count -= 1
+            total -= size
+        with self._lock:
+            self._disk_entries = count
+            self._disk_bytes = total
+            self._counters["evictions"] += evicted
+
+    @staticmethod
+    def _entry_size(entry: "os.DirEntry") -> int:
+        try:
+            return entry.stat().st_size
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Process-wide cache configured from LLM_CACHE_* environment variables; shared with the
+    other worker processes when SHARED_STORE_PATH is set.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache(
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+                    disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+                    max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000")),
+                    max_disk_bytes=int(os.getenv("LLM_CACHE_MAX_DISK_BYTES", "0")),
+                    shared=get_shared_store(),
+                    namespace="llm",
+                )
+    return _shared_cache
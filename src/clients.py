@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from src import lazy
+
+logger = logging.getLogger(__name__)
+
+# Roles mirror the per-agent keys on Config; unset roles fall back to the default key.
+KEY_ENV_VARS = {
+    "default": "GOOGLE_API_KEY",
+    "ca": "GOOGLE_API_KEY_CA",
+    "fa": "GOOGLE_API_KEY_FA",
+    "ia": "GOOGLE_API_KEY_IA",
+}
+
+
+def _default_factory(api_key: str) -> Any:
+    # google.genai is imported on the first client, not at module import.
+    return lazy.load("google.genai").Client(api_key=api_key)
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of ``genai.Client`` objects keyed by API key.
+    Clients are thread-safe and keep their HTTP connection pool, so reusing them
+    avoids a TLS/connection setup per request.
+    """
+
+    def __init__(self, factory: Optional[Callable[[str], Any]] = None):
+        self._factory = factory
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _make(self, api_key: str) -> Optional[Any]:
+        if self._factory is not None:
+            return self._factory(api_key)
+        if lazy.load("google.genai") is None:
+            return None
+        return _default_factory(api_key)
+
+    def available(self) -> bool:
+        """True when clients can be built (google.genai installed or a factory injected)."""
+        return self._factory is not None or lazy.available("google.genai")
+
+    def get(self, api_key: Optional[str]) -> Optional[Any]:
+        """Return the shared client for ``api_key`` (None if unavailable)."""
+        if not api_key:
+            return None
+        client = self._clients.get(api_key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                try:
+                    client = self._make(api_key)
+                except Exception as exc:
+                    logger.warning("Could not create Gemini client: %s", exc)
+                    return None
+                if client is not None:
+                    self._clients[api_key] = client
+        return client
+
+    @staticmethod
+    def configured_keys() -> Dict[str, str]:
+        """Role -> API key for every key present in the environment."""
+        keys = {}
+        for role, env_var in KEY_ENV_VARS.items():
+            value = os.getenv(env_var)
+            if value:
+                keys[role] = value
+        return keys
+
+    def for_role(self, role: str = "default") -> Optional[Any]:
+        """Client for an agent role (default/ca/fa/ia), falling back to the default key."""
+        keys = self.configured_keys()
+        return self.get(keys.get(role) or keys.get("default"))
+
+    def warm_up(self, roles: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Construct clients for the configured keys ahead of the first request."""
+        started = time.perf_counter()
+        keys = self.configured_keys()
+        status = {role: self.get(keys[role]) is not None for role in (roles or keys) if role in keys}
+        logger.info("Gemini client warm-up: %s (%.1f ms)", status, (time.perf_counter() - started) * 1000)
+        return status
+
+    def health_check(self, deep: bool = False, model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Report per-role client status without building clients: "ready" once a role's
+        client exists, "configured" when its key is set and one can be built. ``deep=True``
+        builds the clients and fetches model metadata through each, which exercises the key
+        and the connection without spending quota.
+        """
+        model = model or os.getenv("GEMINI_PRO_MODEL_ID", "gemini-2.0-flash")
+        keys = self.configured_keys()
+        report: Dict[str, Dict[str, Any]] = {}
+        for role in KEY_ENV_VARS:
+            if role not in keys:
+                report[role] = {"status": "not_set"}
+                continue
+            if not deep:
+                if keys[role] in self._clients:
+                    report[role] = {"status": "ready"}
+                else:
+                    report[role] = {"status": "configured" if self.available() else "unavailable"}
+                continue
+            client = self.get(keys[role])
+            if client is None:
+                report[role] = {"status": "unavailable"}
+                continue
+            started = time.perf_counter()
+            try:
+                client.models.get(model=model)
+                report[role] = {"status": "working"}
+            except Exception as exc:
+                error_str = str(exc)
+                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
+                    report[role] = {"status": "quota_exhausted"}
+                else:
+                    report[role] = {"status": "error", "error": error_str[:100]}
+            report[role]["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+
+_registry = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    return _registry
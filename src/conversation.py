@@ -0,0 +1,308 @@
+"""
+Incremental per-conversation friction signals.
+
+Each thread keeps rolling aggregates that are updated in O(1) per message:
+
+- sentiment: fast and slow EWMAs per thread (the trend is fast - slow) and a fast EWMA per participant
+- entity overlap: Jaccard overlap of the message's entities with those of the last ``window`` messages
+- unanswered questions: questions not yet followed by a message from another participant
+
+The combined ``score`` decides whether the expensive LLM friction call is worth making
+(``escalate``); a single clearly negative message (sentiment <= ``escalate_sentiment``)
+escalates on its own, since the EWMAs need a few messages to move. Sentiment and entities
+come from the communication analysis when it has them, otherwise from a small lexical
+fallback.
+
+Messages without a ``thread_id`` or ``channel`` have no conversation to build on: their
+signals are computed from that message alone and they always escalate, rather than
+pooling unrelated senders into one shared state.
+"""
+
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Any, Deque, Dict, FrozenSet, List, Optional
+
+from src.shared_store import get_shared_store
+
+DEFAULT_THRESHOLD = float(os.getenv("FRICTION_GATE_THRESHOLD", "0.5"))
+
+# src.shared_store namespace holding thread state in multi-process mode.
+SHARED_NAMESPACE = "conversation"
+
+_WORD_RE = re.compile(r"[a-z']+")
+_ENTITY_RE = re.compile(r"@\w+|#\w+|\b[A-Z][a-zA-Z0-9]+(?:\s+[A-Z][a-zA-Z0-9]+)*")
+_NEGATIVE = frozenset(
+    "blocked blocker broken confused confusing delay delayed disagree frustrated frustrating "
+    "late missed never problem unclear unhappy urgent wrong why issue issues conflict stuck "
+    "again still break breaks breaking broke ruin ruined ruining quit quitting miss missing "
+    "fail failed failing failure down outage crash crashed wasted useless".split()
+)
+_POSITIVE = frozenset("agree agreed thanks thank great good done clear resolved perfect works fixed sounds".split())
+
+
+def negative_cues(text: str) -> List[str]:
+    """Words of ``text`` in the negative / friction lexicon, in order."""
+    return [w for w in _WORD_RE.findall(text.lower()) if w in _NEGATIVE]
+
+
+def lexical_sentiment(text: str) -> float:
+    words = _WORD_RE.findall(text.lower())
+    pos = sum(1 for w in words if w in _POSITIVE)
+    neg = sum(1 for w in words if w in _NEGATIVE)
+    if pos + neg == 0:
+        return 0.0
+    return (pos - neg) / (pos + neg)
+
+
+def _analysis_sentiment(analysis: Any) -> Optional[float]:
+    if not isinstance(analysis, dict):
+        return None
+    sentiment = analysis.get("sentiment")
+    if isinstance(sentiment, dict) and isinstance(sentiment.get("score"), (int, float)):
+        return float(sentiment["score"])
+    if isinstance(analysis.get("sentiment_score"), (int, float)):
+        return float(analysis["sentiment_score"])
+    return None
+
+
+def _analysis_entities(analysis: Any) -> Optional[FrozenSet[str]]:
+    if not isinstance(analysis, dict) or not isinstance(analysis.get("entities"), list):
+        return None
+    names = (e.get("name") if isinstance(e, dict) else e for e in analysis["entities"])
+    return frozenset(str(n).lower() for n in names if n)
+
+
+def lexical_entities(text: str) -> FrozenSet[str]:
+    """@mentions, #tags and capitalized words/phrases that do not just start a sentence."""
+    found = set()
+    for match in _ENTITY_RE.finditer(text):
+        before = text[: match.start()].rstrip()
+        if match.group(0)[0] not in "@#" and (not before or before[-1] in ".!?"):
+            continue
+        found.add(match.group(0).lower())
+    return frozenset(found)
+
+
+def thread_key(message: Dict[str, Any]) -> Optional[str]:
+    key = message.get("thread_id") or message.get("channel")
+    return str(key) if key else None
+
+
+class _ThreadState:
+    __slots__ = (
+        "messages", "fast", "slow", "participants", "recent_entities", "entity_counts",
+        "open_questions", "last_score",
+    )
+
+    def __init__(self):
+        self.messages = 0
+        self.fast = 0.0
+        self.slow = 0.0
+        self.participants: Dict[str, float] = {}
+        self.recent_entities: Deque[FrozenSet[str]] = deque()
+        self.entity_counts: Counter = Counter()
+        self.open_questions: Dict[str, int] = {}  # asker -> open question count
+        self.last_score = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "fast": self.fast,
+            "slow": self.slow,
+            "participants": self.participants,
+            "recent_entities": [sorted(entities) for entities in self.recent_entities],
+            "open_questions": self.open_questions,
+            "last_score": self.last_score,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "_ThreadState":
+        state = cls()
+        if data:
+            state.messages = data["messages"]
+            state.fast = data["fast"]
+            state.slow = data["slow"]
+            state.participants = dict(data["participants"])
+            state.recent_entities = deque(frozenset(entities) for entities in data["recent_entities"])
+            for entities in state.recent_entities:
+                state.entity_counts.update(entities)
+            state.open_questions = dict(data["open_questions"])
+            state.last_score = data["last_score"]
+        return state
+
+
+class ConversationTracker:
+    """
+    Per-thread rolling state; ``update`` returns the signals and the escalate decision.
+    With ``shared`` (a src.shared_store.SharedStore) the state lives there instead, so
+    messages of one thread handled by different worker processes build on each other.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        escalate_sentiment: float = -0.5,
+        fast_alpha: float = 0.5,
+        slow_alpha: float = 0.1,
+        window: int = 20,
+        max_threads: int = 10000,
+        shared: Optional[Any] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.threshold = threshold
+        self.escalate_sentiment = escalate_sentiment
+        self.fast_alpha = fast_alpha
+        self.slow_alpha = slow_alpha
+        self.window = max(1, window)
+        self.max_threads = max_threads
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self._threads: "OrderedDict[str, _ThreadState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key: str) -> _ThreadState:
+        state = self._threads.get(key)
+        if state is None:
+            state = self._threads[key] = _ThreadState()
+            if len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(key)
+        return state
+
+    def update(self, message: Dict[str, Any], analysis: Any = None) -> Dict[str, Any]:
+        text = message.get("text_content") or ""
+        sender = str(message.get("sender") or "unknown")
+        sentiment = _analysis_sentiment(analysis)
+        if sentiment is None:
+            sentiment = lexical_sentiment(text)
+        entities = _analysis_entities(analysis)
+        if entities is None:
+            entities = lexical_entities(text)
+        is_question = "?" in text
+        key = thread_key(message)
+
+        if key is None:
+            signals = self._apply(_ThreadState(), key, sender, sentiment, entities, is_question)
+            return dict(signals, escalate=True)
+        if self.shared is not None:
+            # Read-modify-write under the store's write lock, so workers do not lose updates.
+            with self.shared.transaction():
+                state = _ThreadState.from_dict(self.shared.get(SHARED_NAMESPACE, key))
+                signals = self._apply(state, key, sender, sentiment, entities, is_question)
+                self.shared.set(SHARED_NAMESPACE, key, state.to_dict(), ttl_seconds=self.ttl_seconds)
+            return signals
+        with self._lock:
+            return self._apply(self._state(key), key, sender, sentiment, entities, is_question)
+
+    def _apply(
+        self,
+        state: _ThreadState,
+        key: Optional[str],
+        sender: str,
+        sentiment: float,
+        entities: FrozenSet[str],
+        is_question: bool,
+    ) -> Dict[str, Any]:
+        """Fold one message into ``state``; the caller holds whichever lock guards it."""
+        if state.messages == 0:
+            state.fast = state.slow = sentiment
+        else:
+            state.fast += self.fast_alpha * (sentiment - state.fast)
+            state.slow += self.slow_alpha * (sentiment - state.slow)
+        previous = state.participants.get(sender, sentiment)
+        state.participants[sender] = previous + self.fast_alpha * (sentiment - previous)
+
+        # Overlap against the window before this message joins it
+        window_size = len(state.entity_counts)
+        shared = sum(1 for e in entities if e in state.entity_counts)
+        union = window_size + len(entities) - shared
+        overlap = shared / union if union else 1.0
+        state.recent_entities.append(entities)
+        state.entity_counts.update(entities)
+        if len(state.recent_entities) > self.window:
+            expired = state.recent_entities.popleft()
+            state.entity_counts.subtract(expired)
+            for e in expired:
+                if state.entity_counts[e] <= 0:
+                    del state.entity_counts[e]
+
+        # A statement from one participant answers the questions open from everyone else
+        if is_question:
+            state.open_questions[sender] = min(state.open_questions.get(sender, 0) + 1, self.window)
+        elif state.open_questions:
+            own = state.open_questions.get(sender)
+            state.open_questions = {sender: own} if own else {}
+        unanswered = sum(state.open_questions.values())
+
+        state.messages += 1
+        trend = state.fast - state.slow
+        score = (
+            0.35 * max(0.0, -sentiment)
+            + 0.3 * max(0.0, -state.fast)
+            + 0.2 * min(1.0, 2 * max(0.0, -trend))
+            + 0.1 * min(unanswered, 3) / 3
+            + (0.05 * (1.0 - overlap) if state.messages > 1 and entities else 0.0)
+        )
+        state.last_score = score
+
+        return {
+            "thread_id": key,
+            "messages": state.messages,
+            "sentiment": round(sentiment, 4),
+            "sentiment_ewma": round(state.fast, 4),
+            "sentiment_trend": round(trend, 4),
+            "participant_sentiment": round(state.participants[sender], 4),
+            "entity_overlap": round(overlap, 4),
+            "unanswered_questions": unanswered,
+            "score": round(score, 4),
+            "escalate": score >= self.threshold or sentiment <= self.escalate_sentiment,
+        }
+
+    def get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self.shared is not None:
+                data = self.shared.get(SHARED_NAMESPACE, thread_id)
+                state = _ThreadState.from_dict(data) if data else None
+            else:
+                state = self._threads.get(thread_id)
+            if state is None:
+                return None
+            return {
+                "thread_id": thread_id,
+                "messages": state.messages,
+                "sentiment_ewma": state.fast,
+                "sentiment_trend": state.fast - state.slow,
+                "participants": dict(state.participants),
+                "unanswered_questions": sum(state.open_questions.values()),
+                "score": state.last_score,
+            }
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+
+def skipped_friction(signals: Dict[str, Any]) -> Dict[str, Any]:
+    """Friction result used when the cheap signals stay below the threshold."""
+    return {
+        "friction_detected": False,
+        "reason": "Conversation signals below friction threshold; LLM check skipped.",
+        "decided_by": "conversation_state",
+        "conversation_signals": signals,
+    }
+
+
+_shared_tracker: Optional[ConversationTracker] = None
+_shared_lock = threading.Lock()
+
+
+def get_conversation_tracker() -> ConversationTracker:
+    global _shared_tracker
+    if _shared_tracker is None:
+        with _shared_lock:
+            if _shared_tracker is None:
+                ttl = float(os.getenv("SHARED_CONTEXT_TTL_SECONDS", "604800"))
+                _shared_tracker = ConversationTracker(shared=get_shared_store(), ttl_seconds=ttl or None)
+    return _shared_tracker
@@ -1,15 +1,37 @@
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.blobs import agent_message, trace_message
+from src.conversation import ConversationTracker, get_conversation_tracker, skipped_friction
+from src.knowledge_store import KnowledgeStore, get_knowledge_store
 from src.memory import MemoryStore
-from src import planner
+from src.scheduler import DagScheduler
+from src import metrics, planner, prefilter, request_context
 
 logger = logging.getLogger(__name__)
 
+# STAGE_SECONDS label per handler; the same names the web pipeline (app.py) times its stages under.
+_STAGE_LABELS = {"_analyze": "communication", "_detect_friction": "friction", "_generate_intervention": "intervention"}
+
 
 class Executor:
     """
     Coordinates planning and tool/agent calls.
     Expects injected agents to keep dependencies explicit for the hackathon template.
+
+    ``max_workers`` > 1 fans the messages of each step out over a bounded thread pool.
+    Results and trace entries keep the original message order either way.
+    ``pipeline=True`` swaps the per-step barrier for a per-message dependency graph
+    (see ``src.scheduler``); results keep plan order, the trace records completion order.
+    ``knowledge_store`` (default: the shared store, see ``src.knowledge_store``) indexes each
+    analysis so friction detection and planning get the most similar past messages.
+    ``conversation_tracker`` (default: the shared tracker, see ``src.conversation``) keeps
+    rolling per-thread signals; the LLM friction call only runs once they cross its threshold.
+    Messages are folded into it in message order on the calling thread, so parallel runs
+    reach the same decisions as the sequential path.
+    Messages the local pre-filter (``src.prefilter``) marks benign skip friction and intervention
+    model calls entirely; results carry ``decided_by`` when a local tier decided.
     """
 
     def __init__(
@@ -19,58 +41,265 @@ class Executor:
         intervention_agent: Any,
         knowledge_agent: Any,
         memory_store: Optional[MemoryStore] = None,
+        max_workers: int = 1,
+        pipeline: bool = False,
+        knowledge_store: Optional[KnowledgeStore] = None,
+        conversation_tracker: Optional[ConversationTracker] = None,
     ):
         self.communication_agent = communication_agent
         self.friction_detection_agent = friction_detection_agent
         self.intervention_agent = intervention_agent
         self.knowledge_agent = knowledge_agent
-        self.memory = memory_store or MemoryStore()
+        self.memory = memory_store if memory_store is not None else MemoryStore()
+        self.max_workers = max(1, int(max_workers))
+        self.pipeline = pipeline
+        self.knowledge_store = knowledge_store if knowledge_store is not None else get_knowledge_store()
+        self.conversations = conversation_tracker if conversation_tracker is not None else get_conversation_tracker()
+        # id(message) -> local tier that ruled out friction, consumed by the intervention step.
+        # Keyed by identity (IDs may be missing or repeated) and cleared when run_plan returns.
+        self._local_decisions: Dict[int, str] = {}
+        # id(message) -> (conversation signals, error) folded ahead of the friction step.
+        self._signals: Dict[int, Tuple[Optional[Dict[str, Any]], Optional[Exception]]] = {}
+        self._decisions_lock = threading.Lock()
 
     def execute_plan(
         self,
         goal: str,
         messages: List[Dict[str, Any]],
         context: Optional[Dict[str, Any]] = None,
+        max_workers: Optional[int] = None,
+        pipeline: Optional[bool] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Dict[str, Any]:
-        plan_result = planner.plan(goal, context)
-        self.memory.log("plan_created", {"goal": goal, "plan": plan_result})
+        """
+        Plan for ``goal`` and run the plan over ``messages``.
+        ``on_result`` is called with each result as soon as it is recorded.
+        """
+        if self.knowledge_store is not None and len(self.knowledge_store):
+            context = dict(context or {}, related_history=self._related(goal))
+        with metrics.EXECUTE_PLAN_SECONDS.time():
+            plan_result = planner.plan(goal, context)
+            self.memory.log("plan_created", {"goal": goal, "plan": plan_result})
+            results = self.run_plan(plan_result, messages, max_workers=max_workers, pipeline=pipeline, on_result=on_result)
+        return {"plan": plan_result, "results": results, "trace": self.memory.latest()}
+
+    def run_plan(
+        self,
+        plan_result: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        max_workers: Optional[int] = None,
+        pipeline: Optional[bool] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run an existing plan over ``messages``; lets batch callers plan once and reuse it."""
+        workers = self.max_workers if max_workers is None else max(1, int(max_workers))
+        use_pipeline = self.pipeline if pipeline is None else pipeline
+        try:
+            return self._run(plan_result["steps"], messages, workers, use_pipeline, on_result)
+        finally:
+            with self._decisions_lock:
+                for message in messages:
+                    self._local_decisions.pop(id(message), None)
+                    self._signals.pop(id(message), None)
+
+    def _run(
+        self,
+        steps: List[Dict[str, Any]],
+        messages: List[Dict[str, Any]],
+        workers: int,
+        use_pipeline: bool,
+        on_result: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> List[Dict[str, Any]]:
+        handlers = self._handlers()
+        if use_pipeline:
+            return self._run_pipelined(steps, handlers, messages, workers, on_result)
 
         results: List[Dict[str, Any]] = []
+        for step in steps:
+            handler = handlers.get(step.get("action"))
+            if handler is None:
+                step_results = [self._skip(step)]
+            else:
+                if step.get("action") == "detect_friction":
+                    for message in messages:
+                        self._fold_conversation(message)
+                step_results = self._run_step(step, handler, messages, workers)
+            for result in step_results:
+                if on_result:
+                    on_result(result)
+            results.extend(step_results)
+        return results
 
-        for step in plan_result["steps"]:
-            action = step.get("action")
+    # --- step handlers -------------------------------------------------------
 
-            if action == "analyze_messages":
-                for message in messages:
-                    analysis = self.communication_agent.process_collaboration_message(message)
-                    self.memory.log("analysis", {"message": message, "analysis": analysis})
-                    results.append({"step": step["id"], "type": "analysis", "result": analysis})
+    def _handlers(self) -> Dict[str, Callable[[Dict[str, Any]], Tuple[str, str, Any]]]:
+        """Map plan actions to per-message handlers returning (event, result_type, result)."""
+        return {
+            "analyze_messages": self._analyze,
+            "detect_friction": self._detect_friction,
+            "generate_interventions": self._generate_intervention,
+        }
 
-            elif action == "detect_friction":
-                for message in messages:
-                    context_key = f"communication_analysis_{message.get('message_id', 'demo_msg')}"
-                    stored = self.knowledge_agent.retrieve_context(context_key) or {"message": message}
-                    friction = self.friction_detection_agent.detect_misalignment(stored)
-                    self.memory.log("friction_detection", {"message": message, "friction": friction})
-                    results.append({"step": step["id"], "type": "friction", "result": friction})
+    @staticmethod
+    def _context_key(message: Dict[str, Any]) -> str:
+        return f"communication_analysis_{message.get('message_id', 'demo_msg')}"
 
-            elif action == "generate_interventions":
-                for message in messages:
-                    context_key = f"communication_analysis_{message.get('message_id', 'demo_msg')}"
-                    stored = self.knowledge_agent.retrieve_context(context_key) or {"message": message}
-                    friction = stored.get("friction", {})
-                    intervention = self.intervention_agent.suggest_clarification(
-                        {"message": stored.get("message", {}), "reason": friction.get("reason", "")}
-                    )
-                    self.memory.log("intervention", {"message": message, "intervention": intervention})
-                    results.append({"step": step["id"], "type": "intervention", "result": intervention})
+    def _stored_context(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return self.knowledge_agent.retrieve_context(self._context_key(message)) or {"message": message}
 
-            else:
-                # Unknown action; log and continue
-                logger.warning("Skipped unknown action: %s", action)
-                self.memory.log("skipped_step", {"step": step})
-                results.append({"step": step.get("id"), "type": "skipped", "reason": "unknown action"})
+    def _related(self, text: str, exclude: Tuple[str, ...] = (), k: int = 3) -> List[Dict[str, Any]]:
+        hits = self.knowledge_store.search(text or "", k=k, exclude=exclude)
+        return [{"message_id": value["message_id"], "text_content": value["text_content"], "score": round(score, 4)} for _, score, value in hits]
 
-        return {"plan": plan_result, "results": results, "trace": self.memory.latest()}
+    def _analyze(self, message: Dict[str, Any]) -> Tuple[str, str, Any]:
+        analysis = self.communication_agent.process_collaboration_message(agent_message(message))
+        if self.knowledge_store is not None:
+            text = message.get("text_content", "")
+            self.knowledge_store.put(
+                self._context_key(message),
+                {"message_id": message.get("message_id"), "text_content": text, "analysis": analysis},
+                text=text,
+            )
+        return "analysis", "analysis", analysis
+
+    def _fold_conversation(self, message: Dict[str, Any]) -> None:
+        """Fold ``message`` into its thread's state now; the friction step picks the signals up."""
+        try:
+            signals = self.conversations.update(message, self._stored_context(message).get("analysis"))
+            folded: Tuple[Optional[Dict[str, Any]], Optional[Exception]] = (signals, None)
+        except Exception as exc:
+            folded = (None, exc)
+        with self._decisions_lock:
+            self._signals[id(message)] = folded
+
+    def _detect_friction(self, message: Dict[str, Any]) -> Tuple[str, str, Any]:
+        stored = self._stored_context(message)
+        verdict = prefilter.classify(message)
+        with self._decisions_lock:
+            folded = self._signals.pop(id(message), None)
+        if folded is None:
+            signals = self.conversations.update(message, stored.get("analysis"))
+        else:
+            signals, exc = folded
+            if exc is not None:
+                raise exc
+        if verdict["benign"]:
+            self._decided_locally(message, "prefilter")
+            return "friction_detection", "friction", prefilter.benign_friction(verdict)
+        if not signals["escalate"]:
+            self._decided_locally(message, "conversation_state")
+            return "friction_detection", "friction", skipped_friction(signals)
+        stored = dict(stored, conversation_signals=signals)
+        if self.knowledge_store is not None:
+            key = self._context_key(message)
+            stored = dict(stored, related_history=self._related(message.get("text_content", ""), exclude=(key,)))
+        metrics.PIPELINE_DECISIONS.inc(decided_by="llm")
+        friction = self.friction_detection_agent.detect_misalignment(stored)
+        return "friction_detection", "friction", friction
 
+    def _decided_locally(self, message: Dict[str, Any], tier: str) -> None:
+        metrics.PIPELINE_DECISIONS.inc(decided_by=tier)
+        with self._decisions_lock:
+            self._local_decisions[id(message)] = tier
 
+    def _generate_intervention(self, message: Dict[str, Any]) -> Tuple[str, str, Any]:
+        with self._decisions_lock:
+            decided_by = self._local_decisions.pop(id(message), None)
+        if decided_by is not None:
+            return "intervention", "intervention", prefilter.skipped_intervention(decided_by)
+        stored = self._stored_context(message)
+        friction = stored.get("friction", {})
+        intervention = self.intervention_agent.suggest_clarification(
+            {"message": stored.get("message", {}), "reason": friction.get("reason", "")}
+        )
+        return "intervention", "intervention", intervention
+
+    # --- step runner ---------------------------------------------------------
+
+    @staticmethod
+    def _call(handler: Callable[[Dict[str, Any]], Tuple[str, str, Any]], message: Dict[str, Any]) -> Tuple[Optional[Tuple[str, str, Any]], Optional[Exception]]:
+        try:
+            with metrics.STAGE_SECONDS.time(stage=_STAGE_LABELS.get(handler.__name__, handler.__name__.lstrip("_"))):
+                return handler(message), None
+        except Exception as exc:
+            return None, exc
+
+    def _skip(self, step: Dict[str, Any]) -> Dict[str, Any]:
+        # Unknown action; log and continue
+        logger.warning("Skipped unknown action: %s", step.get("action"))
+        self.memory.log("skipped_step", {"step": step})
+        return {"step": step.get("id"), "type": "skipped", "reason": "unknown action"}
+
+    def _record(self, step: Dict[str, Any], message: Dict[str, Any], outcome: Tuple[Optional[Tuple[str, str, Any]], Optional[Exception]]) -> Dict[str, Any]:
+        """Log one (step, message) outcome to the trace and shape it as a result entry."""
+        result, exc = outcome
+        if exc is not None:
+            logger.warning("Step %s failed for message %s: %s", step.get("id"), message.get("message_id"), exc)
+            self.memory.log("step_failed", {"step": step.get("id"), "message": trace_message(message), "error": str(exc)})
+            return {"step": step.get("id"), "message_id": message.get("message_id"), "type": "error", "error": str(exc)}
+        event_type, result_type, value = result
+        # Traces keep image digests only, never the raw bytes
+        self.memory.log(event_type, {"message": trace_message(message), result_type: value})
+        return {"step": step["id"], "message_id": message.get("message_id"), "type": result_type, "result": value}
+
+    def _run_step(
+        self,
+        step: Dict[str, Any],
+        handler: Callable[[Dict[str, Any]], Tuple[str, str, Any]],
+        messages: List[Dict[str, Any]],
+        workers: int,
+    ) -> List[Dict[str, Any]]:
+        """Run one step over all messages and log each outcome in message order."""
+        if workers > 1 and len(messages) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(messages))) as pool:
+                # Worker threads inherit the caller's request deadline.
+                outcomes = list(pool.map(request_context.bind(lambda m: self._call(handler, m)), messages))
+        else:
+            outcomes = [self._call(handler, message) for message in messages]
+
+        # Trace is written from the calling thread so ordering matches the sequential path.
+        return [self._record(step, message, outcome) for message, outcome in zip(messages, outcomes)]
+
+    def _run_pipelined(
+        self,
+        steps: List[Dict[str, Any]],
+        handlers: Dict[str, Callable[[Dict[str, Any]], Tuple[str, str, Any]]],
+        messages: List[Dict[str, Any]],
+        workers: int,
+        on_result: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> List[Dict[str, Any]]:
+        """Run the plan through DagScheduler, then lay results out in plan order."""
+        skip = {i for i, step in enumerate(steps) if step.get("action") not in handlers}
+        friction_steps = {i for i, step in enumerate(steps) if step.get("action") == "detect_friction"}
+        slots: List[List[Optional[Dict[str, Any]]]] = [[None] * len(messages) for _ in steps]
+
+        def call(step_index: int, message: Dict[str, Any]):
+            return self._call(handlers[steps[step_index].get("action")], message)
+
+        def on_complete(step_index: int, message_index: int, outcome) -> None:
+            result = self._record(steps[step_index], messages[message_index], outcome)
+            slots[step_index][message_index] = result
+            if on_result:
+                on_result(result)
+
+        def on_release(step_index: int, message_index: int) -> None:
+            if step_index in friction_steps:
+                self._fold_conversation(messages[message_index])
+
+        DagScheduler(max_workers=workers).run(
+            steps,
+            messages,
+            request_context.bind(call),
+            on_complete,
+            skip=skip,
+            ordered=friction_steps,
+            on_release=on_release,
+        )
+
+        results: List[Dict[str, Any]] = []
+        for step_index, step in enumerate(steps):
+            if step_index in skip:
+                results.append(self._skip(step))
+            else:
+                results.extend(slots[step_index])
+        return results
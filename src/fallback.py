@@ -0,0 +1,56 @@
+import base64
+import os
+import threading
+from typing import Any, Optional
+
+from src import lazy, request_context
+from src.settings import env_flag
+
+_client: Optional[Any] = None
+_client_lock = threading.Lock()
+
+
+def fallback_enabled() -> bool:
+    """True when the OpenAI-compatible fallback service is configured and enabled."""
+    return (
+        env_flag("ENABLE_OPENAI_FALLBACK")
+        and bool(os.getenv("OPENAI_FALLBACK_BASE_URL"))
+        and bool(os.getenv("OPENAI_FALLBACK_API_KEY"))
+        and lazy.available("openai")
+    )
+
+
+def _get_client() -> Any:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = lazy.load("openai").OpenAI(
+                    base_url=os.getenv("OPENAI_FALLBACK_BASE_URL"),
+                    api_key=os.getenv("OPENAI_FALLBACK_API_KEY"),
+                )
+    return _client
+
+
+def fallback_generate_text(prompt: str, image_bytes: Optional[bytes] = None, mime_type: str = "image/png") -> Optional[str]:
+    """Run one prompt (optionally with an image) through the OpenAI-compatible fallback service."""
+    content: Any = prompt
+    if image_bytes:
+        data_uri = f"data:{mime_type};base64,{base64.b64encode(bytes(image_bytes)).decode('ascii')}"
+        content = [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": data_uri}},
+        ]
+    options = {}
+    timeout = request_context.bounded(None)
+    if timeout is not None:
+        # Do not let the HTTP call outlive the request that is waiting for it.
+        options["timeout"] = max(timeout, 0.1)
+    response = _get_client().chat.completions.create(
+        model=os.getenv("OPENAI_FALLBACK_MODEL", "gemini-2.0-flash-001"),
+        messages=[{"role": "user", "content": content}],
+        **options,
+    )
+    if response.choices:
+        return response.choices[0].message.content
+    return None
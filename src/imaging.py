@@ -0,0 +1,236 @@
+"""
+Image preprocessing before vision calls.
+
+Each upload is decoded once (on a process pool, so decoding does not hold request threads
+or the GIL), downscaled to a pixel budget, re-encoded without metadata (EXIF, GPS, ICC,
+text chunks) and fingerprinted with a sha256 of the decoded pixels.
+
+Re-encoding is deterministic, so a re-upload of a recent screenshot (the same decoded
+pixels, e.g. a copy re-saved with different metadata) comes out as the same bytes: its
+image hash matches and the LLM response cache and in-flight coalescing reuse the earlier
+analysis. Such uploads are reported as ``identical``. Nothing looser than pixel equality
+is treated as a repeat: two chat screenshots with the same layout but different text
+can differ in fewer pixels than lossy re-encoding moves.
+
+Pillow is optional: without it, or when IMAGE_PREPROCESS_ENABLED=0, images pass through
+unchanged.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from src import lazy, metrics
+from src.blobs import Blob
+from src.settings import env_flag
+
+# Pillow is imported on first use (see _pil), not when the module is imported.
+Image: Any = None
+ImageOps: Any = None
+
+
+def _pil() -> Any:
+    global Image, ImageOps
+    if Image is None and lazy.load("PIL") is not None:
+        Image = lazy.load("PIL.Image")
+        ImageOps = lazy.load("PIL.ImageOps")
+    return Image
+
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+FLAT_MAX_COLORS = 4096  # at most this many distinct colours: also try PNG
+
+
+def enabled() -> bool:
+    return env_flag("IMAGE_PREPROCESS_ENABLED", True) and lazy.available("PIL")
+
+
+def _resample(name: str) -> Any:
+    return getattr(getattr(Image, "Resampling", Image), name)
+
+
+def pixel_digest(image: Any) -> str:
+    """sha256 of the decoded pixels (mode, size and raw data), independent of the encoding."""
+    digest = hashlib.sha256(("%s:%dx%d:" % (image.mode, image.size[0], image.size[1])).encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def preprocess(data: bytes, max_pixels: int = 1_600_000, output_format: str = "JPEG", quality: int = 85) -> Dict[str, Any]:
+    """
+    Decode, orient, downscale to ``max_pixels`` and re-encode ``data`` without metadata.
+    Returns {data, mime_type, width, height, original_width, original_height, pixel_sha256}.
+    Module-level so it can run in a worker process; raises if ``data`` is not an image.
+    """
+    _pil()
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        original_size = source.size
+        image = ImageOps.exif_transpose(source)
+    width, height = image.size
+    if width * height > max_pixels:
+        scale = (max_pixels / float(width * height)) ** 0.5
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), _resample("LANCZOS"))
+
+    output_format = output_format.upper()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if output_format == "JPEG":
+        if has_alpha:
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    # Only the pixels are written out: no EXIF/GPS, ICC profile or text chunks.
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    encoded = _encode(clean, output_format, quality)
+    if output_format != "PNG" and clean.getcolors(FLAT_MAX_COLORS) is not None:
+        # Flat screenshots often compress better losslessly than as JPEG/WebP. The choice
+        # depends on the pixels alone, so the same pixels always encode to the same bytes.
+        lossless = _encode(clean, "PNG", quality)
+        if len(lossless) < len(encoded):
+            encoded, output_format = lossless, "PNG"
+    return {
+        "data": encoded,
+        "mime_type": _MIME_TYPES.get(output_format, "application/octet-stream"),
+        "width": clean.size[0],
+        "height": clean.size[1],
+        "original_width": original_size[0],
+        "original_height": original_size[1],
+        "pixel_sha256": pixel_digest(clean),
+    }
+
+
+def _encode(image: Any, output_format: str, quality: int) -> bytes:
+    out = io.BytesIO()
+    options = {"quality": quality, "optimize": True} if output_format in ("JPEG", "WEBP") else {"optimize": True}
+    image.save(out, format=output_format, **options)
+    return out.getvalue()
+
+
+class RecentPixels:
+    """Pixel digests of recent uploads (LRU, bounded by count); no image bytes are kept."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._digests: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, pixel_sha: str) -> bool:
+        """True if ``pixel_sha`` was seen recently; records it either way."""
+        with self._lock:
+            if pixel_sha in self._digests:
+                self._digests.move_to_end(pixel_sha)
+                return True
+            if self.max_entries > 0:
+                self._digests[pixel_sha] = None
+                if len(self._digests) > self.max_entries:
+                    self._digests.popitem(last=False)
+            return False
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+class ImagePreprocessor:
+    """
+    Runs ``preprocess`` on a process pool (``workers`` = 0 runs it in the calling thread)
+    and reports uploads whose pixels match a recent one as ``identical``.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pixels: int = 1_600_000,
+        output_format: str = "JPEG",
+        quality: int = 85,
+        recent_digests: int = 4096,
+    ):
+        self.workers = max(0, workers)
+        self.max_pixels = max_pixels
+        self.output_format = output_format
+        self.quality = quality
+        self.recent = RecentPixels(recent_digests)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _run(self, data: bytes) -> Dict[str, Any]:
+        args = (data, self.max_pixels, self.output_format, self.quality)
+        if self.workers == 0:
+            return preprocess(*args)
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            return self._pool.submit(preprocess, *args).result()
+        except BrokenProcessPool:
+            logger.warning("Image preprocessing pool broke; processing in-thread")
+            with self._pool_lock:
+                self._pool = None
+            return preprocess(*args)
+
+    def process(self, data: bytes) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+        """
+        (bytes to send to the model, info); info is None when ``data`` could not be decoded,
+        in which case the original bytes are returned untouched.
+        """
+        try:
+            with metrics.STAGE_SECONDS.time(stage="image_preprocess"):
+                result = self._run(data)
+        except Exception as exc:
+            logger.warning("Image preprocessing skipped: %s", exc)
+            metrics.IMAGES_PREPROCESSED.inc(result="skipped")
+            return data, None
+        processed = result.pop("data")
+        identical = self.recent.seen(result["pixel_sha256"])
+        info = dict(result, original_bytes=len(data), bytes=len(processed), identical=identical)
+        metrics.IMAGES_PREPROCESSED.inc(result="identical" if identical else "processed")
+        return processed, info
+
+    def process_blob(self, blob: Blob) -> Tuple[Blob, Optional[Dict[str, Any]]]:
+        """Preprocessed replacement for ``blob`` (the original is closed), plus info."""
+        with blob:
+            data = blob.read()
+        processed, info = self.process(data)
+        mime_type = info["mime_type"] if info else blob.mime_type
+        return Blob.from_bytes(processed, mime_type=mime_type, filename=blob.filename), info
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+_preprocessor: Optional[ImagePreprocessor] = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_image_preprocessor() -> Optional[ImagePreprocessor]:
+    """Shared preprocessor configured from IMAGE_* environment variables; None when disabled."""
+    global _preprocessor
+    if not enabled():
+        return None
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = ImagePreprocessor(
+                    workers=int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2")),
+                    max_pixels=int(os.getenv("IMAGE_MAX_PIXELS", "1600000")),
+                    output_format=os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG"),
+                    quality=int(os.getenv("IMAGE_QUALITY", "85")),
+                )
+    return _preprocessor
@@ -0,0 +1,321 @@
+"""
+SQLite-backed background job queue with a local worker pool.
+
+``submit`` stores the job and returns its id immediately; worker threads claim queued
+jobs, run the handler and store the result (or error) with a TTL. Clients poll ``get``
+or block in ``wait``. Nothing external is needed: the queue is one SQLite file in WAL
+mode, so jobs survive restarts and several processes can share it.
+
+- Idempotency: submitting again with the same ``idempotency_key`` returns the existing job
+  instead of enqueuing a duplicate.
+- Retries: a handler exception requeues the job until ``max_attempts`` is reached.
+- Leases: a heartbeat thread renews the lease of every job this process is running every
+  ``lease_seconds / 3``; a job whose lease lapses anyway (its worker died) is requeued, or
+  failed if it has used up its attempts, so a job that kills its worker cannot loop forever.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+Handler = Callable[[Dict[str, Any], Optional[bytes]], Any]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    image BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+"""
+
+
+class JobQueue:
+    def __init__(
+        self,
+        path: str,
+        handler: Handler,
+        workers: int = 2,
+        result_ttl: float = 3600,
+        max_attempts: int = 3,
+        lease_seconds: float = 600,
+        poll_interval: float = 0.5,
+    ):
+        self.path = path
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._changed = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._running: set = set()
+        self._running_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls, handler: Handler) -> "JobQueue":
+        """Queue configured from JOBS_* settings, with its workers already started so jobs
+        left queued (or with a lapsed lease) by a previous process run without a new submit."""
+        queue = cls(
+            os.getenv("JOBS_DB_PATH", os.path.join(".cache", "jobs.sqlite3")),
+            handler,
+            workers=int(os.getenv("JOBS_WORKERS", "2")),
+            result_ttl=float(os.getenv("JOBS_RESULT_TTL_SECONDS", "3600")),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+        )
+        queue.start()
+        return queue
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit mode with explicit BEGIN IMMEDIATE for claims.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    # --- client side ---------------------------------------------------------
+
+    def submit(
+        self,
+        payload: Dict[str, Any],
+        image: Optional[bytes] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[str, bool]:
+        """Enqueue a job; returns ``(job_id, created)`` (created is False for an idempotent replay)."""
+        self.start()
+        conn = self._conn()
+        now = time.time()
+        if idempotency_key:
+            existing = self._by_key(idempotency_key, now)
+            if existing is not None:
+                return existing, False
+        job_id = uuid.uuid4().hex
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, status, payload, image, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, idempotency_key, QUEUED, json.dumps(payload), image, now, now),
+            )
+        except sqlite3.IntegrityError:
+            # Lost a race with another submit using the same key
+            existing = self._by_key(idempotency_key, now)
+            if existing is None:
+                raise
+            return existing, False
+        self._notify()
+        return job_id, True
+
+    def _by_key(self, idempotency_key: str, now: float) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT id, expires_at FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        if row is None:
+            return None
+        if row["expires_at"] is not None and row["expires_at"] <= now:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            return None
+        return row["id"]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status and, once finished, its result or error; None when unknown or expired."""
+        row = self._conn().execute(
+            "SELECT id, status, result, error, attempts, created_at, updated_at, expires_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] <= time.time()):
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+        }
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block up to ``timeout`` seconds until the job finishes (long polling)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (SUCCEEDED, FAILED) or remaining <= 0:
+                return job
+            with self._changed:
+                # Also re-check periodically: another process may have finished the job.
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # --- worker side ---------------------------------------------------------
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            self._threads.append(heartbeat)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker died mid-run go back to the queue, unless out of attempts
+            expired = now - self.lease_seconds
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, image = NULL, updated_at = ?, expires_at = ? "
+                "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, "lease expired on the last attempt", now, now + self.result_ttl, RUNNING, expired, self.max_attempts),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, RUNNING, expired),
+            )
+            row = conn.execute(
+                "SELECT id, payload, image, attempts FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (RUNNING, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        encoded = json.dumps(result) if result is not None else None
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, updated_at = ?, expires_at = ? "
+            "WHERE id = ? AND status = ?",
+            (status, encoded, error, now, now + self.result_ttl, job_id, RUNNING),
+        )
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def _work(self) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            row = None
+            try:
+                if time.monotonic() - last_purge > 60:
+                    self.purge_expired()
+                    last_purge = time.monotonic()
+                row = self._claim()
+                if row is not None:
+                    self._run(row)
+            except sqlite3.Error as e:
+                logger.warning("Job queue unavailable: %s", e)
+            except Exception:
+                # Never let one job (or a bug) take the worker thread down with it.
+                logger.exception("Job worker error (job %s)", row["id"] if row is not None else None)
+            if row is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            self._notify()
+
+    def _run(self, row: sqlite3.Row) -> None:
+        job_id = row["id"]
+        attempt = row["attempts"] + 1
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            self._execute(job_id, attempt, row)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _execute(self, job_id: str, attempt: int, row: sqlite3.Row) -> None:
+        try:
+            result = self.handler(json.loads(row["payload"]), row["image"])
+        except Exception as e:
+            if attempt < self.max_attempts:
+                logger.warning("Job %s failed (attempt %d/%d), requeueing: %s", job_id, attempt, self.max_attempts, e)
+                self._conn().execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (QUEUED, str(e), time.time(), job_id, RUNNING),
+                )
+            else:
+                logger.error("Job %s failed after %d attempts: %s", job_id, attempt, e)
+                self._finish(job_id, FAILED, error=str(e))
+            return
+        try:
+            self._finish(job_id, SUCCEEDED, result=result)
+        except (TypeError, ValueError) as e:
+            logger.error("Job %s returned a result that cannot be stored: %s", job_id, e)
+            self._finish(job_id, FAILED, error=f"result is not JSON serializable: {e}")
+
+    def _heartbeat(self) -> None:
+        """Renew the lease of every job this process is running, so long jobs are not run twice."""
+        interval = max(self.lease_seconds / 3.0, 0.01)
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                running = list(self._running)
+            if not running:
+                continue
+            try:
+                self._conn().execute(
+                    "UPDATE jobs SET updated_at = ? WHERE status = ? AND id IN (%s)" % ",".join("?" * len(running)),
+                    [time.time(), RUNNING] + running,
+                )
+            except sqlite3.Error as e:
+                logger.warning("Job lease renewal failed: %s", e)
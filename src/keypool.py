@@ -0,0 +1,235 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from src import request_context
+from src.clients import ClientRegistry, get_registry
+from src.request_context import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRY_DELAY_RE = re.compile(r"retry(?:[ _-]?delay)?[\"':\s]*(?:in\s*)?([\d.]+)\s*s", re.IGNORECASE)
+
+
+class QuotaExhaustedError(RuntimeError):
+    """Raised when every key in the pool is rate limited or out of quota."""
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Extract the server-suggested retry delay from a 429 error message, if any."""
+    match = _RETRY_DELAY_RE.search(str(exc))
+    if match:
+        try:
+            return float(match.group(1))
+        except ValueError:
+            return None
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-9)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1.0 - self._tokens) / self.rate)
+
+    def drain(self) -> None:
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class _KeyState:
+    __slots__ = ("roles", "api_key", "bucket", "cooldown_until", "consecutive_429", "calls", "quota_errors")
+
+    def __init__(self, role: str, api_key: str, bucket: TokenBucket):
+        self.roles = [role]
+        self.api_key = api_key
+        self.bucket = bucket
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+        self.calls = 0
+        self.quota_errors = 0
+
+
+class KeyPool:
+    """
+    Spreads Gemini calls across every configured API key.
+    Each key has a token bucket sized to its RPM quota; a 429 puts the key on a
+    cooldown (server retry delay, else jittered exponential backoff) and the
+    call moves on to the next key. QuotaExhaustedError is raised when no key can serve
+    the call within ``max_wait_seconds`` so callers can use the fallback service, and
+    DeadlineExceeded when the wait would outlast the request deadline.
+    """
+
+    def __init__(
+        self,
+        keys: Dict[str, str],
+        rpm: float = 15.0,
+        burst: Optional[float] = None,
+        registry: Optional[ClientRegistry] = None,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_wait_seconds: float = 10.0,
+    ):
+        self.registry = registry or get_registry()
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        self._states: List[_KeyState] = []
+        by_key: Dict[str, _KeyState] = {}
+        for role, api_key in keys.items():
+            if api_key in by_key:
+                by_key[api_key].roles.append(role)
+                continue
+            state = _KeyState(role, api_key, TokenBucket(rpm / 60.0, burst if burst is not None else rpm))
+            by_key[api_key] = state
+            self._states.append(state)
+
+    @classmethod
+    def from_env(cls, registry: Optional[ClientRegistry] = None) -> "KeyPool":
+        rpm = float(os.getenv("GEMINI_KEY_RPM", "15"))
+        burst = os.getenv("GEMINI_KEY_BURST")
+        return cls(
+            ClientRegistry.configured_keys(),
+            rpm=rpm,
+            burst=float(burst) if burst else None,
+            registry=registry,
+            max_wait_seconds=float(os.getenv("GEMINI_KEY_MAX_WAIT_SECONDS", "10")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _pick(self, tried: set) -> Optional[_KeyState]:
+        now = time.monotonic()
+        candidates = [s for s in self._states if s.api_key not in tried and s.cooldown_until <= now]
+        # Most remaining tokens first, so load spreads evenly across keys.
+        candidates.sort(key=lambda s: s.bucket.tokens, reverse=True)
+        for state in candidates:
+            if state.bucket.try_acquire():
+                return state
+        return None
+
+    def _next_ready_in(self, tried: set) -> float:
+        now = time.monotonic()
+        waits = [max(s.cooldown_until - now, s.bucket.wait_time()) for s in self._states if s.api_key not in tried]
+        return min(waits) if waits else float("inf")
+
+    def _mark_exhausted(self, state: _KeyState, exc: BaseException) -> None:
+        with self._lock:
+            state.quota_errors += 1
+            state.consecutive_429 += 1
+            delay = retry_after_seconds(exc)
+            if delay is None:
+                ceiling = min(self.max_backoff, self.base_backoff * (2 ** (state.consecutive_429 - 1)))
+                delay = random.uniform(ceiling / 2, ceiling)
+            state.cooldown_until = time.monotonic() + delay
+            state.bucket.drain()
+        logger.warning("Gemini key %s rate limited; cooling down %.1fs", "/".join(state.roles), delay)
+
+    def call(self, fn: Callable[[Any], T]) -> T:
+        """Run ``fn(client)`` on the first key with capacity, rotating past 429s."""
+        if not self._states:
+            raise QuotaExhaustedError("No Gemini API keys configured")
+        tried: set = set()
+        waited = 0.0
+        while True:
+            state = self._pick(tried)
+            if state is None:
+                if len(tried) >= len(self._states):
+                    raise QuotaExhaustedError("All Gemini API keys are rate limited")
+                wait = self._next_ready_in(tried)
+                if waited + wait > self.max_wait_seconds:
+                    raise QuotaExhaustedError("No Gemini API key available within %.1fs" % self.max_wait_seconds)
+                left = request_context.remaining()
+                if left is not None and wait > left:
+                    raise DeadlineExceeded("No Gemini API key available before the request deadline")
+                # Jitter so concurrent waiters do not wake in lockstep.
+                pause = wait + random.uniform(0, min(0.25, wait / 2 + 0.01))
+                time.sleep(pause)
+                waited += pause
+                continue
+
+            client = self.registry.get(state.api_key)
+            if client is None:
+                tried.add(state.api_key)
+                continue
+            try:
+                result = fn(client)
+            except Exception as exc:
+                if is_quota_error(exc):
+                    self._mark_exhausted(state, exc)
+                    tried.add(state.api_key)
+                    continue
+                raise
+            with self._lock:
+                state.calls += 1
+                state.consecutive_429 = 0
+            return result
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "roles": list(s.roles),
+                "tokens": round(s.bucket.tokens, 2),
+                "cooldown_remaining": round(max(0.0, s.cooldown_until - now), 2),
+                "calls": s.calls,
+                "quota_errors": s.quota_errors,
+            }
+            for s in self._states
+        ]
+
+
+_pool: Optional[KeyPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> KeyPool:
+    """Process-wide pool over the keys configured in the environment."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyPool.from_env()
+    return _pool
@@ -0,0 +1,262 @@
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src import lazy
+from src.settings import env_flag
+from src.shared_store import get_shared_store
+
+# numpy is imported on first use (see _numpy), not when the module is imported.
+np: Any = None
+
+
+def _numpy() -> Any:
+    global np
+    if np is None:
+        np = lazy.load("numpy")
+    return np
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def embed_text(text: str, dim: int = 256) -> Any:
+    """
+    Local, dependency-light embedding: signed feature hashing of unigrams and bigrams,
+    L2-normalized. Deterministic across processes (crc32, not Python's salted hash).
+    """
+    _numpy()
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class KnowledgeStore:
+    """
+    Knowledge/context store with a hash index for exact keys and a NumPy embedding
+    matrix for batched cosine-similarity search. Rows are appended incrementally (the
+    matrix grows by doubling up to ``capacity``); once full, the least recently used
+    entry is evicted and its row reused.
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        capacity: int = 100_000,
+        embedder: Optional[Callable[[str, int], Any]] = None,
+        initial_rows: int = 1024,
+    ):
+        if _numpy() is None:
+            raise ImportError("KnowledgeStore requires numpy (pip install numpy)")
+        self.dim = dim
+        self.capacity = max(1, capacity)
+        self._embed = embedder or embed_text
+        self._matrix = np.zeros((min(initial_rows, self.capacity), dim), dtype=np.float32)
+        self._valid = np.zeros(self._matrix.shape[0], dtype=bool)
+        self._rows = 0  # high-water mark of allocated rows
+        self._row_of: Dict[str, int] = {}
+        self._key_at: Dict[int, str] = {}
+        self._values: "OrderedDict[str, Any]" = OrderedDict()  # LRU order, oldest first
+        self._free: List[int] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values
+
+    # --- writes --------------------------------------------------------------
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._rows < self._matrix.shape[0]:
+            self._rows += 1
+            return self._rows - 1
+        if self._matrix.shape[0] < self.capacity:
+            new_size = min(self.capacity, self._matrix.shape[0] * 2)
+            grown = np.zeros((new_size, self.dim), dtype=np.float32)
+            grown[: self._rows] = self._matrix[: self._rows]
+            valid = np.zeros(new_size, dtype=bool)
+            valid[: self._rows] = self._valid[: self._rows]
+            self._matrix, self._valid = grown, valid
+            self._rows += 1
+            return self._rows - 1
+        oldest = next(iter(self._values))
+        self._delete(oldest)
+        return self._free.pop()
+
+    def put(self, key: str, value: Any, text: Optional[str] = None) -> None:
+        """Store ``value`` under ``key``; ``text`` (default: str(value)) is what gets embedded."""
+        vector = self._embed(text if text is not None else str(value), self.dim)
+        with self._lock:
+            row = self._row_of.get(key)
+            if row is None:
+                row = self._allocate_row()
+                self._row_of[key] = row
+                self._key_at[row] = key
+            self._matrix[row] = vector
+            self._valid[row] = True
+            self._values[key] = value
+            self._values.move_to_end(key)
+
+    def _delete(self, key: str) -> None:
+        row = self._row_of.pop(key)
+        del self._key_at[row]
+        del self._values[key]
+        self._valid[row] = False
+        self._matrix[row] = 0.0
+        self._free.append(row)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._values:
+                return False
+            self._delete(key)
+            return True
+
+    # --- reads ---------------------------------------------------------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._values:
+                return default
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def search(self, query: str, k: int = 5, exclude: Iterable[str] = (), min_score: float = 0.0) -> List[Tuple[str, float, Any]]:
+        """Top-``k`` entries scoring above ``min_score`` by cosine similarity to ``query``, as (key, score, value)."""
+        return self.search_batch([query], k=k, exclude=exclude, min_score=min_score)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        exclude: Iterable[str] = (),
+        min_score: float = 0.0,
+    ) -> List[List[Tuple[str, float, Any]]]:
+        """Score many queries with one matrix multiply."""
+        if not queries:
+            return []
+        q = np.stack([self._embed(text, self.dim) for text in queries])
+        with self._lock:
+            n = self._rows
+            if n == 0 or not self._values:
+                return [[] for _ in queries]
+            scores = q @ self._matrix[:n].T  # rows are unit length, so this is cosine
+            mask = ~self._valid[:n]
+            for key in exclude:
+                row = self._row_of.get(key)
+                if row is not None:
+                    mask[row] = True
+            scores[:, mask] = -np.inf
+            take = min(k, n)
+            results = []
+            for row_scores in scores:
+                top = np.argpartition(-row_scores, take - 1)[:take]
+                top = top[np.argsort(-row_scores[top])]
+                results.append([
+                    (self._key_at[i], float(row_scores[i]), self._values[self._key_at[i]])
+                    for i in top
+                    if row_scores[i] > min_score
+                ])
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._values), "allocated_rows": int(self._matrix.shape[0]), "capacity": self.capacity, "dim": self.dim}
+
+
+class SharedKnowledgeStore(KnowledgeStore):
+    """
+    KnowledgeStore whose writes also go to a src.shared_store namespace. Before each read,
+    entries written by other processes since the last read are replayed into the local
+    index, so every worker searches the same history. (Deletes stay local to the process.)
+    """
+
+    def __init__(self, shared: Any, namespace: str = "knowledge", ttl_seconds: Optional[float] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.shared = shared
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._seen_seq = 0
+        self._own_seqs: set = set()
+        self._sync_lock = threading.Lock()
+
+    def put(self, key: str, value: Any, text: Optional[str] = None) -> None:
+        text = text if text is not None else str(value)
+        super().put(key, value, text=text)
+        seq = self.shared.set(self.namespace, key, {"value": value, "text": text}, ttl_seconds=self.ttl_seconds)
+        with self._sync_lock:
+            if seq > self._seen_seq:
+                self._own_seqs.add(seq)
+
+    def sync(self) -> int:
+        """Replay entries other processes wrote since the last sync; returns how many."""
+        applied = 0
+        with self._sync_lock:
+            while True:
+                changes = self.shared.changes(self.namespace, self._seen_seq)
+                for seq, key, record in changes:
+                    self._seen_seq = seq
+                    if seq in self._own_seqs:
+                        self._own_seqs.discard(seq)
+                        continue
+                    super().put(key, record["value"], text=record["text"])
+                    applied += 1
+                if len(changes) < 1000:
+                    break
+            self._own_seqs = {seq for seq in self._own_seqs if seq > self._seen_seq}
+        return applied
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.sync()
+        return super().get(key, default)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        exclude: Iterable[str] = (),
+        min_score: float = 0.0,
+    ) -> List[List[Tuple[str, float, Any]]]:
+        self.sync()
+        return super().search_batch(queries, k=k, exclude=exclude, min_score=min_score)
+
+
+_shared_store: Optional[KnowledgeStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_knowledge_store() -> Optional[KnowledgeStore]:
+    """
+    Process-wide KnowledgeStore, or None when disabled (KNOWLEDGE_STORE_ENABLED) or numpy is
+    missing. With SHARED_STORE_PATH set it is a SharedKnowledgeStore synced across workers.
+    """
+    global _shared_store
+    if not env_flag("KNOWLEDGE_STORE_ENABLED", True) or not lazy.available("numpy"):
+        return None
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                options = {
+                    "dim": int(os.getenv("KNOWLEDGE_STORE_DIM", "256")),
+                    "capacity": int(os.getenv("KNOWLEDGE_STORE_CAPACITY", "100000")),
+                }
+                shared = get_shared_store()
+                if shared is not None:
+                    ttl = float(os.getenv("SHARED_CONTEXT_TTL_SECONDS", "604800"))
+                    _shared_store = SharedKnowledgeStore(shared, ttl_seconds=ttl or None, **options)
+                else:
+                    _shared_store = KnowledgeStore(**options)
+    return _shared_store
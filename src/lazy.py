@@ -0,0 +1,43 @@
+"""
+Deferred imports for heavy optional dependencies (google.genai, openai, numpy, Pillow).
+
+``available(name)`` answers "is it installed?" without importing it; ``load(name)`` imports
+it on first use and caches the module (or None when it is not installed). Modules call
+these from the code paths that need the dependency, so ``import app`` stays cheap.
+"""
+
+import importlib
+import importlib.util
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+_MISSING = object()
+_modules: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def available(name: str) -> bool:
+    if _modules.get(name, _MISSING) is not _MISSING:
+        return _modules[name] is not None
+    if sys.modules.get(name) is not None:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load(name: str) -> Optional[Any]:
+    module = _modules.get(name, _MISSING)
+    if module is not _MISSING:
+        return module
+    with _lock:
+        module = _modules.get(name, _MISSING)
+        if module is _MISSING:
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                module = None
+            _modules[name] = module
+    return module
@@ -0,0 +1,212 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from src import metrics, microbatch, request_context, singleflight
+from src.cache import ResponseCache, get_response_cache
+from src.fallback import fallback_enabled, fallback_generate_text
+from src.keypool import get_key_pool, is_quota_error
+from src.router import Provider, ProviderRouter
+from src.settings import env_flag
+
+# Identical prompts in flight at the same time share one model call (keyed like the cache).
+_inflight = singleflight.SingleFlight()
+
+
+def _cache_enabled() -> bool:
+    return env_flag("LLM_CACHE_ENABLED", True)
+
+
+def _cache_metrics() -> List[Any]:
+    stats = get_response_cache().stats()
+    return [
+        ("cifr_llm_cache_lookups", "counter", "LLM response cache lookups by result.", [
+            ("cifr_llm_cache_lookups_total", {"result": "hit"}, stats["hits"]),
+            ("cifr_llm_cache_lookups_total", {"result": "miss"}, stats["misses"]),
+        ]),
+        ("cifr_llm_cache_entries", "gauge", "Entries in the in-memory LLM response cache.", [
+            ("cifr_llm_cache_entries", {}, stats["size"]),
+        ]),
+    ]
+
+
+metrics.REGISTRY.register_collector(_cache_metrics)
+
+
+def _build_contents(prompt: str, image_bytes: Optional[bytes], mime_type: str) -> List[Dict[str, Any]]:
+    parts: List[Dict[str, Any]] = [{"text": prompt}]
+    if image_bytes:
+        parts.append({"inline_data": {"mime_type": mime_type, "data": bytes(image_bytes)}})
+    return [{"parts": parts}]
+
+
+def _response_text(response: Any) -> Optional[str]:
+    if response.candidates and response.candidates[0].content.parts:
+        return response.candidates[0].content.parts[0].text
+    return None
+
+
+def generate_text(
+    client: Any,
+    model: str,
+    prompt: str,
+    image_bytes: Optional[bytes] = None,
+    mime_type: str = "image/png",
+    use_cache: bool = True,
+) -> Optional[str]:
+    """
+    Call ``client.models.generate_content`` and return the first candidate's text.
+    Responses are cached by (model, prompt hash, image hash); empty responses are not cached.
+    Concurrent identical calls are coalesced into one.
+    Exceptions from the client propagate to the caller.
+    """
+
+    def call() -> Optional[str]:
+        options: Dict[str, Any] = {}
+        timeout = request_context.bounded(None)
+        if timeout is not None:
+            # The call runs on the caller's thread, so the HTTP timeout is what enforces the deadline.
+            options["config"] = {"http_options": {"timeout": max(int(timeout * 1000), 100)}}
+        with metrics.INFLIGHT_MODEL_CALLS.track_inprogress(backend="gemini"), metrics.MODEL_SECONDS.time(backend="gemini"):
+            try:
+                response = client.models.generate_content(
+                    model=model,
+                    contents=_build_contents(prompt, image_bytes, mime_type),
+                    **options,
+                )
+            except Exception as exc:
+                if is_quota_error(exc):
+                    metrics.RATE_LIMITED.inc()
+                    metrics.MODEL_CALLS.inc(backend="gemini", outcome="rate_limited")
+                else:
+                    metrics.MODEL_CALLS.inc(backend="gemini", outcome="error")
+                raise
+        metrics.MODEL_CALLS.inc(backend="gemini", outcome="ok")
+        return _response_text(response)
+
+    if not (use_cache and _cache_enabled()):
+        return call()
+    key = ResponseCache.make_key(model, prompt, image_bytes)
+    if not singleflight.enabled():
+        return get_response_cache().get_or_compute(key, call)
+    # Keyed per client: different API keys must not share one another's quota errors.
+    return _inflight.do("generate:%x:%s" % (id(client), key), lambda: get_response_cache().get_or_compute(key, call))[0]
+
+
+def _gemini_call(model: str, prompt: str, image_bytes: Optional[bytes], mime_type: str) -> Optional[str]:
+    return get_key_pool().call(
+        lambda client: generate_text(client, model, prompt, image_bytes, mime_type, use_cache=False)
+    )
+
+
+def _gemini_available() -> bool:
+    pool = get_key_pool()
+    return len(pool) > 0 and pool.registry.available()
+
+
+def _fallback_call(model: str, prompt: str, image_bytes: Optional[bytes], mime_type: str) -> Optional[str]:
+    with metrics.INFLIGHT_MODEL_CALLS.track_inprogress(backend="fallback"), metrics.MODEL_SECONDS.time(backend="fallback"):
+        try:
+            text = fallback_generate_text(prompt, image_bytes, mime_type)
+        except Exception:
+            metrics.MODEL_CALLS.inc(backend="fallback", outcome="error")
+            raise
+    metrics.MODEL_CALLS.inc(backend="fallback", outcome="ok")
+    metrics.FALLBACK_ACTIVATIONS.inc()
+    return text
+
+
+_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """Process-wide router: Gemini (key pool) first, then the OpenAI-compatible fallback."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter.from_env([
+                    Provider("gemini", _gemini_call, _gemini_available),
+                    Provider("fallback", _fallback_call, fallback_enabled),
+                ])
+    return _router
+
+
+def _call_backends(model: str, prompt: str, image_bytes: Optional[bytes], mime_type: str) -> Dict[str, Any]:
+    """One uncached call through the provider router (circuit breakers, failover, hedging)."""
+    return get_router().call(model, prompt, image_bytes, mime_type)
+
+
+def _call_packed(model: str, prompts: List[str]) -> List[Dict[str, Any]]:
+    """Answer several text prompts with one call; raises if the packed answer cannot be split."""
+    packed = _call_backends(model, microbatch.pack_prompts(prompts), None, "image/png")
+    texts = microbatch.split_response(packed.get("text"), len(prompts))
+    if texts is None:
+        raise ValueError("packed response could not be split per prompt")
+    return [{"text": text, "api_source": packed["api_source"]} for text in texts]
+
+
+def _microbatch_enabled() -> bool:
+    return env_flag("LLM_MICROBATCH_ENABLED")
+
+
+_batchers: Dict[str, microbatch.MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def _batcher(model: str) -> microbatch.MicroBatcher:
+    batcher = _batchers.get(model)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(model)
+            if batcher is None:
+                batcher = _batchers[model] = microbatch.MicroBatcher(
+                    dispatch_batch=lambda prompts: _call_packed(model, prompts),
+                    dispatch_one=lambda prompt: _call_backends(model, prompt, None, "image/png"),
+                    max_items=int(os.getenv("LLM_MICROBATCH_MAX_ITEMS", "8")),
+                    window_ms=float(os.getenv("LLM_MICROBATCH_WINDOW_MS", "20")),
+                )
+    return batcher
+
+
+def complete(
+    model: str,
+    prompt: str,
+    image_bytes: Optional[bytes] = None,
+    mime_type: str = "image/png",
+    use_cache: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """
+    Pooled call: spread over every configured Gemini key (src.keypool), with the
+    OpenAI-compatible fallback taking over when Gemini fails, its circuit is open or it
+    is slower than usual (src.router). Bounded by the request deadline, if any.
+    With LLM_MICROBATCH_ENABLED=1, text-only prompts from concurrent callers are packed
+    into one call per micro-batch window (src.microbatch).
+    Returns {"text", "api_source"} ("gemini" or "fallback"), or None when no backend is configured.
+    """
+    if not get_router().available():
+        return None
+
+    def call() -> Optional[Dict[str, Any]]:
+        if image_bytes is None and _microbatch_enabled():
+            return _batcher(model).submit(prompt)
+        return _call_backends(model, prompt, image_bytes, mime_type)
+
+    if not (use_cache and _cache_enabled()):
+        return call()
+    key = ResponseCache.make_key(model, prompt, image_bytes)
+    cached = get_response_cache().get(key)
+    if cached is not None:
+        return cached
+
+    def compute() -> Optional[Dict[str, Any]]:
+        result = call()
+        # Fallback answers stand in for an unavailable Gemini; cache only the real thing.
+        if result and result.get("text") and result.get("api_source") != "fallback":
+            get_response_cache().set(key, result)
+        return result
+
+    if not singleflight.enabled():
+        return compute()
+    return _inflight.do("complete:" + key, compute)[0]
@@ -1,28 +1,188 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from src.serialization import to_jsonable
+from src.tracelog import TraceLog, get_trace_log
+
+DEFAULT_CAPACITY = int(os.getenv("MEMORY_STORE_CAPACITY", "10000"))
+
+
+class Event:
+    """Compact trace record; the ISO timestamp is only formatted when the event is read."""
+
+    __slots__ = ("seq", "event", "payload", "ts", "message_id")
+
+    def __init__(self, seq: int, event: str, payload: Dict[str, Any], ts: float, message_id: Optional[str]):
+        self.seq = seq
+        self.event = event
+        self.payload = payload
+        self.ts = ts
+        self.message_id = message_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "event": self.event,
+            "payload": self.payload,
+            "timestamp": datetime.utcfromtimestamp(self.ts).isoformat() + "Z",
+        }
+
+
+def _message_id(payload: Dict[str, Any]) -> Optional[str]:
+    message = payload.get("message")
+    if isinstance(message, dict) and message.get("message_id") is not None:
+        return str(message["message_id"])
+    if payload.get("message_id") is not None:
+        return str(payload["message_id"])
+    return None
 
 
 class MemoryStore:
-    """Lightweight in-memory log for executions and agent traces."""
+    """
+    Lightweight in-memory log for executions and agent traces.
+    Holds at most ``capacity`` events in a ring buffer (None = unbounded); the oldest
+    event is evicted first and, if ``spill_path`` is set, appended there as JSONL.
+    Per-event-type and per-message-id indexes make lookups independent of store size.
+    ``backend`` (default: the shared TraceLog when TRACE_LOG_DIR is set) persists every
+    event so traces survive restarts and can be queried beyond the in-memory window.
+    Persisted events are tagged with ``store_id`` (default: a fresh random id) and ``query``
+    only returns this store's; pass a fixed ``store_id`` to read a previous run's events
+    back, or query the TraceLog itself for every store's.
+    """
 
-    def __init__(self):
-        self.events: List[Dict[str, Any]] = []
+    def __init__(
+        self,
+        capacity: Optional[int] = DEFAULT_CAPACITY,
+        spill_path: Optional[str] = None,
+        backend: Optional[TraceLog] = None,
+        store_id: Optional[str] = None,
+    ):
+        self.capacity = capacity if capacity and capacity > 0 else None
+        self.spill_path = spill_path or os.getenv("MEMORY_STORE_SPILL_PATH") or None
+        self._ring: Deque[Event] = deque()
+        self._by_type: Dict[str, Deque[Event]] = {}
+        self._by_message: Dict[str, Deque[Event]] = {}
+        self._seq = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+        self._spill_file = None
+        self.backend = backend if backend is not None else get_trace_log()
+        self.store_id = store_id or uuid.uuid4().hex
 
     def log(self, event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        entry = {
-            "event": event_type,
-            "payload": payload,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-        }
-        self.events.append(entry)
-        return entry
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, event_type, payload, time.time(), _message_id(payload))
+            if self.capacity is not None and len(self._ring) >= self.capacity:
+                self._evict()
+            self._ring.append(event)
+            self._by_type.setdefault(event_type, deque()).append(event)
+            if event.message_id is not None:
+                self._by_message.setdefault(event.message_id, deque()).append(event)
+        if self.backend is not None:
+            # Stamped by the log under its own lock: ``event.ts`` was taken before other
+            # threads' appends that may reach the log first.
+            self.backend.append(event_type, payload, source=self.store_id)
+        return event.to_dict()
+
+    def _evict(self) -> None:
+        # The oldest event overall is also the oldest in each of its index deques.
+        event = self._ring.popleft()
+        self._evicted += 1
+        by_type = self._by_type[event.event]
+        by_type.popleft()
+        if not by_type:
+            del self._by_type[event.event]
+        if event.message_id is not None:
+            by_message = self._by_message[event.message_id]
+            by_message.popleft()
+            if not by_message:
+                del self._by_message[event.message_id]
+        if self.spill_path:
+            self._spill(event)
+
+    def _spill(self, event: Event) -> None:
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+        record = to_jsonable(event.to_dict())
+        record["seq"] = event.seq
+        self._spill_file.write(json.dumps(record) + "\n")
 
     def get_events(self, event_type: Optional[str] = None) -> List[Dict[str, Any]]:
-        if event_type is None:
-            return list(self.events)
-        return [e for e in self.events if e["event"] == event_type]
+        with self._lock:
+            events = list(self._ring) if event_type is None else list(self._by_type.get(event_type, ()))
+        return [e.to_dict() for e in events]
+
+    def get_message_events(self, message_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            events = list(self._by_message.get(str(message_id), ()))
+        return [e.to_dict() for e in events]
 
     def latest(self, n: int = 20) -> List[Dict[str, Any]]:
-        return self.events[-n:]
+        with self._lock:
+            events = list(islice(reversed(self._ring), n))
+        return [e.to_dict() for e in reversed(events)]
+
+    def query(
+        self,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        event_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        This store's events in a time range (epoch seconds); served from the persistent
+        backend when configured.
+        """
+        if self.backend is not None:
+            events = self.backend.query(start_ts, end_ts, event_type, limit, source=self.store_id)
+            return [{k: v for k, v in event.items() if k != "source"} for event in events]
+        with self._lock:
+            events = list(self._ring) if event_type is None else list(self._by_type.get(event_type, ()))
+        matched = [
+            e.to_dict() for e in events
+            if (start_ts is None or e.ts >= start_ts) and (end_ts is None or e.ts <= end_ts)
+        ]
+        return matched[:limit] if limit is not None else matched
+
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        return self.get_events()
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "store_id": self.store_id,
+                "size": len(self._ring),
+                "capacity": self.capacity,
+                "logged": self._seq,
+                "evicted": self._evicted,
+                "event_types": {k: len(v) for k, v in self._by_type.items()},
+            }
 
+    def iter_spilled(self) -> Iterator[Dict[str, Any]]:
+        """Replay events that were evicted to ``spill_path``, oldest first."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        if self._spill_file is not None:
+            with self._lock:
+                self._spill_file.flush()
+        with open(self.spill_path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
 
+    def close(self) -> None:
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
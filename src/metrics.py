@@ -0,0 +1,288 @@
+"""
+Dependency-free metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in a process-wide ``REGISTRY`` and are rendered by
+``render()`` (served at ``/metrics``). Collectors registered with ``register_collector``
+contribute samples computed at scrape time (e.g. the response cache counters), so hot
+paths that already keep their own stats do not pay twice.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name + "_total", self._labels(k), v) for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels: Any) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            entries = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        out: List[Sample] = []
+        for key, counts, total, count in entries:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                out.append((self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            out.append((self.name + "_sum", labels, total))
+            out.append((self.name + "_count", labels, count))
+        return out
+
+
+Collector = Callable[[], List[Tuple[str, str, str, List[Sample]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, documentation: str, labelnames: Sequence[str], **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Collector) -> None:
+        """``collector()`` returns [(name, type, help, samples)], evaluated on every render."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as exc:  # a broken collector must not break the scrape
+                families.append(("cifr_metrics_collector_errors", "gauge", str(exc), [("cifr_metrics_collector_errors", {}, 1)]))
+        lines: List[str] = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- shared instruments ------------------------------------------------------
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "cifr_stage_duration_seconds", "Agent pipeline stage latency.", ("stage",)
+)
+PLAN_SECONDS = REGISTRY.histogram("cifr_plan_duration_seconds", "planner.plan latency.")
+EXECUTE_PLAN_SECONDS = REGISTRY.histogram("cifr_execute_plan_duration_seconds", "Executor.execute_plan latency.")
+SERIALIZE_SECONDS = REGISTRY.histogram(
+    "cifr_serialization_duration_seconds",
+    "Agent result serialization latency.",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+MODEL_CALLS = REGISTRY.counter(
+    "cifr_model_calls", "Model calls by backend and outcome.", ("backend", "outcome")
+)
+MODEL_SECONDS = REGISTRY.histogram("cifr_model_call_duration_seconds", "Model call latency.", ("backend",))
+FALLBACK_ACTIVATIONS = REGISTRY.counter(
+    "cifr_fallback_activations", "Calls served by the OpenAI-compatible fallback (api_source == fallback)."
+)
+RATE_LIMITED = REGISTRY.counter("cifr_rate_limited", "429 / RESOURCE_EXHAUSTED responses from Gemini.")
+INFLIGHT_REQUESTS = REGISTRY.gauge("cifr_inflight_requests", "HTTP requests being processed.", ("endpoint",))
+INFLIGHT_MODEL_CALLS = REGISTRY.gauge("cifr_inflight_model_calls", "Model calls in flight.", ("backend",))
+IMAGES_PREPROCESSED = REGISTRY.counter(
+    "cifr_images_preprocessed", "Uploaded images by preprocessing result.", ("result",)
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "cifr_startup_seconds", "Process start-up cost by phase (imports, app init, each agent build).", ("phase",)
+)
+PLANS = REGISTRY.counter("cifr_plans", "Plans by source (template, cache, gemini, fallback, heuristic).", ("source",))
+CIRCUIT_STATE = REGISTRY.gauge(
+    "cifr_circuit_state", "Model provider circuit breaker state (0 closed, 1 half-open, 2 open).", ("provider",)
+)
+HEDGED_REQUESTS = REGISTRY.counter(
+    "cifr_hedged_requests", "Model calls duplicated on a second provider, by which one answered first.", ("winner",)
+)
+PIPELINE_DECISIONS = REGISTRY.counter(
+    "cifr_friction_decisions", "Which tier decided friction per message.", ("decided_by",)
+)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class StageTimer:
+    """Per-request timing breakdown: ``with timer.stage("friction"): ...`` also feeds STAGE_SECONDS."""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str, histogram: Optional[Histogram] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if histogram is None:
+                STAGE_SECONDS.observe(elapsed, stage=name)
+            else:
+                histogram.observe(elapsed)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds per stage plus ``total`` since the timer was created."""
+        result = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        result["total"] = round((time.perf_counter() - self._start) * 1000, 3)
+        return result
@@ -0,0 +1,161 @@
+"""
+Micro-batching of independent LLM prompts across concurrent callers.
+
+``MicroBatcher`` collects items submitted from many threads for up to ``window_ms`` (or
+until ``max_items`` are waiting), hands the whole group to ``dispatch_batch`` and routes
+each result back to its caller. If the batch call fails or returns the wrong number of
+results, every item is retried on its own through ``dispatch_one``. A group of one goes
+straight to ``dispatch_one``.
+
+Each item carries a copy of its caller's context (src.request_context): ``dispatch_one``
+runs in it, and a batch runs in the context of the member with the earliest deadline.
+Callers stop waiting at their deadline (DeadlineExceeded); an item whose caller gave up
+before its batch was dispatched is dropped.
+
+``pack_prompts`` / ``split_response`` turn N prompts into one structured prompt and the
+model's JSON answer back into N texts; the keys are rate-limited per request, not per
+token, so one packed call costs one request instead of N.
+"""
+
+import contextvars
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Optional, Tuple
+
+from src import request_context
+from src.request_context import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def pack_prompts(prompts: List[str]) -> str:
+    tasks = [{"id": i, "prompt": prompt} for i, prompt in enumerate(prompts)]
+    return (
+        f"You will receive {len(prompts)} independent tasks as a JSON array. "
+        "Answer each task on its own, exactly as if it were the only prompt you were given; "
+        "do not let tasks influence each other. "
+        f"Return only a JSON array of {len(prompts)} objects, one per task in the same order, "
+        'each of the form {"id": <task id>, "response": <your complete answer as a string>}.\n'
+        f"Tasks:\n{json.dumps(tasks)}"
+    )
+
+
+def split_response(text: Optional[str], count: int) -> Optional[List[str]]:
+    """Per-task response texts from a packed answer, or None if it cannot be trusted."""
+    if not text:
+        return None
+    try:
+        data = json.loads(_FENCE_RE.sub("", text))
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("responses") or data.get("results")
+    if not isinstance(data, list) or len(data) != count:
+        return None
+    responses: List[Optional[str]] = [None] * count
+    for entry in data:
+        if not isinstance(entry, dict) or not isinstance(entry.get("id"), int) or not 0 <= entry["id"] < count:
+            return None
+        response = entry.get("response")
+        if response is None or responses[entry["id"]] is not None:
+            return None
+        responses[entry["id"]] = response if isinstance(response, str) else json.dumps(response)
+    return responses
+
+
+def _deadline_order(context: contextvars.Context) -> float:
+    deadline = context.run(request_context.current_deadline)
+    return float("inf") if deadline is None else deadline
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        dispatch_batch: Callable[[List[Any]], List[Any]],
+        dispatch_one: Callable[[Any], Any],
+        max_items: int = 8,
+        window_ms: float = 20.0,
+        max_concurrent_batches: int = 4,
+    ):
+        self.dispatch_batch = dispatch_batch
+        self.dispatch_one = dispatch_one
+        self.max_items = max(1, max_items)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[Any, Future, contextvars.Context]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent_batches), thread_name_prefix="microbatch")
+        self._collector: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._counters = {"items": 0, "batches": 0, "batched_items": 0, "fallbacks": 0}
+        self._counters_lock = threading.Lock()
+
+    def submit(self, item: Any) -> Any:
+        """Queue ``item`` and block until its result (or exception) is available."""
+        if self._collector is None:
+            with self._start_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name="microbatch-collector", daemon=True)
+                    self._collector.start()
+        future: Future = Future()
+        self._queue.put((item, future, contextvars.copy_context()))
+        try:
+            return future.result(timeout=request_context.bounded(None))
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceeded("micro-batched call deadline exceeded") from None
+
+    def _collect(self) -> None:
+        while True:
+            group = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._dispatch, group)
+
+    def _dispatch(self, group: List[Tuple[Any, Future, contextvars.Context]]) -> None:
+        group = [entry for entry in group if entry[1].set_running_or_notify_cancel()]
+        if not group:
+            return
+        with self._counters_lock:
+            self._counters["items"] += len(group)
+        if len(group) > 1:
+            try:
+                context = min((ctx for _, _, ctx in group), key=_deadline_order)
+                results = context.run(self.dispatch_batch, [item for item, _, _ in group])
+                if len(results) != len(group):
+                    raise ValueError(f"expected {len(group)} results, got {len(results)}")
+            except Exception as exc:
+                logger.warning("Micro-batch of %d failed, retrying items individually: %s", len(group), exc)
+                with self._counters_lock:
+                    self._counters["fallbacks"] += 1
+            else:
+                with self._counters_lock:
+                    self._counters["batches"] += 1
+                    self._counters["batched_items"] += len(group)
+                for (_, future, _), result in zip(group, results):
+                    future.set_result(result)
+                return
+        for item, future, context in group:
+            try:
+                future.set_result(context.run(self.dispatch_one, item))
+            except Exception as exc:
+                future.set_exception(exc)
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats["pending"] = self._queue.qsize()
+        return stats
@@ -0,0 +1,189 @@
+"""
+Validated plan templates and plan-cache keys for ``src.planner``.
+
+Templates are matched locally against the normalized goal before any model call: each
+one lists groups of word prefixes that must all appear in the goal (one prefix per group)
+and prefixes that must not. A keyword ending in "$" only matches that whole word ("fix$"
+matches "fix", not "fixture"). A keyword preceded closely by a negation ("don't suggest
+anything") does not count either way, so such goals fall through to the model or to a
+template that excludes it. Templates are validated when they are loaded (known actions,
+unique ids, acyclic ``depends_on``), so a match can be handed to the executor as is.
+Custom templates can be added with a JSON file at PLAN_TEMPLATES_PATH:
+
+    [{"name": "...", "all_of": [["triage", "review"]], "none_of": [], "steps": [...]}]
+
+``plan_key`` keys the plan cache on the normalized goal plus a fingerprint of the context.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.scheduler import build_step_graph
+
+logger = logging.getLogger(__name__)
+
+# Actions the executor has handlers for (see Executor._handlers).
+KNOWN_ACTIONS = ("analyze_messages", "detect_friction", "generate_interventions")
+
+# Context keys that change on every call without changing what the plan should be
+# (similarity hits from src.knowledge_store); left out of the cache key.
+VOLATILE_CONTEXT_KEYS = ("related_history",)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_ANALYZE = ("analy", "ingest", "process", "classif", "summar", "sentiment")
+_FRICTION = ("friction", "misalign", "conflict", "tension", "disagree", "frustrat", "blocker")
+_INTERVENE = ("interven", "resolv", "suggest", "recommend", "clarif", "mediat", "fix$", "fixes$", "fixing$")
+# analysis_only needs the goal to rule the other steps out explicitly ("just analyze ...").
+_RESTRICT = ("only$", "just$")
+
+# Words that negate a keyword up to _NEGATION_WINDOW words after them.
+_NEGATIONS = frozenset(("not", "no", "never", "without", "nor", "cannot", "dont", "skip", "avoid", "except"))
+# Stems that only negate as a contraction: "don't" normalizes to "don t", while "won" alone is a verb.
+_CONTRACTIONS = frozenset(("don", "doesn", "didn", "won", "can", "isn", "aren", "wasn", "weren", "shouldn", "wouldn", "couldn"))
+_NEGATION_WINDOW = 3
+
+_ANALYZE_STEP = {"id": "1", "action": "analyze_messages", "input": "ingest and analyze messages", "notes": "use CommunicationAgent", "expected_output": "message analyses"}
+_DETECT_STEP = {"id": "2", "action": "detect_friction", "input": "use analyses", "notes": "call FrictionDetectionAgent", "expected_output": "friction report"}
+_INTERVENE_STEP = {"id": "3", "action": "generate_interventions", "input": "friction report", "notes": "call InterventionAgent", "expected_output": "recommended actions"}
+
+# Also the planner's heuristic fallback.
+DEFAULT_STEPS = [_ANALYZE_STEP, _DETECT_STEP, _INTERVENE_STEP]
+
+
+def normalize_goal(goal: str) -> str:
+    return " ".join(_WORD_RE.findall((goal or "").lower()))
+
+
+def affirmed_words(words: Sequence[str]) -> List[str]:
+    """``words`` minus those within _NEGATION_WINDOW words after a negation."""
+    kept = []
+    negated_until = -1
+    for i, word in enumerate(words):
+        if word in _NEGATIONS:
+            negated_until = i + _NEGATION_WINDOW
+        elif word in _CONTRACTIONS and i + 1 < len(words) and words[i + 1] == "t":
+            negated_until = i + 1 + _NEGATION_WINDOW
+        elif i > negated_until:
+            kept.append(word)
+    return kept
+
+
+def context_fingerprint(context: Optional[Dict[str, Any]]) -> str:
+    stable = {k: v for k, v in (context or {}).items() if k not in VOLATILE_CONTEXT_KEYS}
+    encoded = json.dumps(stable, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def plan_key(goal: str, context: Optional[Dict[str, Any]]) -> str:
+    return hashlib.sha256(f"{normalize_goal(goal)}|{context_fingerprint(context)}".encode("utf-8")).hexdigest()
+
+
+def validate_steps(steps: Any) -> Optional[str]:
+    """None if ``steps`` can be executed as a plan, else the reason it cannot."""
+    if not isinstance(steps, list) or not steps:
+        return "plan has no steps"
+    ids = set()
+    for step in steps:
+        if not isinstance(step, dict) or step.get("id") is None or not isinstance(step.get("action"), str):
+            return "every step needs an id and an action"
+        step_id = str(step["id"])
+        if step_id in ids:
+            return f"duplicate step id {step_id}"
+        ids.add(step_id)
+    if not any(step["action"] in KNOWN_ACTIONS for step in steps):
+        return "plan has no executable action"
+    try:
+        build_step_graph(steps)
+    except ValueError as exc:
+        return str(exc)
+    return None
+
+
+def _keyword_matches(keyword: str, word: str) -> bool:
+    if keyword.endswith("$"):
+        return word == keyword[:-1]
+    return word.startswith(keyword)
+
+
+class PlanTemplate:
+    def __init__(self, name: str, all_of: Sequence[Sequence[str]], steps: List[Dict[str, Any]], none_of: Sequence[str] = ()):
+        problem = validate_steps(steps)
+        if problem:
+            raise ValueError(f"plan template {name!r}: {problem}")
+        # A bare string is one prefix, not a group of single characters.
+        groups = tuple((group,) if isinstance(group, str) else tuple(group) for group in all_of)
+        none_of = (none_of,) if isinstance(none_of, str) else tuple(none_of)
+        if not groups or not all(groups):
+            raise ValueError(f"plan template {name!r}: all_of needs at least one non-empty keyword group")
+        if not all(prefix.rstrip("$") for group in groups for prefix in group) or not all(p.rstrip("$") for p in none_of):
+            raise ValueError(f"plan template {name!r}: empty keyword prefix")
+        self.name = name
+        self.all_of = groups
+        self.none_of = none_of
+        self._steps = copy.deepcopy(steps)
+
+    def matches(self, words: Sequence[str]) -> bool:
+        def has(prefixes: Sequence[str]) -> bool:
+            return any(_keyword_matches(prefix, word) for word in words for prefix in prefixes)
+
+        return all(has(group) for group in self.all_of) and not has(self.none_of)
+
+    def steps(self) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._steps)
+
+
+BUILTIN_TEMPLATES = [
+    PlanTemplate("detect_and_intervene", [_FRICTION, _INTERVENE], DEFAULT_STEPS),
+    PlanTemplate("friction_report", [_FRICTION], [_ANALYZE_STEP, _DETECT_STEP], none_of=_INTERVENE),
+    PlanTemplate("analysis_only", [_ANALYZE, _RESTRICT], [_ANALYZE_STEP], none_of=_FRICTION + _INTERVENE),
+]
+
+
+def load_templates(path: str) -> List[PlanTemplate]:
+    """Templates from a JSON file; invalid entries are logged and skipped."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not load plan templates from %s: %s", path, exc)
+        return []
+    templates = []
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            templates.append(PlanTemplate(entry["name"], entry["all_of"], entry["steps"], entry.get("none_of", ())))
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Skipping plan template %r: %s", entry.get("name") if isinstance(entry, dict) else entry, exc)
+    return templates
+
+
+_templates: Optional[List[PlanTemplate]] = None
+_templates_lock = threading.Lock()
+
+
+def get_templates() -> List[PlanTemplate]:
+    """Custom templates (PLAN_TEMPLATES_PATH) first, then the built-in ones."""
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                path = os.getenv("PLAN_TEMPLATES_PATH")
+                _templates = (load_templates(path) if path else []) + BUILTIN_TEMPLATES
+    return _templates
+
+
+def match_template(goal: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """(template name, fresh copy of its steps) for the first template matching ``goal``."""
+    words = affirmed_words(normalize_goal(goal).split())
+    if not words:
+        return None
+    for template in get_templates():
+        if template.matches(words):
+            return template.name, template.steps()
+    return None
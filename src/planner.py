@@ -1,22 +1,43 @@
+import copy
 import json
 import os
+import threading
 from typing import Any, Dict, List, Optional
 
-try:
-    import google.genai as genai
-except ImportError:
-    genai = None
+from src import llm, metrics, plan_library, singleflight
+from src.cache import ResponseCache
+from src.settings import env_flag
+from src.shared_store import get_shared_store
 
+_inflight = singleflight.SingleFlight()
 
-def _make_client() -> Optional[Any]:
-    """Create a Gemini client if api key and library are available."""
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key or genai is None:
-        return None
-    try:
-        return genai.Client(api_key=api_key)
-    except Exception:
-        return None
+
+def _templates_enabled() -> bool:
+    return env_flag("PLAN_TEMPLATES_ENABLED", True)
+
+
+def _plan_cache_enabled() -> bool:
+    return env_flag("PLAN_CACHE_ENABLED", True)
+
+
+_plan_cache: Optional[ResponseCache] = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> ResponseCache:
+    """Validated model plans keyed by normalized goal + context fingerprint (PLAN_CACHE_*)."""
+    global _plan_cache
+    if _plan_cache is None:
+        with _plan_cache_lock:
+            if _plan_cache is None:
+                _plan_cache = ResponseCache(
+                    max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256")),
+                    ttl_seconds=float(os.getenv("PLAN_CACHE_TTL_SECONDS", "86400")),
+                    disk_dir=os.getenv("PLAN_CACHE_DIR") or None,
+                    shared=get_shared_store(),
+                    namespace="plans",
+                )
+    return _plan_cache
 
 
 def _parse_candidate(raw_text: str) -> List[Dict[str, Any]]:
@@ -35,42 +56,77 @@ def _parse_candidate(raw_text: str) -> List[Dict[str, Any]]:
 def plan(goal: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Produce a task plan for the goal.
-    Returns {source, steps, raw_response, error}.
+    Returns {source, steps, raw_response, error, cached}; source is "template", "gemini",
+    "fallback" or "heuristic" (template plans also carry the template name).
+    Goals matching a plan template (src.plan_library) are planned locally; otherwise a
+    validated model plan for the same normalized goal and context is reused from the plan cache.
+    Concurrent calls with the same goal and context share one planning call.
     """
     context = context or {}
+    with metrics.PLAN_SECONDS.time():
+        result = _local_plan(goal, context)
+        if result is not None:
+            return result
+        if not singleflight.enabled():
+            return _plan(goal, context)
+        result, shared = _inflight.do(singleflight.content_key("plan", goal, context), lambda: _plan(goal, context))
+    return copy.deepcopy(result) if shared else result
+
+
+def _local_plan(goal: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A template or cached plan for ``goal``, or None when the model has to plan it."""
+    if _templates_enabled():
+        match = plan_library.match_template(goal)
+        if match is not None:
+            name, steps = match
+            metrics.PLANS.inc(source="template")
+            return {"source": "template", "template": name, "steps": steps, "raw_response": None, "error": None, "cached": False}
+    if _plan_cache_enabled():
+        cached = get_plan_cache().get(plan_library.plan_key(goal, context))
+        if cached is not None:
+            metrics.PLANS.inc(source="cache")
+            return dict(copy.deepcopy(cached), cached=True)
+    return None
+
+
+def _plan(goal: str, context: Dict[str, Any]) -> Dict[str, Any]:
     steps: List[Dict[str, Any]] = []
     raw_response = None
     error = None
 
-    client = _make_client()
-    if goal and client:
+    api_source = None
+    if goal:
         prompt = (
             "You are a planner. Create 3-6 JSON steps to satisfy the goal. "
             "Each step must have: id, action, input, notes, expected_output. "
+            "Steps may also declare depends_on: a list of step ids that must finish first. "
             f"Goal: {goal}\nContext: {json.dumps(context)[:1500]}"
         )
         try:
-            response = client.models.generate_content(
+            # Spread over all configured keys; OpenAI-compatible fallback once they are exhausted.
+            completion = llm.complete(
                 model=os.getenv("GEMINI_PRO_MODEL_ID", "gemini-2.0-flash"),
-                contents=[{"parts": [{"text": prompt}]}],
+                prompt=prompt,
             )
-            if response.candidates and response.candidates[0].content.parts:
-                raw_response = response.candidates[0].content.parts[0].text
+            if completion and completion.get("text"):
+                raw_response = completion["text"]
+                api_source = completion["api_source"]
                 steps = _parse_candidate(raw_response)
         except Exception as exc:  # pragma: no cover - network/Gemini issues
             error = str(exc)
 
     if not steps:
         # Fallback heuristic plan
-        steps = [
-            {"id": "1", "action": "analyze_messages", "input": "ingest and analyze messages", "notes": "use CommunicationAgent", "expected_output": "message analyses"},
-            {"id": "2", "action": "detect_friction", "input": "use analyses", "notes": "call FrictionDetectionAgent", "expected_output": "friction report"},
-            {"id": "3", "action": "generate_interventions", "input": "friction report", "notes": "call InterventionAgent", "expected_output": "recommended actions"},
-        ]
+        steps = copy.deepcopy(plan_library.DEFAULT_STEPS)
         source = "heuristic"
     else:
-        source = "gemini"
+        source = api_source or "gemini"
 
-    return {"source": source, "steps": steps, "raw_response": raw_response, "error": error}
+    result = {"source": source, "steps": steps, "raw_response": raw_response, "error": error, "cached": False}
+    metrics.PLANS.inc(source=source)
+    # Only plans the executor can actually run are reused; heuristic plans retry the model next time.
+    if source != "heuristic" and _plan_cache_enabled() and plan_library.validate_steps(steps) is None:
+        get_plan_cache().set(plan_library.plan_key(goal, context), copy.deepcopy(result))
+    return result
 
 
@@ -0,0 +1,157 @@
+"""
+Local pre-filter tier: decides, without any model call, that a message is clearly benign
+("thanks!", "ok", "sounds good") so the friction and intervention stages can be skipped.
+
+Two cheap checks run in order:
+
+1. lexical rules: a short acknowledgment with no question, negation or negative cue
+2. a small linear classifier over a fixed feature vector (length, cue-word counts,
+   punctuation, sentiment); benign when P(benign) >= ``PREFILTER_BENIGN_THRESHOLD``.
+   It only looks at short messages (``SHORT_MAX_WORDS``) with a positive lexical signal
+   (gratitude or positive sentiment), net lexical sentiment >= 0 and no negation, pressure
+   or negative cue (``src.conversation``'s lexicon). Gratitude is no evidence on its own:
+   "thanks for breaking prod" and "great work, thanks for shipping it late again" are not
+   benign, and neither is anything long enough to carry a complaint after the thanks.
+
+Anything not confidently benign goes to the model tiers. Weights can be replaced with a
+JSON file of ``{"bias": float, "weights": {feature: float}}`` via ``PREFILTER_WEIGHTS_PATH``.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.conversation import lexical_sentiment, negative_cues
+
+logger = logging.getLogger(__name__)
+
+BENIGN_THRESHOLD = float(os.getenv("PREFILTER_BENIGN_THRESHOLD", "0.85"))
+# Longer messages always go to the model tiers.
+SHORT_MAX_WORDS = 6
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_ACK_RE = re.compile(
+    r"^\s*(ok(ay)?|k|kk|thanks?( you)?|thx|ty|cheers|great|perfect|cool|nice|got it|noted|"
+    r"sounds good|lgtm|will do|done|yes|yep|sure|np|no problem|no worries|awesome|agreed|\+1|👍|🙏|🙂|😊)"
+    r"[\s!.,:)👍🙏🙂😊]*(\s*(thanks?|thx|ty|!))*[\s!.]*$",
+    re.IGNORECASE,
+)
+_NEGATION = frozenset(
+    "not no never nothing don't can't won't isn't aren't wasn't didn't doesn't shouldn't but however".split()
+)
+# Set phrases whose "no"/"problem" is not a negative cue; removed before counting cues.
+_IDIOM_RE = re.compile(r"\b(no|not a) (problem|worries)\b")
+_PRESSURE = frozenset("asap urgent deadline eod blocker blocked escalate escalating overdue critical".split())
+_GRATITUDE = frozenset("thanks thank thx ty cheers appreciate appreciated".split())
+
+FEATURES: Tuple[str, ...] = (
+    "short", "long", "question", "exclaim", "caps", "negation", "pressure", "gratitude", "sentiment",
+)
+_DEFAULT_BIAS = 1.0
+_DEFAULT_WEIGHTS: Dict[str, float] = {
+    "short": 1.5,
+    "long": -1.5,
+    "question": -2.5,
+    "exclaim": 0.2,
+    "caps": -2.0,
+    "negation": -1.5,
+    "pressure": -2.5,
+    "gratitude": 0.75,
+    "sentiment": 2.0,
+}
+
+
+def _load_weights() -> Tuple[float, List[float]]:
+    bias, weights = _DEFAULT_BIAS, dict(_DEFAULT_WEIGHTS)
+    path = os.getenv("PREFILTER_WEIGHTS_PATH")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                trained = json.load(fh)
+            bias = float(trained.get("bias", bias))
+            weights.update({k: float(v) for k, v in trained.get("weights", {}).items() if k in weights})
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load prefilter weights from %s: %s", path, e)
+    return bias, [weights[name] for name in FEATURES]
+
+
+_BIAS, _WEIGHTS = _load_weights()
+
+
+def _cue_text(text: str) -> str:
+    return _IDIOM_RE.sub(" ", text.lower())
+
+
+def features(text: str) -> List[float]:
+    """Feature vector in ``FEATURES`` order."""
+    words = _WORD_RE.findall(_cue_text(text))
+    n = len(words)
+    caps = sum(1 for w in re.findall(r"\b[A-Z]{3,}\b", text))
+    return [
+        1.0 if n <= 4 else 0.0,
+        min(n / 40.0, 2.0),
+        float(text.count("?")),
+        1.0 if "!" in text else 0.0,
+        float(min(caps, 3)),
+        float(sum(1 for w in words if w in _NEGATION)),
+        float(sum(1 for w in words if w in _PRESSURE)),
+        float(min(sum(1 for w in words if w in _GRATITUDE), 2)),
+        lexical_sentiment(_cue_text(text)),
+    ]
+
+
+def benign_probability(text: str) -> float:
+    z = _BIAS + sum(w * x for w, x in zip(_WEIGHTS, features(text)))
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def classify(message: Dict[str, Any], threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Verdict for one message: ``{"benign", "tier", "rule", "score"}``.
+    ``tier`` is "prefilter" when the message was decided locally and "model" otherwise.
+    Messages with an image always go to the model tiers.
+    """
+    threshold = BENIGN_THRESHOLD if threshold is None else threshold
+    text = (message.get("text_content") or "").strip()
+    if message.get("image_blob") or message.get("image_bytes") or not text:
+        return {"benign": False, "tier": "model", "rule": "image_or_empty", "score": None}
+
+    cue_text = _cue_text(text)
+    tokens = _WORD_RE.findall(cue_text)
+    words = set(tokens)
+    cued = bool(words & _NEGATION or words & _PRESSURE or negative_cues(cue_text))
+    if _ACK_RE.match(text) and not cued:
+        return {"benign": True, "tier": "prefilter", "rule": "acknowledgment", "score": 1.0}
+    if cued:
+        return {"benign": False, "tier": "model", "rule": "negative_cue", "score": None}
+    if len(tokens) > SHORT_MAX_WORDS:
+        return {"benign": False, "tier": "model", "rule": "too_long", "score": None}
+
+    sentiment = lexical_sentiment(cue_text)
+    score = round(benign_probability(text), 4)
+    if sentiment < 0 or not (words & _GRATITUDE or sentiment > 0):
+        return {"benign": False, "tier": "model", "rule": "no_positive_signal", "score": score}
+    if score >= threshold:
+        return {"benign": True, "tier": "prefilter", "rule": "classifier", "score": score}
+    return {"benign": False, "tier": "model", "rule": "classifier", "score": score}
+
+
+def benign_friction(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "friction_detected": False,
+        "reason": "Message classified as benign by the local pre-filter.",
+        "severity": "none",
+        "decided_by": "prefilter",
+        "prefilter": verdict,
+    }
+
+
+def skipped_intervention(decided_by: str) -> Dict[str, Any]:
+    return {
+        "intervention_suggested": False,
+        "suggestion": None,
+        "decided_by": decided_by,
+    }
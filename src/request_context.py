@@ -0,0 +1,100 @@
+"""
+Per-request context carried in contextvars: the request deadline and the model calls made.
+
+``deadline_at(ts)`` sets an absolute deadline (``time.time()`` based, so it can be stored
+with a job) for the code in its block; nested deadlines only ever tighten. Model-calling
+code checks ``remaining()`` / ``check_deadline()`` and bounds its waits with it.
+
+``record_calls()`` collects one entry per provider call ({provider, outcome}) made inside
+its block, so callers learn which backend answered and whether it was rate limited without
+searching the agents' output for "429"/"quota".
+
+contextvars do not follow work onto plain thread pools; wrap submitted callables with
+``bind`` so they run in a copy of the submitting thread's context.
+"""
+
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("cifr_deadline", default=None)
+_calls: contextvars.ContextVar = contextvars.ContextVar("cifr_provider_calls", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the work could finish."""
+
+
+@contextmanager
+def deadline_at(timestamp: Optional[float]) -> Iterator[None]:
+    """Run the block under ``timestamp`` (epoch seconds), or the enclosing deadline if earlier."""
+    current = _deadline.get()
+    if timestamp is not None and (current is None or timestamp < current):
+        current = timestamp
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (may be negative), or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(what: str = "request") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"{what} deadline exceeded")
+
+
+def bounded(timeout: Optional[float]) -> Optional[float]:
+    """``timeout`` capped by the time remaining (None = no bound on either side)."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(0.0, left)
+    return left if timeout is None else min(timeout, left)
+
+
+@contextmanager
+def record_calls() -> Iterator[List[Dict[str, Any]]]:
+    calls: List[Dict[str, Any]] = []
+    token = _calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _calls.reset(token)
+
+
+def note_call(provider: str, outcome: str) -> None:
+    calls = _calls.get()
+    if calls is not None:
+        calls.append({"provider": provider, "outcome": outcome})
+
+
+def call_flags(calls: List[Dict[str, Any]]) -> Dict[str, bool]:
+    """The ``quota_error`` / ``fallback`` flags (as in src.serialization) implied by ``calls``."""
+    return {
+        "quota_error": any(c["outcome"] == "rate_limited" for c in calls),
+        "fallback": any(c["provider"] == "fallback" and c["outcome"] == "ok" for c in calls),
+    }
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """``fn`` wrapped to run in a copy of the current context (for thread pool submission)."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
@@ -0,0 +1,329 @@
+"""
+Routes model calls across providers (Gemini through the key pool, then the
+OpenAI-compatible fallback) with per-provider circuit breakers and latency hedging.
+
+- Circuit breaker: CIRCUIT_FAILURE_THRESHOLD consecutive failures (errors or an exhausted
+  key pool) open a provider's circuit; it gets no traffic for CIRCUIT_COOLDOWN_SECONDS,
+  then a single probe call decides whether it closes again or stays open.
+- Failover: a failed call moves on to the next provider whose circuit allows it, instead
+  of failing the request.
+- Hedging: once a provider has HEDGE_MIN_SAMPLES successful latencies, its calls run on
+  the hedge pool (HEDGE_MAX_WORKERS) and one still running after its p95 (at least
+  HEDGE_MIN_DELAY_MS) starts the next provider as well; whichever answers first is
+  returned, and the slower call's answer is dropped when it arrives. When the pool is
+  full, or hedging does not apply yet, the call runs inline on the caller's thread, so the
+  pool never limits how many model calls run at once.
+- Deadlines: providers bound their own waits by the request deadline (src.request_context)
+  and an answer that arrives after it raises DeadlineExceeded.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from src import metrics, request_context
+from src.keypool import QuotaExhaustedError, is_quota_error
+from src.request_context import DeadlineExceeded
+from src.settings import env_flag
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(QuotaExhaustedError):
+    """Raised when every configured provider's circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (cooldown) -> half-open (one probe) -> closed/open."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        metrics.CIRCUIT_STATE.set(0, provider=name)
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning("Circuit for %s: %s -> %s", self.name, self._state, state)
+            self._state = state
+            metrics.CIRCUIT_STATE.set(_STATE_VALUES[state], provider=self.name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go to this provider now (in half-open, only the one probe)."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self._set_state(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._set_state(OPEN)
+
+    def release(self) -> None:
+        """The call ended without telling us anything about the provider (e.g. our deadline passed)."""
+        with self._lock:
+            self._probing = False
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            cooldown = max(0.0, self.cooldown_seconds - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return {"state": state, "consecutive_failures": self._failures, "cooldown_remaining": round(cooldown, 2)}
+
+
+class LatencyWindow:
+    """The last ``size`` successful call latencies of one provider."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class Provider:
+    """A named backend: ``call(model, prompt, image_bytes, mime_type)`` returns the response text."""
+
+    def __init__(self, name: str, call: Callable[..., Optional[str]], available: Callable[[], bool]):
+        self.name = name
+        self.call = call
+        self.available = available
+
+
+class ProviderRouter:
+    """Calls the first healthy provider in order, failing over and hedging as described above."""
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 30.0,
+        hedge_enabled: bool = True,
+        hedge_min_samples: int = 20,
+        hedge_min_delay_seconds: float = 0.25,
+        hedge_max_workers: int = 32,
+    ):
+        self.providers = list(providers)
+        self.breakers = {p.name: CircuitBreaker(p.name, failure_threshold, cooldown_seconds) for p in self.providers}
+        self.latencies = {p.name: LatencyWindow() for p in self.providers}
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_max_workers = hedge_max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, hedge_max_workers))
+
+    @classmethod
+    def from_env(cls, providers: List[Provider]) -> "ProviderRouter":
+        return cls(
+            providers,
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            cooldown_seconds=float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30")),
+            hedge_enabled=env_flag("HEDGE_ENABLED", True),
+            hedge_min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay_seconds=float(os.getenv("HEDGE_MIN_DELAY_MS", "250")) / 1000.0,
+            hedge_max_workers=int(os.getenv("HEDGE_MAX_WORKERS", "32")),
+        )
+
+    def available(self) -> bool:
+        return any(p.available() for p in self.providers)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=max(1, self.hedge_max_workers), thread_name_prefix="hedge")
+        return self._pool
+
+    def _invoke(self, provider: Provider, args: tuple) -> Optional[str]:
+        """One call to ``provider``; updates its breaker and latency window."""
+        breaker = self.breakers[provider.name]
+        started = time.perf_counter()
+        try:
+            text = provider.call(*args)
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        except Exception as exc:
+            quota = isinstance(exc, QuotaExhaustedError) or is_quota_error(exc)
+            breaker.record_failure()
+            request_context.note_call(provider.name, "rate_limited" if quota else "error")
+            raise
+        breaker.record_success()
+        self.latencies[provider.name].add(time.perf_counter() - started)
+        request_context.note_call(provider.name, "ok")
+        return text
+
+    def _hedge_delay(self, provider: Provider) -> Optional[float]:
+        p95 = self.latencies[provider.name].percentile(0.95, self.hedge_min_samples)
+        return None if p95 is None else max(p95, self.hedge_min_delay_seconds)
+
+    def _next_allowed(self, candidates: List[Provider]) -> Optional[Provider]:
+        """Pop providers off ``candidates`` until one whose circuit admits a call."""
+        while candidates:
+            provider = candidates.pop(0)
+            if self.breakers[provider.name].allow():
+                return provider
+            metrics.MODEL_CALLS.inc(backend=provider.name, outcome="circuit_open")
+            request_context.note_call(provider.name, "circuit_open")
+        return None
+
+    def _pooled(self, provider: Provider, args: tuple) -> Optional[str]:
+        try:
+            return self._invoke(provider, args)
+        finally:
+            self._slots.release()
+
+    def _submit(self, provider: Provider, args: tuple) -> Optional[Future]:
+        """Start ``provider`` on the pool, or None when every pool slot is taken."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            return self._executor().submit(request_context.bind(self._pooled), provider, args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _race(self, provider: Provider, candidates: List[Provider], args: tuple) -> Optional[Dict[str, Any]]:
+        """
+        Run ``provider`` on the pool and, if it is still running after its hedge delay, the
+        next candidate (taken off ``candidates``) too; the first answer wins. Returns None,
+        having started nothing, when hedging does not apply or the pool is saturated (the
+        caller then runs the call inline). Raises the last error if every started call fails.
+        """
+        delay = self._hedge_delay(provider) if self.hedge_enabled and candidates else None
+        if delay is None:
+            return None
+        primary = self._submit(provider, args)
+        if primary is None:
+            return None
+        running: Dict[Future, Provider] = {primary: provider}
+        hedge_at: Optional[float] = time.monotonic() + delay
+        hedged = False
+        last_error: Optional[BaseException] = None
+        while running:
+            timeout = request_context.bounded(None)
+            if hedge_at is not None:
+                until_hedge = max(0.0, hedge_at - time.monotonic())
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = running.pop(future)
+                try:
+                    text = future.result()
+                except DeadlineExceeded:
+                    raise
+                except Exception as exc:
+                    logger.warning("Model call via %s failed: %s", source.name, exc)
+                    last_error = exc
+                    continue
+                if hedged:
+                    metrics.HEDGED_REQUESTS.inc(winner=source.name)
+                request_context.check_deadline("model call")
+                return {"text": text, "api_source": source.name}
+            if done:
+                continue
+            if hedge_at is None or time.monotonic() < hedge_at:
+                raise DeadlineExceeded("model call deadline exceeded")
+            hedge_at = None
+            backup = self._next_allowed(candidates)
+            if backup is None:
+                continue
+            future = self._submit(backup, args)
+            if future is None:
+                self.breakers[backup.name].release()
+                candidates.insert(0, backup)
+                continue
+            running[future] = backup
+            hedged = True
+        raise last_error  # type: ignore[misc]
+
+    def call(self, model: str, prompt: str, image_bytes: Optional[bytes] = None, mime_type: str = "image/png") -> Dict[str, Any]:
+        """{"text", "api_source"} from the first provider to answer; raises the last error if all fail."""
+        args = (model, prompt, image_bytes, mime_type)
+        candidates = [p for p in self.providers if p.available()]
+        last_error: Optional[BaseException] = None
+        while True:
+            request_context.check_deadline("model call")
+            provider = self._next_allowed(candidates)
+            if provider is None:
+                if last_error is not None:
+                    raise last_error
+                raise CircuitOpenError("No model provider available: every circuit is open")
+            try:
+                result = self._race(provider, candidates, args)
+                if result is None:
+                    try:
+                        text = self._invoke(provider, args)
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as exc:
+                        logger.warning("Model call via %s failed: %s", provider.name, exc)
+                        raise
+                    request_context.check_deadline("model call")
+                    result = {"text": text, "api_source": provider.name}
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                last_error = exc
+                continue
+            return result
+
+    def status(self) -> Dict[str, Any]:
+        status = {}
+        for provider in self.providers:
+            p95 = self.latencies[provider.name].percentile(0.95)
+            status[provider.name] = dict(
+                self.breakers[provider.name].status(),
+                available=provider.available(),
+                latency_samples=len(self.latencies[provider.name]),
+                p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+            )
+        return status
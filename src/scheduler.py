@@ -0,0 +1,151 @@
+import heapq
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _as_id_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def build_step_graph(steps: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Return the prerequisites of each step as indexes into ``steps``.
+    Steps that declare ``depends_on`` (id or list of ids) use it; others depend on the previous step.
+    Raises ValueError if the declared dependencies contain a cycle.
+    """
+    index_by_id = {str(step.get("id")): i for i, step in enumerate(steps)}
+    graph: List[List[int]] = []
+    for i, step in enumerate(steps):
+        if "depends_on" in step:
+            deps = []
+            for dep_id in _as_id_list(step.get("depends_on")):
+                dep = index_by_id.get(dep_id)
+                if dep is None or dep == i:
+                    logger.warning("Step %s: ignoring unknown dependency %r", step.get("id"), dep_id)
+                    continue
+                deps.append(dep)
+            graph.append(deps)
+        else:
+            graph.append([i - 1] if i > 0 else [])
+
+    # Kahn's algorithm only to validate the graph is acyclic.
+    indegree = [len(deps) for deps in graph]
+    children: List[List[int]] = [[] for _ in steps]
+    for i, deps in enumerate(graph):
+        for dep in deps:
+            children[dep].append(i)
+    ready = [i for i, d in enumerate(indegree) if d == 0]
+    seen = 0
+    while ready:
+        node = ready.pop()
+        seen += 1
+        for child in children[node]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if seen != len(steps):
+        raise ValueError("Plan step dependencies contain a cycle")
+    return graph
+
+
+class DagScheduler:
+    """
+    Pipelines messages through a plan as a per-message dependency graph.
+    A (step, message) node runs as soon as the same message has finished the step's prerequisites,
+    so early messages reach later steps without waiting for the whole batch.
+    Ready nodes are picked by (message position, step position) to favour time-to-first-result.
+    Nodes of ``ordered`` steps are released in message order, so ``on_release`` sees them that way.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, int(max_workers))
+
+    def run(
+        self,
+        steps: List[Dict[str, Any]],
+        messages: List[Dict[str, Any]],
+        call: Callable[[int, Dict[str, Any]], Any],
+        on_complete: Callable[[int, int, Any], None],
+        skip: Optional[Set[int]] = None,
+        ordered: Optional[Set[int]] = None,
+        on_release: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        """
+        Run ``call(step_index, message)`` for every node and report each outcome through
+        ``on_complete(step_index, message_index, outcome)`` from the calling thread.
+        Steps in ``skip`` are treated as already satisfied. A node of a step in ``ordered``
+        is only released once the previous message's node of that step has been.
+        ``on_release(step_index, message_index)`` runs on the calling thread as each node
+        is queued, before any worker can pick it up.
+        """
+        skip = skip or set()
+        ordered = ordered or set()
+        try:
+            graph = build_step_graph(steps)
+        except ValueError as exc:
+            logger.warning("%s; falling back to plan order", exc)
+            graph = [[i - 1] if i > 0 else [] for i in range(len(steps))]
+
+        children: List[List[int]] = [[] for _ in steps]
+        for i, deps in enumerate(graph):
+            for dep in deps:
+                children[dep].append(i)
+
+        waiting: Dict[Tuple[int, int], int] = {}
+        ready: List[Tuple[int, int]] = []  # heap of (message_index, step_index)
+
+        def resolve(step_index: int, message_index: int) -> None:
+            for child in children[step_index]:
+                key = (child, message_index)
+                waiting[key] -= 1
+                if waiting[key] == 0:
+                    release(child, message_index)
+
+        next_in_order = {step_index: 0 for step_index in ordered}
+        held: Set[Tuple[int, int]] = set()
+
+        def release(step_index: int, message_index: int) -> None:
+            if step_index not in ordered:
+                queue(step_index, message_index)
+                return
+            held.add((step_index, message_index))
+            while (step_index, next_in_order[step_index]) in held:
+                held.discard((step_index, next_in_order[step_index]))
+                next_in_order[step_index] += 1
+                queue(step_index, next_in_order[step_index] - 1)
+
+        def queue(step_index: int, message_index: int) -> None:
+            if step_index in skip:
+                resolve(step_index, message_index)
+                return
+            if on_release:
+                on_release(step_index, message_index)
+            heapq.heappush(ready, (message_index, step_index))
+
+        for message_index in range(len(messages)):
+            for step_index, deps in enumerate(graph):
+                waiting[(step_index, message_index)] = len(deps)
+        for message_index in range(len(messages)):
+            for step_index, deps in enumerate(graph):
+                if not deps:
+                    release(step_index, message_index)
+
+        pending: Dict[Future, Tuple[int, int]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while ready or pending:
+                while ready and len(pending) < self.max_workers:
+                    message_index, step_index = heapq.heappop(ready)
+                    future = pool.submit(call, step_index, messages[message_index])
+                    pending[future] = (step_index, message_index)
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_index, message_index = pending.pop(future)
+                    on_complete(step_index, message_index, future.result())
+                    resolve(step_index, message_index)
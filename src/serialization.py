@@ -0,0 +1,187 @@
+"""
+Single-pass conversion of agent results (dicts, proto-plus / protobuf objects,
+Cloud Language sentiment and entity types) into JSON-safe structures.
+
+Built-in types map to a handler cached per type; other objects are classified by the
+attributes they carry on each visit, since that can differ between instances. The same walk also records
+structured status flags, so callers do not need to re-dump the tree and search it
+for quota markers:
+
+- ``quota_error``: a string leaf mentions 429 / RESOURCE_EXHAUSTED / quota, or an int leaf is 429
+- ``fallback``: some dict has ``api_source == "fallback"``
+
+Raw bytes are never copied into the output; they serialize to ``{"sha256", "size"}``.
+"""
+
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Tuple
+
+from src.blobs import describe_bytes
+
+_QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED")
+
+
+class _Walk:
+    __slots__ = ("quota_error", "fallback")
+
+    def __init__(self):
+        self.quota_error = False
+        self.fallback = False
+
+    def flags(self) -> Dict[str, bool]:
+        return {"quota_error": self.quota_error, "fallback": self.fallback}
+
+
+Handler = Callable[[Any, _Walk], Any]
+
+
+def _visit(obj: Any, walk: _Walk) -> Any:
+    cls = type(obj)
+    handler = _DISPATCH.get(cls)
+    if handler is None:
+        handler = _resolve(cls)
+        _DISPATCH[cls] = handler
+    return handler(obj, walk)
+
+
+def _key(key: Any) -> Any:
+    return key if isinstance(key, (str, int, float, bool)) or key is None else str(key)
+
+
+def _str(obj: str, walk: _Walk) -> str:
+    if not walk.quota_error and (_QUOTA_MARKERS[0] in obj or _QUOTA_MARKERS[1] in obj or "quota" in obj.lower()):
+        walk.quota_error = True
+    return obj
+
+
+def _int(obj: int, walk: _Walk) -> int:
+    if obj == 429:
+        walk.quota_error = True
+    return obj
+
+
+def _identity(obj: Any, walk: _Walk) -> Any:
+    return obj
+
+
+def _dict(obj: Dict[Any, Any], walk: _Walk) -> Dict[Any, Any]:
+    if obj.get("api_source") == "fallback":
+        walk.fallback = True
+    return {_key(k): _visit(v, walk) for k, v in obj.items()}
+
+
+def _sequence(obj: Any, walk: _Walk) -> Any:
+    return [_visit(v, walk) for v in obj]
+
+
+def _bytes(obj: Any, walk: _Walk) -> Dict[str, Any]:
+    return describe_bytes(obj)
+
+
+def _isoformat(obj: Any, walk: _Walk) -> str:
+    return obj.isoformat()
+
+
+def _object(obj: Any, walk: _Walk) -> Any:
+    # Handle Google Cloud proto-plus objects through their raw protobuf
+    pb = getattr(obj, "_pb", None)
+    if pb is not None:
+        return _visit(pb, walk)
+    return _dict({k: v for k, v in obj.__dict__.items() if not k.startswith("_")}, walk)
+
+
+def _sentiment(obj: Any, walk: _Walk) -> Dict[str, Any]:
+    return {"score": obj.score, "magnitude": obj.magnitude}
+
+
+def _entities(obj: Any, walk: _Walk) -> Any:
+    return [_visit(entity, walk) for entity in obj.entities]
+
+
+def _entity(obj: Any, walk: _Walk) -> Dict[str, Any]:
+    return {"name": _str(obj.name, walk), "type": str(obj.type_), "salience": obj.salience}
+
+
+def _named(obj: Any, walk: _Walk) -> Dict[str, Any]:
+    return {"name": _visit(obj.name, walk), "confidence": obj.confidence}
+
+
+def _protobuf(obj: Any, walk: _Walk) -> Dict[str, Any]:
+    return {field.name: _visit(getattr(obj, field.name), walk) for field, _ in obj.ListFields()}
+
+
+def _fallback(obj: Any, walk: _Walk) -> Any:
+    try:
+        # Try to convert to dict if it has to_dict or similar method
+        if hasattr(obj, "to_dict"):
+            return _visit(obj.to_dict(), walk)
+        # Or just convert to string representation for unknown complex objects
+        return _str(str(obj), walk)
+    except Exception:
+        return f"<Unserializable Object: {type(obj).__name__}>"
+
+
+_DISPATCH: Dict[type, Handler] = {
+    str: _str,
+    int: _int,
+    bool: _identity,
+    float: _identity,
+    type(None): _identity,
+    dict: _dict,
+    list: _sequence,
+    tuple: _sequence,
+    datetime: _isoformat,
+    date: _isoformat,
+    bytes: _bytes,
+    bytearray: _bytes,
+    memoryview: _bytes,
+}
+
+
+def _resolve(cls: type) -> Handler:
+    """Pick the handler for a type not seen before (same precedence as the original serializer)."""
+    if issubclass(cls, bool):
+        return _identity
+    if issubclass(cls, str):
+        return _str
+    if issubclass(cls, int):
+        return _int
+    if issubclass(cls, float):
+        return _identity
+    if issubclass(cls, dict):
+        return _dict
+    if issubclass(cls, (list, tuple)):
+        return _sequence
+    if issubclass(cls, (datetime, date)):
+        return _isoformat
+    if issubclass(cls, (bytes, bytearray, memoryview)):
+        return _bytes
+    return _duck
+
+
+def _duck(obj: Any, walk: _Walk) -> Any:
+    """Other objects: decided per instance (e.g. ``entities`` may be a list on one and None on the next)."""
+    if hasattr(obj, "__dict__"):
+        return _object(obj, walk)
+    if hasattr(obj, "score") and hasattr(obj, "magnitude"):
+        return _sentiment(obj, walk)
+    if hasattr(obj, "entities") and isinstance(obj.entities, (list, tuple)):
+        return _entities(obj, walk)
+    if hasattr(obj, "name") and hasattr(obj, "type_") and hasattr(obj, "salience"):
+        return _entity(obj, walk)
+    if hasattr(obj, "name") and hasattr(obj, "confidence"):
+        return _named(obj, walk)
+    if hasattr(obj, "DESCRIPTOR") and hasattr(obj, "ListFields"):
+        return _protobuf(obj, walk)
+    return _fallback(obj, walk)
+
+
+def serialize(obj: Any) -> Tuple[Any, Dict[str, bool]]:
+    """Return ``(json_safe_value, flags)`` from one walk over ``obj``."""
+    walk = _Walk()
+    return _visit(obj, walk), walk.flags()
+
+
+def to_jsonable(obj: Any) -> Any:
+    """JSON-safe copy of ``obj`` (flags discarded)."""
+    return _visit(obj, _Walk())
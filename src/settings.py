@@ -0,0 +1,28 @@
+"""
+Environment flag parsing shared by every module that reads an on/off setting.
+
+Settings are read from the environment at the point of use (after ``cifr_agent_system.config``
+has loaded ``.env``), so tests and long-running workers see changes without re-importing.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Return the boolean value of ``name``: 1/true/yes/on or 0/false/no/off, else ``default``."""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    value = value.strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    logger.warning("Ignoring %s=%r: expected 1/0, true/false, yes/no or on/off", name, value)
+    return default
@@ -0,0 +1,226 @@
+"""
+Cross-process key/value store for multi-worker deployments (one SQLite file in WAL mode).
+
+With SHARED_STORE_PATH set, every worker process on the host opens the same file and
+shares through it:
+
+- ``context``: KnowledgeAgent contexts (``communication_analysis_<id>``), so a friction or
+  intervention call can read the analysis another worker stored (src.agents)
+- ``knowledge``: entries of the similarity store, replayed into each worker's NumPy index
+  (src.knowledge_store)
+- ``conversation``: per-thread rolling friction signals (src.conversation)
+- ``llm`` / ``plans``: the LLM response cache and the plan cache (src.cache)
+
+WAL lets readers run alongside the single writer, and reads go through SQLite's memory
+map of the file (SHARED_STORE_MMAP_BYTES), so a lookup is an index probe in shared pages
+rather than a read() per row. Values are stored as JSON; objects JSON cannot encode go
+through src.serialization (raw bytes become {"sha256", "size"}).
+
+Without SHARED_STORE_PATH nothing changes: each process keeps its own in-memory state.
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.serialization import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_seq ON entries (seq);
+CREATE INDEX IF NOT EXISTS entries_namespace_seq ON entries (namespace, seq);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+"""
+
+_UPSERT = """
+INSERT INTO entries (namespace, key, value, expires_at, seq)
+VALUES (?, ?, ?, ?, (SELECT IFNULL(MAX(seq), 0) + 1 FROM entries))
+ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, seq = excluded.seq
+"""
+
+_MISSING = object()
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=to_jsonable)
+
+
+# A child forked while this process has the file open inherits SQLite's in-process state for
+# it (lock bookkeeping, the WAL index mapping) and can lose writes once the parent closes its
+# handle. The forking thread's handles are closed just before fork() and reopened on next
+# use, which covers gunicorn --preload (the master forks from the thread that warmed up).
+_stores: "weakref.WeakSet[SharedStore]" = weakref.WeakSet()
+_stores_lock = threading.Lock()
+
+
+def _close_before_fork() -> None:
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        store._close_local()
+
+
+class SharedStore:
+    """
+    Namespaced JSON values with optional TTL in a SQLite WAL file. Safe to use from many
+    threads (one connection per thread) and many processes (SQLite file locking). Every
+    write gets a new ``seq`` so readers can follow a namespace with ``changes``.
+    """
+
+    def __init__(self, path: str, mmap_bytes: int = 256 * 1024 * 1024, busy_timeout: float = 30.0):
+        self.path = path
+        self.mmap_bytes = max(0, int(mmap_bytes))
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with _stores_lock:
+            _stores.add(self)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "SharedStore":
+        return cls(
+            os.environ["SHARED_STORE_PATH"],
+            mmap_bytes=int(os.getenv("SHARED_STORE_MMAP_BYTES", str(256 * 1024 * 1024))),
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread, reopened after fork: a SQLite handle must not cross processes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=%d" % self.mmap_bytes)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _close_local(self) -> None:
+        """Close this thread's connection unless it is mid-transaction; _conn() reopens it."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid() or conn.in_transaction:
+            return
+        self._local.conn = None
+        conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Hold the write lock for a read-modify-write across processes. Re-entrant within a
+        thread: nested blocks join the outer transaction.
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- reads ---------------------------------------------------------------
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def get_entry(self, namespace: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """(value, expires_at) of a live entry, or None; ``expires_at`` is None for no expiry."""
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def changes(self, namespace: str, after_seq: int = 0, limit: int = 1000) -> List[Tuple[int, str, Any]]:
+        """(seq, key, value) written to ``namespace`` after ``after_seq``, oldest first."""
+        rows = self._conn().execute(
+            "SELECT seq, key, value FROM entries WHERE namespace = ? AND seq > ? "
+            "AND (expires_at IS NULL OR expires_at > ?) ORDER BY seq LIMIT ?",
+            (namespace, after_seq, time.time(), limit),
+        ).fetchall()
+        return [(seq, key, json.loads(value)) for seq, key, value in rows]
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        if namespace is None:
+            return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    # --- writes --------------------------------------------------------------
+
+    def set(self, namespace: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> int:
+        """Store ``value`` (JSON-encoded); returns the write's ``seq``."""
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        encoded = _encode(value)
+        conn = self._conn()
+        with self.transaction():
+            conn.execute(_UPSERT, (namespace, key, encoded, expires_at))
+            seq = conn.execute("SELECT seq FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()[0]
+        # Amortized cleanup instead of a sweeper thread in every worker.
+        if random.random() < 0.001:
+            self.purge_expired()
+        return seq
+
+    def delete(self, namespace: str, key: str) -> bool:
+        cursor = self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def clear(self, namespace: str) -> int:
+        return self._conn().execute("DELETE FROM entries WHERE namespace = ?", (namespace,)).rowcount
+
+    def purge_expired(self) -> int:
+        try:
+            cursor = self._conn().execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )
+        except sqlite3.OperationalError as exc:
+            logger.warning("Shared store purge skipped: %s", exc)
+            return 0
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._conn().execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace").fetchall()
+        return {"path": self.path, "namespaces": {namespace: count for namespace, count in rows}}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_close_before_fork)
+
+_store: Any = _MISSING
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """Process-wide store at SHARED_STORE_PATH, or None in single-process mode (unset)."""
+    global _store
+    if _store is _MISSING:
+        with _store_lock:
+            if _store is _MISSING:
+                _store = SharedStore.from_env() if os.getenv("SHARED_STORE_PATH") else None
+                if _store is not None:
+                    logger.info("Sharing context and caches across processes via %s", _store.path)
+    return _store
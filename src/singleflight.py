@@ -0,0 +1,136 @@
+"""
+Single-flight request coalescing: concurrent callers with the same key share one
+in-flight computation instead of each running it.
+
+- ``do(key, fn)``: the first caller runs ``fn``; callers arriving while it runs wait on
+  the same future and get its result (or its exception).
+- ``stream(key, factory)``: same for generators; followers replay the leader's items as
+  they are produced, so streaming endpoints keep streaming.
+
+Keys are only held while the work is in flight; completed results are not cached here
+(that is ``src.cache``'s job).
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.settings import env_flag
+
+
+def enabled() -> bool:
+    return env_flag("SINGLEFLIGHT_ENABLED", True)
+
+
+def content_key(*parts: Any) -> str:
+    """Stable SHA-256 over JSON-encoded parts (non-JSON values fall back to str)."""
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Broadcast:
+    """Items published by the leader, readable by any number of followers."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+    def publish(self, item: Any) -> None:
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def replay(self) -> Iterator[Any]:
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.items) and not self.done:
+                    self.cond.wait()
+                if index < len(self.items):
+                    item = self.items[index]
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            index += 1
+            yield item
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._counters = {"leaders": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run ``fn`` once per in-flight ``key``; returns ``(value, shared)``."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._counters["leaders"] += 1
+            else:
+                self._counters["shared"] += 1
+        if not leader:
+            return future.result(), True
+        try:
+            value = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stream(self, key: str, factory: Callable[[], Iterator[Any]]) -> Tuple[Iterator[Any], bool]:
+        """Generator variant of ``do``; returns ``(iterator, shared)``."""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+                self._counters["leaders"] += 1
+            else:
+                self._counters["shared"] += 1
+        if not leader:
+            return broadcast.replay(), True
+        return self._lead(key, broadcast, factory), False
+
+    def _lead(self, key: str, broadcast: _Broadcast, factory: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        error: Optional[BaseException] = None
+        try:
+            for item in factory():
+                broadcast.publish(item)
+                yield item
+        except GeneratorExit:
+            # The leader's consumer went away; followers must not wait forever.
+            error = RuntimeError("coalesced request was cancelled before it finished")
+            raise
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            with self._lock:
+                self._streams.pop(key, None)
+            broadcast.finish(error)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._calls) + len(self._streams)
+        return stats
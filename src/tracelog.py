@@ -0,0 +1,350 @@
+"""
+Append-only, segment-based on-disk trace log for MemoryStore.
+
+Record layout (little endian)::
+
+    uint32 body_len | float64 ts | uint16 type_len | uint16 source_len
+    | event type (utf-8) | source (utf-8) | JSON payload
+
+``source`` names the writer (a MemoryStore's ``store_id``), so one directory can hold the
+traces of every store in every process and each store still reads back only its own.
+
+Segments roll at ``segment_bytes``. Each segment keeps a sparse index (every
+``index_interval`` records: the highest timestamp before that record -> its byte offset)
+plus its time range, event types and sources, persisted next to it as ``.idx`` when the
+segment is sealed. Segments are ``.seg`` files; ``.log`` segments from the earlier
+source-less layout are ignored. Records are stamped under the writer's lock, but callers may pass their own
+timestamps, so nothing assumes records are in time order: the index keys are running
+maxima (safe to bisect), the time range is the real min/max, and a scan never stops early.
+Queries skip whole segments by time range / event type / source, bisect the sparse index to the
+first candidate record, and read through ``mmap`` without decoding payloads of
+non-matching records. Segments written by other processes sharing the directory are
+picked up (and followed as they grow) on each query.
+Writes are buffered and fsync'ed every ``fsync_every`` records or ``fsync_interval`` seconds.
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.serialization import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<IdHH")
+_INDEX_VERSION = 3
+_SEGMENT_SUFFIX = ".seg"
+
+
+class _Segment:
+    __slots__ = ("path", "index", "min_ts", "max_ts", "event_types", "sources", "count", "size")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index: List[List[float]] = []  # [[ts, offset], ...]
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.event_types: set = set()
+        self.sources: set = set()
+        self.count = 0
+        self.size = 0
+
+    @property
+    def index_path(self) -> str:
+        return self.path[: -len(_SEGMENT_SUFFIX)] + ".idx"
+
+    def note(self, ts: float, event_type: str, source: str, offset: int, interval: int) -> None:
+        if self.count % interval == 0:
+            # Every record before ``offset`` is at or below this key.
+            self.index.append([ts if self.max_ts is None else self.max_ts, offset])
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        self.event_types.add(event_type)
+        self.sources.add(source)
+        self.count += 1
+
+    def save_index(self) -> None:
+        meta = {
+            "version": _INDEX_VERSION,
+            "index": self.index,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "event_types": sorted(self.event_types),
+            "sources": sorted(self.sources),
+            "count": self.count,
+            "size": self.size,
+        }
+        tmp = "%s.%d.tmp" % (self.index_path, os.getpid())
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, self.index_path)
+
+    def load_index(self) -> bool:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if meta.get("version") != _INDEX_VERSION or meta.get("size") != os.path.getsize(self.path):
+            return False
+        self.index = meta["index"]
+        self.min_ts = meta["min_ts"]
+        self.max_ts = meta["max_ts"]
+        self.event_types = set(meta["event_types"])
+        self.sources = set(meta["sources"])
+        self.count = meta["count"]
+        self.size = meta["size"]
+        return True
+
+    def overlaps(self, start_ts: Optional[float], end_ts: Optional[float]) -> bool:
+        if self.min_ts is None:
+            return False
+        if start_ts is not None and self.max_ts < start_ts:
+            return False
+        if end_ts is not None and self.min_ts > end_ts:
+            return False
+        return True
+
+
+def _iter_records(buf: Any, start: int, end: int) -> Iterator[tuple]:
+    """Yield (offset, ts, event_type, source, body_start, body_end) without decoding bodies."""
+    offset = start
+    while offset + _HEADER.size <= end:
+        body_len, ts, type_len, source_len = _HEADER.unpack_from(buf, offset)
+        type_start = offset + _HEADER.size
+        source_start = type_start + type_len
+        body_start = source_start + source_len
+        body_end = body_start + body_len
+        if body_end > end:
+            break  # torn tail write
+        event_type = bytes(buf[type_start:source_start]).decode("utf-8")
+        source = bytes(buf[source_start:body_start]).decode("utf-8")
+        yield offset, ts, event_type, source, body_start, body_end
+        offset = body_end
+
+
+class TraceLog:
+    """Durable, queryable event log (see module docstring for the format)."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        index_interval: int = 256,
+        fsync_every: int = 256,
+        fsync_interval: float = 1.0,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = max(1, index_interval)
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._active: Optional[_Segment] = None
+        self._fh = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._last_segment_us = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_segments()
+
+    # --- opening / rolling ---------------------------------------------------
+
+    def _load_segments(self) -> None:
+        known = {segment.path for segment in self._segments}
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(_SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if path in known:
+                continue
+            segment = _Segment(path)
+            if not segment.load_index():
+                self._scan(segment)
+                segment.save_index()
+            self._segments.append(segment)
+        self._segments.sort(key=lambda segment: os.path.basename(segment.path))
+
+    def _scan(self, segment: _Segment) -> None:
+        """Index the records written to ``segment`` past ``segment.size`` (all of them for a new one)."""
+        size = os.path.getsize(segment.path)
+        if size <= segment.size:
+            return
+        with open(segment.path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for offset, ts, event_type, source, _, body_end in _iter_records(buf, segment.size, size):
+                segment.note(ts, event_type, source, offset, self.index_interval)
+                segment.size = body_end
+
+    def _refresh(self) -> None:
+        """Pick up segments other processes created in the directory, and records they appended since."""
+        self._load_segments()
+        for segment in self._segments:
+            if segment is not self._active:
+                self._scan(segment)
+
+    def _open_active(self, ts: float) -> None:
+        # Names sort by first timestamp; bump by 1µs so fast rolls never collide.
+        self._last_segment_us = max(int(ts * 1_000_000), self._last_segment_us + 1)
+        name = "%020d-%d%s" % (self._last_segment_us, os.getpid(), _SEGMENT_SUFFIX)
+        segment = _Segment(os.path.join(self.directory, name))
+        self._fh = open(segment.path, "ab")
+        self._active = segment
+        self._segments.append(segment)
+
+    def _seal_active(self) -> None:
+        if self._active is None:
+            return
+        self._sync()
+        self._fh.close()
+        self._active.save_index()
+        self._fh = None
+        self._active = None
+
+    def _sync(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # --- writing -------------------------------------------------------------
+
+    def append(self, event_type: str, payload: Dict[str, Any], ts: Optional[float] = None, source: str = "") -> None:
+        """Write one record; without ``ts`` it is stamped under the lock, so appends stay in time order."""
+        body = json.dumps(to_jsonable(payload), separators=(",", ":")).encode("utf-8")
+        type_bytes = event_type.encode("utf-8")
+        source_bytes = source.encode("utf-8")
+        with self._lock:
+            ts = time.time() if ts is None else ts
+            record = _HEADER.pack(len(body), ts, len(type_bytes), len(source_bytes)) + type_bytes + source_bytes + body
+            if self._active is None or (self._active.count and self._active.size + len(record) > self.segment_bytes):
+                self._seal_active()
+                self._open_active(ts)
+            self._fh.write(record)
+            self._active.note(ts, event_type, source, self._active.size, self.index_interval)
+            self._active.size += len(record)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal_active()
+
+    # --- reading -------------------------------------------------------------
+
+    def query(
+        self,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        event_type: Optional[str] = None,
+        limit: Optional[int] = None,
+        source: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield events in [start_ts, end_ts] (optionally of one type and from one ``source``),
+        oldest segment first. Without ``source`` every writer's events are returned.
+        """
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+            self._refresh()
+            segments = [(s, s.size, list(s.index)) for s in self._segments]
+
+        produced = 0
+        for segment, size, index in segments:
+            if not segment.overlaps(start_ts, end_ts):
+                continue
+            if event_type is not None and event_type not in segment.event_types:
+                continue
+            if source is not None and source not in segment.sources:
+                continue
+            start = 0
+            if start_ts is not None and index:
+                # Last index point with every earlier record strictly before start_ts.
+                pos = bisect.bisect_left([entry[0] for entry in index], start_ts) - 1
+                start = int(index[pos][1]) if pos >= 0 else 0
+            with open(segment.path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for _, ts, record_type, record_source, body_start, body_end in _iter_records(buf, start, size):
+                    if start_ts is not None and ts < start_ts:
+                        continue
+                    if end_ts is not None and ts > end_ts:
+                        continue
+                    if event_type is not None and record_type != event_type:
+                        continue
+                    if source is not None and record_source != source:
+                        continue
+                    yield {
+                        "event": record_type,
+                        "payload": json.loads(bytes(buf[body_start:body_end])),
+                        "timestamp": datetime.utcfromtimestamp(ts).isoformat() + "Z",
+                        "source": record_source,
+                    }
+                    produced += 1
+                    if limit is not None and produced >= limit:
+                        return
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        return self.query()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "events": sum(s.count for s in self._segments),
+                "bytes": sum(s.size for s in self._segments),
+            }
+
+
+_shared_log: Optional[TraceLog] = None
+_shared_lock = threading.Lock()
+
+
+def get_trace_log() -> Optional[TraceLog]:
+    """Process-wide TraceLog in TRACE_LOG_DIR, or None when persistence is not configured."""
+    global _shared_log
+    directory = os.getenv("TRACE_LOG_DIR")
+    if not directory:
+        return None
+    if _shared_log is None:
+        with _shared_lock:
+            if _shared_log is None:
+                _shared_log = TraceLog(
+                    directory,
+                    segment_bytes=int(os.getenv("TRACE_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+                    fsync_every=int(os.getenv("TRACE_LOG_FSYNC_EVERY", "256")),
+                )
+    return _shared_log
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Query a persisted CIFR trace log.")
+    parser.add_argument("directory", help="TRACE_LOG_DIR to read")
+    parser.add_argument("--event", help="Only this event type")
+    parser.add_argument("--source", help="Only events written by this MemoryStore store_id")
+    parser.add_argument("--since", type=float, help="Start time (epoch seconds)")
+    parser.add_argument("--until", type=float, help="End time (epoch seconds)")
+    parser.add_argument("--limit", type=int, help="Maximum events to print")
+    args = parser.parse_args(argv)
+
+    log = TraceLog(args.directory)
+    for event in log.query(args.since, args.until, args.event, args.limit, args.source):
+        print(json.dumps(event))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
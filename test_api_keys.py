@@ -15,6 +15,7 @@ except:
 # Import config
 sys.path.insert(0, os.path.dirname(__file__))
 from cifr_agent_system.config import Config
+from src.clients import get_registry
 
 def test_api_key(key_name, api_key, model="gemini-2.0-flash"):
     """Test a single API key"""
@@ -22,7 +23,9 @@ def test_api_key(key_name, api_key, model="gemini-2.0-flash"):
         return {"status": "not_set", "key_name": key_name}
     
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_registry().get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key)
         response = client.models.generate_content(
             model=model,
             contents=[{"parts": [{"text": "Hello, this is a test."}]}]
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+import asgi  # noqa: E402
+
+
+async def _unused_fallback(scope, receive, send):
+    raise AssertionError("request should not reach the Flask app")
+
+
+def _scope(path="/api/process_message"):
+    return {"type": "http", "method": "POST", "path": path, "headers": [], "query_string": b""}
+
+
+def _status(sent):
+    return next(m["status"] for m in sent if m["type"] == "http.response.start")
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Replaces the agent pipeline with ``pipeline.stages`` (a generator factory) and records cleanup."""
+
+    class Pipeline:
+        calls = 0
+        released = []
+
+        @staticmethod
+        def stages():
+            yield "communication_analysis", {"ok": True}
+
+    def coalesced(sample_message, deadline=None):
+        Pipeline.calls += 1
+        return Pipeline.stages(), False
+
+    monkeypatch.setattr(asgi, "_build_sample_message", lambda scope, body: {"message_id": "m1", "text_content": body.decode()})
+    monkeypatch.setattr(asgi.flask_module, "_coalesced_pipeline", coalesced)
+    monkeypatch.setattr(asgi.flask_module, "_release_sample_message", Pipeline.released.append)
+    return Pipeline
+
+
+def test_full_slots_return_503_with_retry_after(monkeypatch, pipeline):
+    monkeypatch.setattr(asgi, "QUEUE_TIMEOUT_SECONDS", 0.05)
+    sent = []
+
+    async def run():
+        app = asgi.PipelineApp(_unused_fallback)
+        app._slots = asyncio.Semaphore(0)
+
+        async def receive():
+            return {"type": "http.request", "body": b"hello", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(_scope(), receive, send)
+
+    asyncio.run(run())
+    start = sent[0]
+    assert start["status"] == 503
+    assert (b"retry-after", b"1") in start["headers"]
+    assert pipeline.calls == 0
+
+
+def test_oversized_body_returns_413_while_reading(monkeypatch, pipeline):
+    monkeypatch.setattr(asgi, "MAX_BODY_BYTES", 10)
+    chunks = [{"type": "http.request", "body": b"x" * 6, "more_body": True} for _ in range(3)]
+    sent = []
+
+    async def run():
+        app = asgi.PipelineApp(_unused_fallback)
+
+        async def receive():
+            return chunks.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await app(_scope(), receive, send)
+
+    asyncio.run(run())
+    assert _status(sent) == 413
+    assert len(chunks) == 1  # rejected once the limit was crossed, not after the whole body
+    assert pipeline.calls == 0
+
+
+def test_completed_request_returns_the_stages(pipeline):
+    sent = []
+
+    async def run():
+        app = asgi.PipelineApp(_unused_fallback)
+        messages = [{"type": "http.request", "body": b"hello", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()  # the client never disconnects
+
+        async def send(message):
+            sent.append(message)
+
+        await app(_scope(), receive, send)
+        return app
+
+    app = asyncio.run(run())
+    assert _status(sent) == 200
+    assert b'"communication_analysis": {"ok": true}' in sent[-1]["body"]
+    assert not app.slots.locked()
+    assert pipeline.released == [{"message_id": "m1", "text_content": "hello"}]
+
+
+def test_disconnect_holds_the_slot_until_the_running_stage_is_cleaned_up(monkeypatch, pipeline):
+    monkeypatch.setattr(asgi, "MAX_CONCURRENCY", 1)
+    stage_started = threading.Event()
+    finish_stage = threading.Event()
+    closed = threading.Event()
+
+    def stages():
+        try:
+            yield "communication_analysis", {"ok": True}
+            stage_started.set()
+            finish_stage.wait(5)
+            yield "friction_detection", {"friction_detected": False}
+            yield "intervention_suggestion", {}
+        finally:
+            closed.set()
+
+    pipeline.stages = staticmethod(stages)
+    sent = []
+
+    async def run():
+        app = asgi.PipelineApp(_unused_fallback)
+        loop = asyncio.get_running_loop()
+        disconnect = asyncio.Event()
+        messages = [{"type": "http.request", "body": b"hello", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        request = asyncio.ensure_future(app(_scope("/api/process_message/stream"), receive, send))
+        await loop.run_in_executor(None, stage_started.wait, 5)
+        disconnect.set()
+        await asyncio.wait_for(request, 5)
+
+        # The handler has returned, but the friction stage is still running on its thread.
+        assert app.slots.locked()
+        assert not closed.is_set()
+        assert pipeline.released == []
+
+        finish_stage.set()
+        for _ in range(500):
+            if not app.slots.locked():
+                break
+            await asyncio.sleep(0.01)
+        assert not app.slots.locked()
+
+    asyncio.run(run())
+    assert closed.is_set()
+    assert pipeline.released == [{"message_id": "m1", "text_content": "hello"}]
+    events = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    assert b"event: communication_analysis" in events
+    assert b"event: friction_detection" not in events
@@ -0,0 +1,32 @@
+from src.batch import _group_results, clamp_workers, parse_jsonl
+
+
+def test_results_are_grouped_by_position_even_with_repeated_ids():
+    messages = [{"message_id": "dup"}, {"message_id": "dup"}]
+    results = [
+        {"step": 1, "message_id": "dup", "type": "analysis", "result": "first"},
+        {"step": 1, "message_id": "dup", "type": "analysis", "result": "second"},
+        {"step": 2, "type": "skipped", "reason": "unknown action"},
+        {"step": 3, "message_id": "dup", "type": "error", "error": "boom"},
+        {"step": 3, "message_id": "dup", "type": "friction", "result": {"ok": True}},
+    ]
+    first, second = _group_results(messages, results)
+    assert first == {"message_id": "dup", "results": {"analysis": "first"}, "errors": [{"step": 3, "error": "boom"}]}
+    assert second == {"message_id": "dup", "results": {"analysis": "second", "friction": {"ok": True}}, "errors": []}
+
+
+def test_parse_jsonl_reports_bad_lines_in_order():
+    lines = ['{"request_id": "r1", "title": "T", "body": "B"}', "", "not json", "[1]", '{"text": "hi"}']
+    records = list(parse_jsonl(lines))
+    assert records[0]["message_id"] == "r1" and records[0]["text_content"] == "T\n\nB"
+    assert records[1] == {"line": 3, "error": records[1]["error"]} and "invalid JSON" in records[1]["error"]
+    assert records[2] == {"line": 4, "error": "expected a JSON object"}
+    assert records[3]["message_id"].startswith("batch_message_1_")
+
+
+def test_requested_workers_are_clamped(monkeypatch):
+    monkeypatch.setenv("BATCH_MAX_WORKERS", "8")
+    assert clamp_workers(None) == 4
+    assert clamp_workers(100000) == 8
+    assert clamp_workers(-3) == 1
+    assert clamp_workers(6) == 6
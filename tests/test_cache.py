@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+from src import cache as cache_module
+from src import llm, metrics
+from src.cache import ResponseCache
+from src.shared_store import SharedStore
+
+
+def test_memory_tier_is_lru_with_ttl():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("short", "x", ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_make_key_depends_on_model_prompt_and_image():
+    base = ResponseCache.make_key("m", "p")
+    assert base == ResponseCache.make_key("m", "p")
+    assert base != ResponseCache.make_key("m2", "p")
+    assert base != ResponseCache.make_key("m", "p2")
+    assert base != ResponseCache.make_key("m", "p", b"img")
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    ResponseCache(disk_dir=str(tmp_path)).set("k", {"text": "hi"})
+    fresh = ResponseCache(disk_dir=str(tmp_path))
+    assert fresh.get("k") == {"text": "hi"}
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_disk_writes_scan_the_directory_only_when_over_budget(tmp_path, monkeypatch):
+    cache = ResponseCache(max_entries=0, disk_dir=str(tmp_path), max_disk_entries=10)
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(cache_module.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+
+    for i in range(10):
+        cache.set(f"k{i}", i)
+    assert scans == []
+
+    cache.set("k10", 10)
+    assert len(scans) == 1
+    assert cache.stats()["disk_entries"] == len(os.listdir(tmp_path)) == 9
+
+
+def test_rewriting_a_key_does_not_count_twice(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    for _ in range(3):
+        cache.set("same", "value")
+    assert cache.stats()["disk_entries"] == 1
+
+
+def test_disk_byte_budget(tmp_path):
+    cache = ResponseCache(max_entries=0, disk_dir=str(tmp_path), max_disk_bytes=2000)
+    for i in range(30):
+        cache.set(f"k{i}", "x" * 100)
+    on_disk = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+    assert on_disk <= 2000
+    assert cache.stats()["disk_bytes"] == on_disk
+    assert cache.get("k29") == "x" * 100
+
+
+def test_shared_tier_serves_other_instances(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    ResponseCache(shared=store).set("k", {"text": "hi"})
+    other = ResponseCache(shared=store)
+    assert other.get("k") == {"text": "hi"}
+    assert other.stats()["shared_hits"] == 1
+
+
+
+def test_promoted_entries_keep_their_stored_expiry(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    ResponseCache(shared=store).set("shared", "s", ttl_seconds=0.05)
+    ResponseCache(disk_dir=str(tmp_path / "disk")).set("disk", "d", ttl_seconds=0.05)
+    other = ResponseCache(ttl_seconds=3600, shared=store, disk_dir=str(tmp_path / "disk"))
+    assert other.get("shared") == "s"
+    assert other.get("disk") == "d"
+
+    time.sleep(0.06)
+    assert other.get("shared") is None
+    assert other.get("disk") is None
+
+class _Router:
+    def __init__(self, source):
+        self.source = source
+        self.calls = 0
+
+    def available(self):
+        return True
+
+    def call(self, model, prompt, image_bytes=None, mime_type="image/png"):
+        self.calls += 1
+        return {"text": "answer", "api_source": self.source}
+
+
+def _complete_twice(monkeypatch, source):
+    router = _Router(source)
+    local = ResponseCache()
+    monkeypatch.setattr(llm, "get_router", lambda: router)
+    monkeypatch.setattr(llm, "get_response_cache", lambda: local)
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "1")
+    monkeypatch.setenv("LLM_MICROBATCH_ENABLED", "0")
+    for _ in range(2):
+        assert llm.complete("m", "prompt")["api_source"] == source
+    return router.calls
+
+
+def test_gemini_answers_are_cached(monkeypatch):
+    assert _complete_twice(monkeypatch, "gemini") == 1
+
+
+def test_fallback_answers_are_not_cached(monkeypatch):
+    assert _complete_twice(monkeypatch, "fallback") == 2
+
+
+def test_fallback_activations_count_only_answers(monkeypatch):
+    def fail(prompt, image_bytes, mime_type):
+        raise RuntimeError("fallback down")
+
+    before = metrics.FALLBACK_ACTIVATIONS.value()
+    monkeypatch.setattr(llm, "fallback_generate_text", fail)
+    with pytest.raises(RuntimeError):
+        llm._fallback_call("m", "prompt", None, "image/png")
+    assert metrics.FALLBACK_ACTIVATIONS.value() == before
+
+    monkeypatch.setattr(llm, "fallback_generate_text", lambda prompt, image_bytes, mime_type: "ok")
+    assert llm._fallback_call("m", "prompt", None, "image/png") == "ok"
+    assert metrics.FALLBACK_ACTIVATIONS.value() == before + 1
@@ -0,0 +1,38 @@
+from src.clients import ClientRegistry
+
+
+class _Client:
+    class models:
+        @staticmethod
+        def get(model):
+            return {"name": model}
+
+
+def _registry(built):
+    def factory(api_key):
+        built.append(api_key)
+        return _Client()
+    return ClientRegistry(factory)
+
+
+def test_shallow_health_check_builds_no_clients(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-default")
+    monkeypatch.delenv("GOOGLE_API_KEY_CA", raising=False)
+    built = []
+    registry = _registry(built)
+
+    report = registry.health_check()
+
+    assert built == []
+    assert report["default"] == {"status": "configured"}
+    assert report["ca"] == {"status": "not_set"}
+    registry.for_role("default")
+    assert registry.health_check()["default"] == {"status": "ready"}
+
+
+def test_deep_health_check_exercises_each_key(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-default")
+    built = []
+    report = _registry(built).health_check(deep=True)
+    assert built == ["key-default"]
+    assert report["default"]["status"] == "working"
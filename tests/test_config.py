@@ -0,0 +1,24 @@
+import os
+
+from cifr_agent_system.config import load_environment
+
+
+def test_explicit_dotenv_path_is_loaded_after_bootstrap(tmp_path, monkeypatch):
+    monkeypatch.delenv("CIFR_TEST_DOTENV_VALUE", raising=False)
+    dotenv = tmp_path / ".env"
+    dotenv.write_text("CIFR_TEST_DOTENV_VALUE=from-explicit-file\n")
+
+    # Importing config already bootstrapped the process; an explicit file still loads.
+    load_environment(str(dotenv))
+
+    assert os.environ["CIFR_TEST_DOTENV_VALUE"] == "from-explicit-file"
+    monkeypatch.delenv("CIFR_TEST_DOTENV_VALUE")
+
+
+def test_dotenv_does_not_override_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("CIFR_TEST_DOTENV_VALUE", "from-env")
+    dotenv = tmp_path / ".env"
+    dotenv.write_text("CIFR_TEST_DOTENV_VALUE=from-file\n")
+    load_environment(str(dotenv))
+
+    assert os.environ["CIFR_TEST_DOTENV_VALUE"] == "from-env"
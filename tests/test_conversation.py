@@ -0,0 +1,65 @@
+from src.conversation import ConversationTracker
+from src.shared_store import SharedStore
+
+
+def _message(text, sender="alice", thread_id="t1"):
+    return {"text_content": text, "sender": sender, "thread_id": thread_id}
+
+
+def _analysis(score):
+    return {"sentiment": {"score": score}, "entities": []}
+
+
+def test_single_negative_message_escalates():
+    tracker = ConversationTracker(threshold=0.5)
+    signals = tracker.update(_message("this is broken"), _analysis(-0.6))
+    assert signals["score"] < 0.5
+    assert signals["escalate"] is True
+
+
+def test_negative_streak_escalates_every_message():
+    tracker = ConversationTracker(threshold=0.5)
+    first = tracker.update(_message("still blocked"), _analysis(-0.6))
+    second = tracker.update(_message("why is this still broken", sender="bob"), _analysis(-0.7))
+    assert first["escalate"] and second["escalate"]
+
+
+def test_neutral_thread_stays_below_the_gate():
+    tracker = ConversationTracker(threshold=0.5)
+    for text in ("deploy at 3", "sounds good", "done, thanks"):
+        signals = tracker.update(_message(text), _analysis(0.2))
+    assert signals["escalate"] is False
+    assert signals["messages"] == 3
+
+
+def test_mildly_negative_message_in_a_calm_thread_does_not_escalate():
+    tracker = ConversationTracker(threshold=0.5)
+    for _ in range(5):
+        tracker.update(_message("ok"), _analysis(0.3))
+    assert tracker.update(_message("a bit late"), _analysis(-0.3))["escalate"] is False
+
+
+def test_messages_without_a_thread_are_not_pooled():
+    tracker = ConversationTracker(threshold=0.5)
+    for sender in ("web-1", "web-2", "web-3"):
+        signals = tracker.update(_message("why?", sender=sender, thread_id=None), _analysis(-0.4))
+        assert signals["messages"] == 1
+        assert signals["unanswered_questions"] == 1
+        assert signals["escalate"] is True
+    assert len(tracker) == 0
+
+
+def test_threads_are_independent():
+    tracker = ConversationTracker(threshold=0.5)
+    tracker.update(_message("frustrated", thread_id="a"), _analysis(-0.9))
+    signals = tracker.update(_message("fine", thread_id="b"), _analysis(0.5))
+    assert signals["messages"] == 1
+    assert signals["escalate"] is False
+
+
+def test_shared_state_continues_across_trackers(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    ConversationTracker(shared=store).update(_message("first"), _analysis(0.1))
+    signals = ConversationTracker(shared=store).update(_message("second", sender="bob"), _analysis(0.1))
+    assert signals["messages"] == 2
+    assert ConversationTracker(shared=store).get("t1")["messages"] == 2
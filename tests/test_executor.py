@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from src import metrics
+from src.conversation import ConversationTracker
+from src.executor import Executor
+from src.memory import MemoryStore
+
+PLAN = {
+    "steps": [
+        {"id": 1, "action": "analyze_messages"},
+        {"id": 2, "action": "detect_friction"},
+        {"id": 3, "action": "generate_interventions"},
+    ]
+}
+
+
+class _Knowledge:
+    def __init__(self):
+        self.contexts = {}
+
+    def retrieve_context(self, key):
+        return self.contexts.get(key)
+
+
+class _Communication:
+    def process_collaboration_message(self, message):
+        return {"length": len(message["text_content"])}
+
+
+class _Friction:
+    def detect_misalignment(self, stored):
+        return {"friction_detected": True, "reason": "llm"}
+
+
+class _Intervention:
+    def __init__(self):
+        self.calls = 0
+
+    def suggest_clarification(self, data):
+        self.calls += 1
+        return {"intervention_suggested": True, "suggestion": "talk it through"}
+
+
+def _executor(monkeypatch, **kwargs):
+    monkeypatch.setenv("KNOWLEDGE_STORE_ENABLED", "0")
+    intervention = _Intervention()
+    executor = Executor(
+        _Communication(),
+        _Friction(),
+        intervention,
+        _Knowledge(),
+        memory_store=MemoryStore(capacity=100),
+        conversation_tracker=ConversationTracker(),
+        **kwargs,
+    )
+    return executor, intervention
+
+
+def _messages(message_id):
+    # A hostile message followed by a benign one that the pre-filter decides locally.
+    return [
+        {"message_id": message_id, "text_content": "This is late again and totally unacceptable.", "sender": "a"},
+        {"message_id": message_id, "text_content": "Thanks so much, great work!", "sender": "b"},
+    ]
+
+
+@pytest.mark.parametrize("message_id", [None, "same"])
+@pytest.mark.parametrize("options", [{}, {"max_workers": 4}, {"max_workers": 4, "pipeline": True}])
+def test_local_decisions_follow_the_message_not_its_id(monkeypatch, message_id, options):
+    executor, intervention = _executor(monkeypatch, **options)
+    results = executor.run_plan(PLAN, _messages(message_id))
+
+    interventions = [r["result"] for r in results if r["type"] == "intervention"]
+    assert interventions[0]["intervention_suggested"] is True
+    assert interventions[1]["decided_by"] == "prefilter"
+    assert intervention.calls == 1
+    assert executor._local_decisions == {}
+
+
+def test_decisions_do_not_outlive_the_run(monkeypatch):
+    executor, intervention = _executor(monkeypatch)
+    plan = {"steps": PLAN["steps"][:2]}  # no intervention step consumes the decision
+    executor.run_plan(plan, _messages("m"))
+    assert executor._local_decisions == {}
+
+
+class _SlowKnowledge(_Knowledge):
+    def retrieve_context(self, key):
+        time.sleep(0.005 * (6 - int(key[-1])))  # later messages are looked up faster
+        return super().retrieve_context(key)
+
+
+class _EchoFriction:
+    def detect_misalignment(self, stored):
+        return {"friction_detected": True, "conversation_signals": stored["conversation_signals"]}
+
+
+@pytest.mark.parametrize("options", [{"max_workers": 6}, {"max_workers": 6, "pipeline": True}])
+def test_parallel_runs_fold_conversations_in_message_order(monkeypatch, options):
+    texts = [
+        "Can we ship the parser today?",
+        "No, the build is broken and nobody fixed it.",
+        "This delay is frustrating, we keep missing the deadline.",
+        "I pushed a fix for the build an hour ago.",
+        "Still failing on my machine, this is a waste of time.",
+        "Let's pair on it after lunch and sort it out together.",
+    ]
+    messages = [{"message_id": f"m{i}", "thread_id": "t", "sender": "ab"[i % 2], "text_content": t} for i, t in enumerate(texts)]
+    monkeypatch.setenv("KNOWLEDGE_STORE_ENABLED", "0")
+
+    def decisions(**kwargs):
+        executor = Executor(
+            _Communication(),
+            _EchoFriction(),
+            _Intervention(),
+            _SlowKnowledge(),
+            memory_store=MemoryStore(capacity=100),
+            conversation_tracker=ConversationTracker(),
+            **kwargs,
+        )
+        return [r["result"] for r in executor.run_plan(PLAN, [dict(m) for m in messages]) if r["type"] == "friction"]
+
+    assert decisions(**options) == decisions()
+
+
+def test_stage_latency_uses_the_web_pipeline_labels(monkeypatch):
+    executor, _ = _executor(monkeypatch)
+    executor.run_plan(PLAN, _messages("m"))
+    stages = {labels["stage"] for name, labels, _ in metrics.STAGE_SECONDS.samples() if name.endswith("_count")}
+    assert {"communication", "friction", "intervention"} <= stages
+    assert not stages & {"analyze", "detect_friction", "generate_intervention"}
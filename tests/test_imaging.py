@@ -0,0 +1,102 @@
+import io
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image, ImageDraw  # noqa: E402
+from PIL.PngImagePlugin import PngInfo  # noqa: E402
+
+from src import imaging  # noqa: E402
+
+
+def _chat_screenshot(lines, size=(1280, 800)):
+    """Same bubble layout every time; only the text differs."""
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for x in range(260, size[0]):  # shaded message pane
+        shade = 250 - (x - 260) * 40 // (size[0] - 260)
+        draw.line((x, 56, x, size[1]), fill=(shade, shade, shade))
+    draw.rectangle((0, 0, 260, size[1]), fill=(40, 44, 52))  # channel sidebar
+    draw.rectangle((260, 0, size[0], 56), fill=(230, 230, 230))  # header bar
+    for i, line in enumerate(lines):
+        top = 90 + i * 140
+        left = 300 if i % 2 == 0 else 700
+        fill = (225, 235, 250) if i % 2 == 0 else (60, 120, 220)
+        draw.rounded_rectangle((left, top, left + 520, top + 100), radius=20, fill=fill)
+        draw.text((left + 30, top + 40), line, fill=(20, 20, 20))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _preprocessor(**kwargs):
+    return imaging.ImagePreprocessor(workers=0, **kwargs)
+
+
+def test_same_layout_different_text_is_not_identical():
+    first = _chat_screenshot(["can we ship friday?", "I think so", "ok", "see you"])
+    second = _chat_screenshot(["you broke prod!!!!", "I think so", "ok", "see you"])
+    preprocessor = _preprocessor()
+
+    first_bytes, first_info = preprocessor.process(first)
+    second_bytes, second_info = preprocessor.process(second)
+
+    assert second_info["identical"] is False
+    assert second_bytes != first_bytes
+
+
+def test_small_text_edit_is_not_identical():
+    preprocessor = _preprocessor()
+    preprocessor.process(_chat_screenshot(["version 1.0"]))
+    _, info = preprocessor.process(_chat_screenshot(["version 1,0"]))
+    assert info["identical"] is False
+
+
+def test_resaved_copy_is_identical():
+    original = _chat_screenshot(["can we ship friday?", "sure", "thanks"])
+    metadata = PngInfo()
+    metadata.add_text("Software", "Screenshot Tool")
+    with Image.open(io.BytesIO(original)) as image:
+        out = io.BytesIO()
+        image.save(out, format="PNG", pnginfo=metadata, compress_level=1)
+    resaved = out.getvalue()
+    assert resaved != original
+    preprocessor = _preprocessor()
+
+    first_bytes, _ = preprocessor.process(original)
+    second_bytes, info = preprocessor.process(resaved)
+
+    assert info["identical"] is True
+    # Re-encoding is deterministic, so the copy shares the original's image hash.
+    assert second_bytes == first_bytes
+
+
+def test_preprocess_strips_metadata_and_downscales():
+    image = Image.new("RGB", (4000, 3000), (10, 200, 30))
+    exif = Image.Exif()
+    exif[0x010F] = "CameraMaker"
+    out = io.BytesIO()
+    image.save(out, format="JPEG", exif=exif)
+
+    result = imaging.preprocess(out.getvalue(), max_pixels=1_000_000)
+
+    assert result["width"] * result["height"] <= 1_000_000
+    assert (result["original_width"], result["original_height"]) == (4000, 3000)
+    with Image.open(io.BytesIO(result["data"])) as processed:
+        assert not processed.getexif()
+    assert len(result["pixel_sha256"]) == 64
+
+
+def test_undecodable_upload_passes_through():
+    data, info = _preprocessor().process(b"not an image")
+    assert data == b"not an image"
+    assert info is None
+
+
+def test_recent_pixels_are_bounded():
+    recent = imaging.RecentPixels(max_entries=1)
+    assert recent.seen("a") is False
+    assert recent.seen("b") is False
+    assert len(recent) == 1
+    assert recent.seen("b") is True
+    assert recent.seen("a") is False
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from src.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+
+def _queue(tmp_path, handler, **kwargs):
+    kwargs.setdefault("poll_interval", 0.02)
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), handler, **kwargs)
+
+
+def test_job_runs_and_stores_its_result(tmp_path):
+    queue = _queue(tmp_path, lambda payload, image: {"echo": payload["text"], "image": len(image or b"")})
+    try:
+        job_id, created = queue.submit({"text": "hi"}, image=b"png")
+        job = queue.wait(job_id, timeout=5)
+    finally:
+        queue.stop(timeout=5)
+    assert created
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"echo": "hi", "image": 3}
+    assert job["expires_at"] > time.time()
+
+
+def test_idempotency_key_returns_the_same_job(tmp_path):
+    queue = _queue(tmp_path, lambda payload, image: None)
+    try:
+        first, created = queue.submit({"n": 1}, idempotency_key="k")
+        second, created_again = queue.submit({"n": 2}, idempotency_key="k")
+    finally:
+        queue.stop(timeout=5)
+    assert first == second
+    assert created and not created_again
+
+
+def test_failing_job_is_retried_then_failed(tmp_path):
+    attempts = []
+
+    def handler(payload, image):
+        attempts.append(1)
+        raise RuntimeError("nope")
+
+    queue = _queue(tmp_path, handler, max_attempts=3)
+    try:
+        job_id, _ = queue.submit({})
+        deadline = time.monotonic() + 5
+        while queue.get(job_id)["status"] != FAILED and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        queue.stop(timeout=5)
+    job = queue.get(job_id)
+    assert job["status"] == FAILED and job["attempts"] == 3
+    assert len(attempts) == 3
+
+
+def test_unserializable_result_fails_the_job_and_keeps_the_worker(tmp_path):
+    results = iter([object(), {"ok": True}])
+    queue = _queue(tmp_path, lambda payload, image: next(results), workers=1)
+    try:
+        bad, _ = queue.submit({"n": 1})
+        assert queue.wait(bad, timeout=5)["status"] == FAILED
+        good, _ = queue.submit({"n": 2})
+        assert queue.wait(good, timeout=5)["result"] == {"ok": True}
+    finally:
+        queue.stop(timeout=5)
+    assert "not JSON serializable" in queue.get(bad)["error"]
+
+
+def test_lapsed_lease_on_the_last_attempt_fails_the_job(tmp_path):
+    queue = _queue(tmp_path, lambda payload, image: "ran", max_attempts=2, lease_seconds=60)
+    job_id, _ = queue.submit({})
+    queue.stop(timeout=5)
+    # A worker that died on its last attempt left the job running long ago.
+    queue._conn().execute(
+        "UPDATE jobs SET status = ?, attempts = 2, updated_at = ? WHERE id = ?", (RUNNING, time.time() - 120, job_id)
+    )
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert "lease expired" in job["error"]
+
+
+def test_lapsed_lease_with_attempts_left_is_requeued(tmp_path):
+    queue = _queue(tmp_path, lambda payload, image: "ran", max_attempts=3, lease_seconds=60)
+    job_id, _ = queue.submit({})
+    queue.stop(timeout=5)
+    queue._conn().execute(
+        "UPDATE jobs SET status = ?, attempts = 1, updated_at = ? WHERE id = ?", (RUNNING, time.time() - 120, job_id)
+    )
+    row = queue._claim()
+    assert row["id"] == job_id and row["attempts"] == 1
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_heartbeat_keeps_a_long_job_from_running_twice(tmp_path):
+    runs = []
+    release = threading.Event()
+
+    def handler(payload, image):
+        runs.append(threading.current_thread().name)
+        release.wait(5)
+        return "done"
+
+    queue = _queue(tmp_path, handler, workers=2, lease_seconds=0.3)
+    try:
+        job_id, _ = queue.submit({})
+        time.sleep(1.0)  # several lease periods
+        assert queue.stats().get(QUEUED, 0) == 0
+        release.set()
+        assert queue.wait(job_id, timeout=5)["status"] == SUCCEEDED
+    finally:
+        queue.stop(timeout=5)
+    assert len(runs) == 1
+
+
+def test_jobs_left_queued_by_a_previous_process_run_on_reopen(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.sqlite3")
+    previous = JobQueue(path, lambda payload, image: None)  # never started: the process died
+    previous._conn().execute(
+        "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        ("left-over", QUEUED, '{"text": "hi"}', time.time(), time.time()),
+    )
+
+    monkeypatch.setenv("JOBS_DB_PATH", path)
+    queue = JobQueue.from_env(lambda payload, image: payload["text"])
+    try:
+        job = queue.wait("left-over", timeout=5)
+    finally:
+        queue.stop(timeout=5)
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == "hi"
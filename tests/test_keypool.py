@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from src import request_context
+from src.clients import ClientRegistry
+from src.keypool import KeyPool, QuotaExhaustedError, TokenBucket, retry_after_seconds
+from src.request_context import DeadlineExceeded
+
+
+def _pool(keys, **kwargs):
+    # The "client" for a key is the key itself, so fn(client) reports which key served the call.
+    return KeyPool(keys, registry=ClientRegistry(lambda api_key: api_key), **kwargs)
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=100.0, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.wait_time() <= 0.01
+    time.sleep(0.02)
+    assert bucket.try_acquire()
+
+
+def test_roles_sharing_a_key_share_its_bucket():
+    pool = _pool({"default": "k1", "ca": "k1", "fa": "k2"})
+    assert len(pool) == 2
+    assert pool.status()[0]["roles"] == ["default", "ca"]
+
+
+def test_quota_error_rotates_to_the_next_key_and_cools_the_first_down():
+    pool = _pool({"a": "k1", "b": "k2"})
+
+    def fn(client):
+        if client == "k1":
+            raise RuntimeError("429 RESOURCE_EXHAUSTED, retry in 30s")
+        return client
+
+    assert pool.call(fn) == "k2"
+    status = {s["roles"][0]: s for s in pool.status()}
+    assert status["a"]["quota_errors"] == 1
+    assert 29 < status["a"]["cooldown_remaining"] <= 30
+    assert status["b"]["calls"] == 1
+
+
+def test_every_key_exhausted_raises_quota_exhausted():
+    pool = _pool({"a": "k1", "b": "k2"})
+
+    def fn(client):
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(QuotaExhaustedError):
+        pool.call(fn)
+
+
+def test_other_errors_propagate_without_cooldown():
+    pool = _pool({"a": "k1"})
+
+    def fn(client):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        pool.call(fn)
+    assert pool.status()[0]["cooldown_remaining"] == 0
+
+
+def test_waits_are_bounded_by_max_wait_and_the_request_deadline():
+    pool = _pool({"a": "k1"}, rpm=60, burst=1, max_wait_seconds=0.1)
+    assert pool.call(lambda client: client) == "k1"
+    with pytest.raises(QuotaExhaustedError):
+        pool.call(lambda client: client)  # next token in ~1s
+
+    patient = _pool({"a": "k1"}, rpm=60, burst=1, max_wait_seconds=10)
+    patient.call(lambda client: client)
+    with request_context.deadline_at(time.time() + 0.1):
+        with pytest.raises(DeadlineExceeded):
+            patient.call(lambda client: client)
+
+
+def test_short_wait_for_a_token_succeeds():
+    pool = _pool({"a": "k1"}, rpm=600, burst=1, max_wait_seconds=1)
+    pool.call(lambda client: client)
+    assert pool.call(lambda client: client) == "k1"
+
+
+def test_retry_delay_parsing():
+    assert retry_after_seconds(RuntimeError("Please retry in 12.5s")) == 12.5
+    assert retry_after_seconds(RuntimeError("{'retryDelay': '7s'}")) == 7.0
+    assert retry_after_seconds(RuntimeError("429")) is None
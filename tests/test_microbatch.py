@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from src import request_context
+from src.microbatch import MicroBatcher, pack_prompts, split_response
+from src.request_context import DeadlineExceeded
+
+
+def _run_concurrently(fn, args):
+    results = {}
+
+    def run(arg):
+        results[arg] = fn(arg)
+
+    threads = [threading.Thread(target=run, args=(arg,)) for arg in args]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_items_share_one_batch():
+    batches = []
+
+    def dispatch_batch(items):
+        batches.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(dispatch_batch, lambda item: item.upper(), max_items=4, window_ms=200)
+    results = _run_concurrently(batcher.submit, ["a", "b", "c", "d"])
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert len(batches) == 1
+
+
+def test_failed_batch_retries_items_individually():
+    def dispatch_batch(items):
+        raise ValueError("unsplittable")
+
+    batcher = MicroBatcher(dispatch_batch, lambda item: item * 2, max_items=2, window_ms=200)
+    assert _run_concurrently(batcher.submit, ["x", "y"]) == {"x": "xx", "y": "yy"}
+    assert batcher.stats()["fallbacks"] == 1
+
+
+def test_items_run_in_the_callers_context():
+    def dispatch_one(item):
+        return request_context.current_deadline()
+
+    batcher = MicroBatcher(lambda items: [], dispatch_one, max_items=1, window_ms=0)
+    deadline = time.time() + 30
+    with request_context.deadline_at(deadline):
+        assert batcher.submit("x") == deadline
+
+
+def test_batch_runs_under_the_earliest_deadline():
+    seen = []
+
+    def dispatch_batch(items):
+        seen.append(request_context.current_deadline())
+        return items
+
+    batcher = MicroBatcher(dispatch_batch, lambda item: item, max_items=2, window_ms=500)
+    now = time.time()
+
+    def submit(offset):
+        with request_context.deadline_at(now + offset):
+            return batcher.submit(offset)
+
+    _run_concurrently(submit, [30, 10])
+    assert seen == [now + 10]
+
+
+def test_caller_stops_waiting_at_its_deadline():
+    release = threading.Event()
+
+    def dispatch_one(item):
+        release.wait(2)
+        return item
+
+    batcher = MicroBatcher(lambda items: items, dispatch_one, max_items=1, window_ms=0)
+    with request_context.deadline_at(time.time() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            batcher.submit("slow")
+    release.set()
+
+
+def test_pack_and_split_round_trip():
+    prompt = pack_prompts(["one", "two"])
+    assert '"prompt": "one"' in prompt
+    answer = '```json\n[{"id": 1, "response": "2"}, {"id": 0, "response": "1"}]\n```'
+    assert split_response(answer, 2) == ["1", "2"]
+    assert split_response('[{"id": 0, "response": "1"}]', 2) is None
+    assert split_response("not json", 1) is None
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src import plan_library
+from src.plan_library import DEFAULT_STEPS, PlanTemplate, load_templates, match_template
+
+
+@pytest.fixture(autouse=True)
+def builtin_templates_only(monkeypatch):
+    monkeypatch.setattr(plan_library, "_templates", list(plan_library.BUILTIN_TEMPLATES))
+
+
+def _names(goal):
+    match = match_template(goal)
+    return match and match[0]
+
+
+def test_builtin_templates_match_their_goals():
+    assert _names("Detect friction and suggest interventions") == "detect_and_intervene"
+    assert _names("Report team friction") == "friction_report"
+    assert _names("Just analyze the messages") == "analysis_only"
+    assert _names("Write a poem") is None
+
+
+def test_analysis_only_needs_an_explicit_restriction():
+    assert _names("Analyze the messages") is None
+    assert _names("Summarize the thread only") == "analysis_only"
+    assert _names("Not only analyze the messages") is None
+
+
+def test_negated_keywords_do_not_count():
+    assert _names("Don't suggest anything") is None
+    assert _names("Detect friction but don't suggest anything") == "friction_report"
+    assert _names("Only analyze messages, do not look for friction") == "analysis_only"
+    assert _names("Never recommend fixes") is None
+    assert _names("Detect friction, but won't suggest fixes") == "friction_report"
+
+
+def test_won_only_negates_as_a_contraction():
+    assert _names("Detect friction the team won and suggest next steps") == "detect_and_intervene"
+
+
+def test_fix_is_matched_as_a_whole_word():
+    assert _names("Report friction around the test fixtures") == "friction_report"
+    assert _names("Report friction that was fixed last week") == "friction_report"
+    assert _names("Report friction and fix it") == "detect_and_intervene"
+
+
+def test_match_returns_a_fresh_copy():
+    name, steps = match_template("Report team friction")
+    steps[0]["action"] = "changed"
+    assert match_template("Report team friction")[1][0]["action"] == "analyze_messages"
+
+
+def test_templates_without_keywords_are_rejected():
+    with pytest.raises(ValueError):
+        PlanTemplate("everything", [], DEFAULT_STEPS)
+    with pytest.raises(ValueError):
+        PlanTemplate("empty_group", [[]], DEFAULT_STEPS)
+    with pytest.raises(ValueError):
+        PlanTemplate("empty_prefix", [[""]], DEFAULT_STEPS)
+
+
+def test_load_templates_skips_invalid_entries(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps([
+        {"name": "catch_all", "steps": DEFAULT_STEPS},
+        {"name": "empty", "all_of": [], "steps": DEFAULT_STEPS},
+        {"name": "bad_action", "all_of": [["triage"]], "steps": [{"id": 1, "action": "unknown"}]},
+        {"name": "triage", "all_of": ["triage"], "steps": DEFAULT_STEPS[:1]},
+    ]))
+    templates = load_templates(str(path))
+    assert [t.name for t in templates] == ["triage"]
+    assert templates[0].matches(["triage", "inbox"])
+    assert not templates[0].matches(["tests"])
+
+
+def test_whole_word_keywords_in_custom_templates():
+    template = PlanTemplate("triage", [["triage$"]], DEFAULT_STEPS[:1])
+    assert template.matches(["triage"])
+    assert not template.matches(["triaged"])
+    with pytest.raises(ValueError):
+        PlanTemplate("empty_word", [["$"]], DEFAULT_STEPS)
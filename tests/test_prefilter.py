@@ -0,0 +1,71 @@
+import pytest
+
+from src import prefilter
+
+
+def _classify(text, **message):
+    return prefilter.classify(dict(message, text_content=text))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "You are an idiot",
+        "I quit",
+        "prod is down",
+        "this is unacceptable",
+        "stop ignoring me",
+        "fine, whatever",
+        "thanks for nothing",
+        "thanks but this is still broken",
+        "ok but why?",
+        "ok, urgent",
+    ],
+)
+def test_short_hostile_or_urgent_messages_go_to_the_model(text):
+    verdict = _classify(text)
+    assert verdict["benign"] is False
+    assert verdict["tier"] == "model"
+
+
+@pytest.mark.parametrize("text", ["ok", "thanks!", "sounds good", "np", "no problem", "no problem, thanks", "no worries"])
+def test_acknowledgments_are_benign(text):
+    verdict = _classify(text)
+    assert verdict["benign"] is True
+    assert verdict["rule"] == "acknowledgment"
+
+
+@pytest.mark.parametrize("text", ["great work, thanks", "appreciate it", "looks great to me"])
+def test_classifier_confirms_positive_messages(text):
+    verdict = _classify(text)
+    assert verdict["benign"] is True
+    assert verdict["rule"] == "classifier"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Thanks for breaking prod",
+        "thanks lol you ruined everything",
+        "cool, I will just quit then, thanks",
+        "great work, thanks for shipping it late again",
+        "Great, thanks. Now we are going to miss the launch",
+    ],
+)
+def test_sarcastic_gratitude_is_not_benign(text):
+    assert _classify(text)["benign"] is False
+
+
+def test_long_messages_are_left_to_the_model():
+    verdict = _classify("thanks so much everyone, great work on this release today")
+    assert verdict["benign"] is False
+    assert verdict["rule"] == "too_long"
+
+
+def test_positive_message_below_threshold_goes_to_the_model():
+    assert prefilter.classify({"text_content": "great work, thanks"}, threshold=1.0)["benign"] is False
+
+
+def test_images_and_empty_text_always_go_to_the_model():
+    assert _classify("thanks!", image_bytes=b"png")["rule"] == "image_or_empty"
+    assert _classify("   ")["rule"] == "image_or_empty"
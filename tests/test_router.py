@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from src import request_context
+from src.request_context import DeadlineExceeded
+from src.router import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, Provider, ProviderRouter
+
+
+def _provider(name, fn):
+    return Provider(name, fn, lambda: True)
+
+
+def _answer(text, delay=0.0):
+    def call(model, prompt, image_bytes, mime_type):
+        time.sleep(delay)
+        return text
+    return call
+
+
+def _fail(message="boom", delay=0.0):
+    def call(model, prompt, image_bytes, mime_type):
+        time.sleep(delay)
+        raise RuntimeError(message)
+    return call
+
+
+def _warm(router, name, seconds=0.01, samples=20):
+    for _ in range(samples):
+        router.latencies[name].add(seconds)
+
+
+def test_breaker_opens_probes_once_and_closes():
+    breaker = CircuitBreaker("p", failure_threshold=2, cooldown_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker("p", failure_threshold=1, cooldown_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_fails_over_to_the_next_provider():
+    router = ProviderRouter([_provider("a", _fail()), _provider("b", _answer("from b"))], hedge_enabled=False)
+    assert router.call("m", "hi") == {"text": "from b", "api_source": "b"}
+    assert router.breakers["a"].status()["consecutive_failures"] == 1
+
+
+def test_open_circuits_raise_circuit_open_error():
+    router = ProviderRouter([_provider("a", _fail())], failure_threshold=1, hedge_enabled=False)
+    with pytest.raises(RuntimeError):
+        router.call("m", "hi")
+    with pytest.raises(CircuitOpenError):
+        router.call("m", "hi")
+
+
+def test_primary_runs_on_the_caller_thread_when_the_pool_is_full():
+    seen = []
+
+    def call(model, prompt, image_bytes, mime_type):
+        seen.append(threading.current_thread())
+        return "ok"
+
+    router = ProviderRouter([_provider("a", call), _provider("b", _answer("b"))], hedge_max_workers=1)
+    _warm(router, "a")
+    assert router._slots.acquire(blocking=False)
+    try:
+        with request_context.deadline_at(time.time() + 5):
+            assert router.call("m", "hi")["api_source"] == "a"
+    finally:
+        router._slots.release()
+    assert seen == [threading.current_thread()]
+
+
+def test_slow_primary_loses_to_a_fast_hedge():
+    router = ProviderRouter(
+        [_provider("a", _answer("a", delay=0.5)), _provider("b", _answer("b"))],
+        hedge_min_delay_seconds=0.01,
+    )
+    _warm(router, "a")
+    started = time.monotonic()
+    with request_context.deadline_at(time.time() + 5):
+        assert router.call("m", "hi") == {"text": "b", "api_source": "b"}
+    assert time.monotonic() - started < 0.3
+
+
+def test_concurrency_is_not_capped_by_the_hedge_pool():
+    callers = 6
+    barrier = threading.Barrier(callers, timeout=2)
+
+    def call(model, prompt, image_bytes, mime_type):
+        barrier.wait()  # only passes if every caller is inside a model call at once
+        return "ok"
+
+    router = ProviderRouter([_provider("a", call), _provider("b", _answer("b"))], hedge_max_workers=1)
+    _warm(router, "a", seconds=1.0)
+    results = []
+
+    def run():
+        with request_context.deadline_at(time.time() + 5):
+            results.append(router.call("m", "hi")["api_source"])
+
+    threads = [threading.Thread(target=run) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["a"] * callers
+
+
+def test_slow_failing_primary_uses_the_hedge_answer():
+    router = ProviderRouter(
+        [_provider("a", _fail(delay=0.2)), _provider("b", _answer("from b"))],
+        hedge_min_delay_seconds=0.01,
+    )
+    _warm(router, "a")
+    started = time.monotonic()
+    assert router.call("m", "hi") == {"text": "from b", "api_source": "b"}
+    assert time.monotonic() - started < 0.35
+    assert router.breakers["b"].state == CLOSED
+
+
+def test_fast_failing_primary_fails_over_without_the_hedge():
+    calls = []
+
+    def b(model, prompt, image_bytes, mime_type):
+        calls.append("b")
+        return "from b"
+
+    router = ProviderRouter([_provider("a", _fail()), _provider("b", b)], hedge_min_delay_seconds=0.5)
+    _warm(router, "a")
+    assert router.call("m", "hi")["api_source"] == "b"
+    assert calls == ["b"]
+
+
+def test_answer_after_the_deadline_raises():
+    router = ProviderRouter([_provider("a", _answer("late", delay=0.1))], hedge_enabled=False)
+    with request_context.deadline_at(time.time() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            router.call("m", "hi")
+    assert router.breakers["a"].state == CLOSED
+
+
+def test_expired_deadline_makes_no_call():
+    calls = []
+    router = ProviderRouter([_provider("a", lambda *args: calls.append(args))])
+    with request_context.deadline_at(time.time() - 1):
+        with pytest.raises(DeadlineExceeded):
+            router.call("m", "hi")
+    assert calls == []
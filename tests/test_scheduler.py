@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from src.scheduler import DagScheduler, build_step_graph
+
+
+def test_steps_default_to_the_previous_step():
+    steps = [{"id": 1}, {"id": 2}, {"id": 3, "depends_on": [1]}, {"id": 4, "depends_on": "9"}]
+    assert build_step_graph(steps) == [[], [0], [0], []]
+
+
+def test_cycles_are_rejected():
+    with pytest.raises(ValueError):
+        build_step_graph([{"id": 1, "depends_on": 2}, {"id": 2, "depends_on": 1}])
+
+
+def test_each_message_runs_its_steps_in_dependency_order():
+    steps = [{"id": 1}, {"id": 2}, {"id": 3}]
+    messages = [{"n": i} for i in range(5)]
+    done = []
+    lock = threading.Lock()
+
+    def call(step_index, message):
+        time.sleep(0.001 * (5 - message["n"]))
+        return step_index
+
+    def on_complete(step_index, message_index, outcome):
+        with lock:
+            done.append((message_index, step_index))
+
+    DagScheduler(max_workers=3).run(steps, messages, call, on_complete)
+
+    assert sorted(done) == [(m, s) for m in range(5) for s in range(3)]
+    for m in range(5):
+        order = [s for mi, s in done if mi == m]
+        assert order == [0, 1, 2]
+
+
+def test_skipped_steps_count_as_satisfied():
+    steps = [{"id": 1}, {"id": 2}, {"id": 3}]
+    done = []
+    DagScheduler(max_workers=2).run(steps, [{}, {}], lambda s, m: s, lambda s, m, o: done.append((m, s)), skip={1})
+    assert sorted(done) == [(0, 0), (0, 2), (1, 0), (1, 2)]
+
+
+def test_early_messages_reach_later_steps_before_the_batch_finishes():
+    steps = [{"id": 1}, {"id": 2}]
+    done = []
+
+    def call(step_index, message):
+        if step_index == 0 and message["n"] == 3:
+            time.sleep(0.05)  # one slow message must not hold back the rest
+
+    DagScheduler(max_workers=4).run(
+        steps, [{"n": i} for i in range(4)], call, lambda s, m, o: done.append((m, s))
+    )
+    assert done.index((0, 1)) < done.index((3, 0))
+
+
+def test_ordered_steps_are_released_in_message_order():
+    steps = [{"id": 1}, {"id": 2}]
+    released = []
+
+    def call(step_index, message):
+        if step_index == 0:
+            time.sleep(0.002 * (4 - message["n"]))  # later messages finish step 1 first
+
+    DagScheduler(max_workers=4).run(
+        steps,
+        [{"n": i} for i in range(4)],
+        call,
+        lambda s, m, o: None,
+        ordered={1},
+        on_release=lambda s, m: released.append((s, m)),
+    )
+    assert [m for s, m in released if s == 1] == [0, 1, 2, 3]
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from src.serialization import serialize, to_jsonable
+
+
+class _Response:
+    __slots__ = ("entities",)
+
+    def __init__(self, entities):
+        self.entities = entities
+
+    def __str__(self):
+        return "response"
+
+
+class _Entity:
+    __slots__ = ("name", "type_", "salience")
+
+    def __init__(self, name):
+        self.name = name
+        self.type_ = "PERSON"
+        self.salience = 0.5
+
+
+class _Sentiment:
+    __slots__ = ("score", "magnitude")
+
+    def __init__(self, score, magnitude):
+        self.score = score
+        self.magnitude = magnitude
+
+
+def test_handler_is_chosen_per_instance_not_per_type():
+    assert to_jsonable(_Response([_Entity("Ana")])) == [{"name": "Ana", "type": "PERSON", "salience": 0.5}]
+    # Same type, different shape: must not reuse the entity-list handler.
+    assert to_jsonable(_Response(None)) == "response"
+
+
+def test_builtin_types_and_bytes():
+    when = datetime(2024, 1, 2, 3, 4, 5)
+    value = to_jsonable({"when": when, "items": (1, "a"), "blob": b"abc", 3: None})
+    assert value["when"] == when.isoformat()
+    assert value["items"] == [1, "a"]
+    assert value["blob"]["size"] == 3 and "sha256" in value["blob"]
+    assert value[3] is None
+
+
+def test_objects_with_attributes_serialize_public_fields():
+    class Result:
+        def __init__(self):
+            self.sentiment = _Sentiment(-0.4, 0.9)
+            self._private = "hidden"
+
+    assert to_jsonable(Result()) == {"sentiment": {"score": -0.4, "magnitude": 0.9}}
+
+
+def test_flags_are_collected_in_the_same_walk():
+    _, flags = serialize({"api_source": "fallback", "error": "429 RESOURCE_EXHAUSTED"})
+    assert flags == {"quota_error": True, "fallback": True}
+    _, flags = serialize({"api_source": "gemini", "text": "fine"})
+    assert flags == {"quota_error": False, "fallback": False}
@@ -0,0 +1,35 @@
+import pytest
+
+from src import knowledge_store
+from src.settings import env_flag
+
+
+@pytest.mark.parametrize("value", ["1", "true", "True", "yes", "on", " ON "])
+def test_truthy_values(monkeypatch, value):
+    monkeypatch.setenv("CIFR_TEST_FLAG", value)
+    assert env_flag("CIFR_TEST_FLAG") is True
+
+
+@pytest.mark.parametrize("value", ["0", "false", "FALSE", "no", "off"])
+def test_falsy_values(monkeypatch, value):
+    monkeypatch.setenv("CIFR_TEST_FLAG", value)
+    assert env_flag("CIFR_TEST_FLAG", True) is False
+
+
+@pytest.mark.parametrize("value", [None, "", "maybe"])
+def test_unset_or_unknown_values_use_the_default(monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv("CIFR_TEST_FLAG", raising=False)
+    else:
+        monkeypatch.setenv("CIFR_TEST_FLAG", value)
+    assert env_flag("CIFR_TEST_FLAG") is False
+    assert env_flag("CIFR_TEST_FLAG", True) is True
+
+
+def test_knowledge_store_accepts_the_same_spellings(monkeypatch):
+    monkeypatch.setattr(knowledge_store, "_shared_store", None)
+    monkeypatch.delenv("SHARED_STORE_PATH", raising=False)
+    monkeypatch.setenv("KNOWLEDGE_STORE_ENABLED", "0")
+    assert knowledge_store.get_knowledge_store() is None
+    monkeypatch.setenv("KNOWLEDGE_STORE_ENABLED", "1")
+    assert knowledge_store.get_knowledge_store() is not None
@@ -0,0 +1,84 @@
+import gc
+import multiprocessing
+import time
+
+import pytest
+
+from src.shared_store import SharedStore
+
+
+def _increment(path, started, resume):
+    store = SharedStore(path)
+    for i in range(50):
+        if i == 10:
+            started.release()
+            resume.wait(30)
+        with store.transaction():
+            store.set("counters", "hits", store.get("counters", "hits", 0) + 1)
+
+
+def test_values_round_trip_as_json_and_across_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    SharedStore(path).set("context", "k", {"text": "hi", "image": b"raw"})
+    value = SharedStore(path).get("context", "k")
+    assert value["text"] == "hi"
+    assert value["image"]["size"] == 3  # raw bytes are stored as a digest
+    assert SharedStore(path).get("context", "missing", "default") == "default"
+
+
+def test_entries_expire(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    store.set("llm", "k", "v", ttl_seconds=0.05)
+    assert store.get("llm", "k") == "v"
+    time.sleep(0.1)
+    assert store.get("llm", "k") is None
+    assert store.purge_expired() == 1
+
+
+def test_changes_follow_a_namespace_in_write_order(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    first = store.set("knowledge", "a", 1)
+    store.set("other", "x", 0)
+    store.set("knowledge", "b", 2)
+    store.set("knowledge", "a", 3)  # a rewrite moves the key to the end
+    assert [(key, value) for _, key, value in store.changes("knowledge")] == [("b", 2), ("a", 3)]
+    assert store.changes("knowledge", after_seq=store.changes("knowledge")[-1][0]) == []
+    assert first < store.changes("knowledge")[0][0]
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.set("conversation", "t", {"score": 1})
+            raise RuntimeError("abort")
+    assert store.get("conversation", "t") is None
+
+
+def test_read_modify_write_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    # The parent has the file open when it forks (like a gunicorn --preload master) and
+    # drops its handle while the workers are in the middle of writing.
+    parent = SharedStore(path)
+    parent.set("counters", "hits", 0)
+    context = multiprocessing.get_context("fork")
+    started, resume = context.Semaphore(0), context.Event()
+    workers = [context.Process(target=_increment, args=(path, started, resume)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        assert started.acquire(timeout=30)
+    del parent
+    gc.collect()
+    resume.set()
+    for worker in workers:
+        worker.join(30)
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert SharedStore(path).get("counters", "hits") == 200
+
+
+def test_connections_are_reopened_after_fork_hooks_close_them(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    store.set("context", "k", 1)
+    store._close_local()
+    assert store.get("context", "k") == 1
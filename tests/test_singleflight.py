@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from src.singleflight import SingleFlight, content_key
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _followers(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    started.wait(5)
+    followers = _followers(3, lambda: results.append(flight.do("k", work)))
+    _wait_for(lambda: flight.stats()["shared"] == 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("value", False)] + [("value", True)] * 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_errors_reach_followers_and_the_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except ValueError as exc:
+            errors.append(str(exc))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    _wait_for(lambda: flight.stats()["shared"] == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert errors == ["boom", "boom"]
+    assert flight.do("k", lambda: "fresh") == ("fresh", False)
+
+
+def test_followers_replay_a_stream_as_it_is_produced():
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def produce():
+        yield 1
+        gate.wait(5)
+        yield 2
+
+    leader, shared = flight.stream("k", produce)
+    assert not shared and next(leader) == 1
+    follower, shared = flight.stream("k", produce)
+    assert shared and next(follower) == 1
+    gate.set()
+    assert list(leader) == [2]
+    assert list(follower) == [2]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_followers_are_released_when_the_leader_is_abandoned():
+    flight = SingleFlight()
+    leader, _ = flight.stream("k", lambda: iter([1, 2, 3]))
+    next(leader)
+    follower, _ = flight.stream("k", lambda: iter([]))
+    leader.close()
+    assert next(follower) == 1
+    with pytest.raises(RuntimeError):
+        list(follower)
+
+
+def test_content_key_is_stable_and_order_independent_for_dicts():
+    assert content_key("a", {"x": 1, "y": 2}) == content_key("a", {"y": 2, "x": 1})
+    assert content_key("a", b"bytes") != content_key("b", b"bytes")
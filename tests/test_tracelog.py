@@ -0,0 +1,99 @@
+import threading
+
+from src.memory import MemoryStore
+from src.tracelog import TraceLog
+
+
+def _payloads(events):
+    return [event["payload"]["n"] for event in events]
+
+
+def test_range_query_finds_out_of_order_records(tmp_path):
+    log = TraceLog(str(tmp_path), index_interval=2)
+    for n, ts in enumerate([100.0, 105.0, 101.0, 103.0, 102.0, 110.0, 104.0]):
+        log.append("step", {"n": n}, ts)
+
+    assert sorted(_payloads(log.query(101.0, 104.0))) == [2, 3, 4, 6]
+    assert _payloads(log.query(start_ts=104.5)) == [1, 5]
+    assert _payloads(log.query(end_ts=100.5)) == [0]
+
+
+def test_range_survives_reopen(tmp_path):
+    log = TraceLog(str(tmp_path), index_interval=1)
+    for n, ts in enumerate([10.0, 30.0, 20.0]):
+        log.append("step", {"n": n}, ts)
+    log.close()
+
+    reopened = TraceLog(str(tmp_path), index_interval=1)
+    assert _payloads(reopened.query(15.0, 25.0)) == [2]
+    assert reopened.stats()["events"] == 3
+
+
+def test_concurrent_appends_are_all_queryable(tmp_path):
+    log = TraceLog(str(tmp_path), index_interval=4, segment_bytes=2048)
+    started = threading.Barrier(8)
+
+    def write(worker):
+        started.wait()
+        for i in range(50):
+            log.append("step", {"n": worker * 100 + i})
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    everything = list(log.query())
+    assert len(everything) == 400
+    assert log.stats()["segments"] > 1
+    # Stamped under the log's lock, so file order is time order.
+    timestamps = [event["timestamp"] for event in everything]
+    assert timestamps == sorted(timestamps)
+
+
+def test_query_sees_segments_written_by_another_process(tmp_path):
+    reader = TraceLog(str(tmp_path))
+    writer = TraceLog(str(tmp_path), segment_bytes=256)
+    for n in range(3):
+        writer.append("step", {"n": n}, 1000.0 + n)
+    writer.flush()
+    assert _payloads(reader.query(event_type="step")) == [0, 1, 2]
+
+    for n in range(3, 10):
+        writer.append("step", {"n": n}, 1000.0 + n)
+    writer.flush()
+    assert _payloads(reader.query(start_ts=1005.0)) == [5, 6, 7, 8, 9]
+
+
+def test_memory_store_persists_events_in_order(tmp_path):
+    backend = TraceLog(str(tmp_path))
+    store = MemoryStore(capacity=10, backend=backend)
+    for n in range(25):
+        store.log("agent_call", {"n": n})
+
+    assert len(store.get_events()) == 10
+    assert _payloads(store.query(event_type="agent_call")) == list(range(25))
+
+
+def test_memory_stores_sharing_a_log_query_only_their_own_events(tmp_path):
+    backend = TraceLog(str(tmp_path))
+    first = MemoryStore(backend=backend)
+    second = MemoryStore(backend=backend)
+    for n in range(3):
+        first.log("agent_call", {"n": n})
+        second.log("agent_call", {"n": 10 + n})
+
+    assert _payloads(first.query()) == [0, 1, 2]
+    assert _payloads(second.query(event_type="agent_call")) == [10, 11, 12]
+    assert len(list(backend.query())) == 6
+    assert {event["source"] for event in backend.query()} == {first.store_id, second.store_id}
+
+
+def test_a_fixed_store_id_reads_back_a_previous_run(tmp_path):
+    for store_id, n in (("web", 1), (None, 2)):
+        backend = TraceLog(str(tmp_path))
+        MemoryStore(backend=backend, store_id=store_id).log("agent_call", {"n": n})
+        backend.close()
+
+    assert _payloads(MemoryStore(backend=TraceLog(str(tmp_path)), store_id="web").query()) == [1]